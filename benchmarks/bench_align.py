@@ -0,0 +1,151 @@
+"""Benchmark `align_table_and_mask` against the former frame-by-frame implementation.
+
+Usage: python benchmarks/bench_align.py [n_frame] [size] [n_obj] [n_workers]
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+import skimage.measure as measure
+from napari_amdtrk._utils import align_table_and_mask
+
+
+def align_table_and_mask_legacy(table, mask, align_morph=False, phase_col=None, phase_default=None):
+    """For every object in the mask, check if is consistent with the table. If no, remove the object in the mask.
+
+    Args:
+        table (pandas.DataFrame): (tracked) object table.
+        mask (numpy.ndarray): labeled object mask, object label should be corresponding to `continuous_label` column in the table.
+        align_morph (bool): align morphologically (match xy coordinate) or not.
+        phase_col (str): column name of cell phases.
+        phase_default (str): default phase, for registering unassigned objects.
+    """
+
+    count = 0
+    count_up = 0
+    nrow = table.shape[0]
+    new = pd.DataFrame()
+    
+    empty_row = table.iloc[0].copy()
+    for i in empty_row.index:
+        empty_row[i] = np.nan
+    empty_row['parentTrackId'] = 0
+    empty_row['trackId'] = 0      # set to NaN will cause napari error
+    empty_row['lineageId'] = 0
+    empty_row[phase_col] = phase_default
+    
+    for i in range(mask.shape[0]):
+        sub = table[table['frame'] == i].copy()
+        sls = mask[i,:,:].copy()
+        lbs = sorted(list(np.unique(sls)))
+        if lbs[0] == 0:
+            del lbs[0]
+        registered = list(sub['continuous_label'])
+
+        # objects in the mask but not registered in the table - register with default value
+        # TODO address situation: user draw mask with label same as another object, how can we detect?
+        rmd = list(set(lbs) - set(registered))
+        if rmd:
+            for j in rmd:
+                tempsls = sls.copy()
+                tempsls[tempsls!=j] = 0
+                ct = 0
+                for p in measure.regionprops(tempsls):
+                    y,x = p.centroid
+                    row = empty_row.copy()
+                    row['frame'] = i
+                    row['continuous_label'] = j
+                    row['Center_of_the_object_0'] = x
+                    row['Center_of_the_object_1'] = y
+                    row = pd.DataFrame(row)
+                    row.columns = [nrow+1]
+                    nrow += 1
+                    sub = pd.concat([sub, row.transpose()], axis=0)
+                    ct += 1
+                assert ct == 1
+                count += 1
+                # sls[sls == j] = 0
+            # mask[i,:,:] = sls
+        
+        # objects in the table but not in the mask - unregister them
+        to_unregister = list(set(registered) - set(lbs))
+        count2 = 0
+        if to_unregister:
+            for j in to_unregister:
+                sub = sub[~sub['continuous_label'].isin(to_unregister)]
+                count2 += 1
+        
+        if align_morph:
+            props = measure.regionprops(mask[i,:,:])
+            for p in props:
+                lb = p.label
+                obj = sub[sub['continuous_label'] == lb]
+                if obj.shape[0]<1:
+                    raise ValueError('Object in the mask not registered in the table!')
+                y,x = p.centroid
+                if np.round(obj['Center_of_the_object_0'].iloc[0],3) == np.round(x,3) and np.round(obj['Center_of_the_object_1'].iloc[0],3) == np.round(y,3):
+                    # The object is unchanged if coordinate matches
+                    continue
+                else:
+                    print('Update object ' + str(lb) + ' at frame ' + str(i))
+                    count_up += 1
+                    # Update morphology
+                    sub.loc[obj.index, 'Center_of_the_object_0'] = x
+                    sub.loc[obj.index, 'Center_of_the_object_1'] = y
+        new = pd.concat([new, sub.copy()])
+        new.index = [_ for _ in range(new.shape[0])]
+    
+    if count:
+        print('Registered ' + str(count) + ' objects with spatial information only.')
+    if count2:
+        print('Removed ' + str(count2) + ' objects from the table.')
+    if align_morph:
+        print('Updated ' + str(count_up) + ' objects.')
+    
+    return mask, new
+
+
+def make_stack(n_frame, size, n_obj, seed=0):
+    """Square objects on a grid with jitter; 5% of objects are missing from the table,
+    5% of table rows are missing from the mask."""
+    rng = np.random.default_rng(seed)
+    mask = np.zeros((n_frame, size, size), dtype='uint16')
+    side = int(np.sqrt(n_obj))
+    step = size // side
+    rows = []
+    for t in range(n_frame):
+        for k in range(side * side):
+            y, x = (k // side) * step + rng.integers(0, step // 4), (k % side) * step + rng.integers(0, step // 4)
+            h, w = rng.integers(step // 4, step // 2, 2)
+            drop = rng.random()
+            if drop > 0.05:
+                mask[t, y:y + h, x:x + w] = k + 1
+            if drop < 0.05 or drop > 0.1:
+                rows.append({'frame': t, 'trackId': k + 1, 'continuous_label': k + 1,
+                             'Center_of_the_object_0': x + (w - 1) / 2, 'Center_of_the_object_1': y + (h - 1) / 2,
+                             'phase': 'G1', 'lineageId': k + 1, 'parentTrackId': 0})
+    return mask, pd.DataFrame(rows)
+
+
+def main(n_frame=50, size=1024, n_obj=400, n_workers=1):
+    mask, table = make_stack(n_frame, size, n_obj)
+
+    t0 = time.perf_counter()
+    _, ref = align_table_and_mask_legacy(table.copy(), mask, False, 'phase', 'G1')
+    t_legacy = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    _, new = align_table_and_mask(table.copy(), mask, False, 'phase', 'G1', n_workers=n_workers)
+    t_new = time.perf_counter() - t0
+
+    # registered objects of a frame may be ordered differently, compare by (frame, label)
+    ref = ref.sort_values(['frame', 'continuous_label']).reset_index(drop=True)
+    new = new.sort_values(['frame', 'continuous_label']).reset_index(drop=True)
+    pd.testing.assert_frame_equal(ref.astype(new.dtypes.to_dict()), new)
+    print('stack: %d x %d x %d, %d objects per frame, %d workers' % (n_frame, size, size, n_obj, n_workers))
+    print('legacy: %.3f s' % t_legacy)
+    print('align_table_and_mask: %.3f s (x%.1f)' % (t_new, t_legacy / t_new))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
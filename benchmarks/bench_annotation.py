@@ -0,0 +1,62 @@
+"""Benchmark `get_annotation` against the former per-row builder, which it must beat by 10x.
+
+Usage: python benchmarks/bench_annotation.py [n_rows]
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+from napari_amdtrk._utils import get_annotation
+
+
+def annotate_rows(track_id, parent_id, cls_lb):
+    """The former per-row builder of annotation strings, with a state column."""
+    ann = []
+    for i in range(len(track_id)):
+        if int(track_id[i]) > 0:
+            inform = [str(track_id[i]), str(parent_id[i]), cls_lb[i]]
+            if inform[1] == '0':
+                del inform[1]
+            ann.append('-'.join(inform))
+        elif cls_lb[i] != cls_lb[i]:  # for nan
+            ann.append('unassigned')
+        else:
+            ann.append('unassigned-' + cls_lb[i])
+    return ann
+
+
+def make_table(n_rows, track_len=100, seed=0):
+    """Tracks of `track_len` frames, 30% of them with a parent and cell cycle phases in order."""
+    rng = np.random.default_rng(seed)
+    n_track = n_rows // track_len
+    trk = np.repeat(np.arange(1, n_track + 1), track_len)
+    par = np.where(rng.random(n_track) < 0.3, rng.integers(1, n_track + 1, n_track), 0)
+    phase = np.array(['G1', 'S', 'G2', 'M'], dtype=object)[np.tile(np.arange(track_len) * 4 // track_len, n_track)]
+    trk[rng.random(trk.size) < 0.05] = 0  # unassigned objects
+    return pd.DataFrame({'trackId': trk, 'parentTrackId': np.repeat(par, track_len), 'phase': phase})
+
+
+def best_of(func, repeat=3):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        rt = func()
+        times.append(time.perf_counter() - t0)
+    return rt, min(times)
+
+
+def main(n_rows=3_000_000):
+    track = make_table(n_rows)
+    ref, t_loop = best_of(lambda: annotate_rows(list(track['trackId']), list(track['parentTrackId']),
+                                                list(track['phase'])))
+    new, t_vec = best_of(lambda: get_annotation(track, True, 'phase')['name'])
+
+    assert list(new) == ref
+    print('rows: %d' % n_rows)
+    print('per-row loop: %.3f s' % t_loop)
+    print('get_annotation: %.3f s (x%.1f)' % (t_vec, t_loop / t_vec))
+    assert t_loop / t_vec >= 10, 'get_annotation less than 10x faster than the per-row builder'
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
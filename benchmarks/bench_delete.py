@@ -0,0 +1,63 @@
+"""Benchmark deleting a whole track with object boxes from the saved table, against scanning every frame.
+
+Usage: python benchmarks/bench_delete.py [n_frame] [size] [n_obj]
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+from napari_amdtrk._engine import AmdTrkEngine
+from napari_amdtrk._utils import get_annotation, BBOX_COLS
+
+
+def make_dataset(n_frame, size, n_obj, seed=0):
+    """Square objects on a grid with jitter, one track per grid cell, with the boxes a save writes."""
+    rng = np.random.default_rng(seed)
+    # untouched pages of the stack are not allocated
+    mask = np.zeros((n_frame, size, size), dtype='uint16')
+    side = int(np.sqrt(n_obj))
+    step = size // side
+    rows = []
+    for t in range(n_frame):
+        for k in range(side * side):
+            y, x = (k // side) * step + rng.integers(0, step // 4), (k % side) * step + rng.integers(0, step // 4)
+            h, w = rng.integers(step // 4, step // 2, 2)
+            mask[t, y:y + h, x:x + w] = k + 1
+            rows.append({'frame': t, 'trackId': k + 1, 'continuous_label': k + 1,
+                         'Center_of_the_object_0': x + (w - 1) / 2, 'Center_of_the_object_1': y + (h - 1) / 2,
+                         'state': '0', 'lineageId': k + 1, 'parentTrackId': 0,
+                         'bbox-0': y, 'bbox-1': x, 'bbox-2': y + h, 'bbox-3': x + w})
+    track = get_annotation(pd.DataFrame(rows), False, 'state')
+    meta = {'frame_base': 0, 'stateCol': None, 'stateColName': 'state', 'track_path': '', 'mask_path': '',
+            'states': ['0'], 'hasState': False, 'n_workers': 1, 'synced': True}
+    return AmdTrkEngine(mask, track, meta)
+
+
+def delete(engine, trk_id):
+    """Delete a track, check its objects are cleared and return the time taken."""
+    rows = engine.store.track(trk_id)
+    t0 = time.perf_counter()
+    engine.delete_track(trk_id)
+    t = time.perf_counter() - t0
+    for f, lb, r0, c0, r1, c1 in rows[['frame', 'continuous_label'] + BBOX_COLS].to_numpy(dtype='int64'):
+        assert not np.any(engine.mask[f, r0:r1, c0:c1] == lb)
+    return t
+
+
+def main(n_frame=1000, size=2048, n_obj=100):
+    engine = make_dataset(n_frame, size, n_obj)
+    t_table = delete(engine, 1)
+    assert not engine.bboxes
+    # files not saved aligned: boxes of the table are not trusted, every frame is scanned once
+    engine.unaligned = None
+    t_scan = delete(engine, 2)
+    assert len(engine.bboxes) == n_frame
+
+    print('stack: %d x %d x %d, %d objects per frame' % (n_frame, size, size, n_obj))
+    print('delete, scan frames: %.3f s' % t_scan)
+    print('delete, table boxes: %.3f s (x%.1f)' % (t_table, t_scan / t_table))
+    assert t_table < 1, 'deleting a %d-frame track took %.2f s' % (n_frame, t_table)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,45 @@
+"""Benchmark the linking backends on a dense field of objects.
+
+Usage: python benchmarks/bench_linking.py [n_frame] [n_obj] [size]
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+from napari_amdtrk._linking import link_trackpy, link_kdtree
+
+
+def make_field(n_frame, n_obj, size, step=2, seed=0):
+    """Objects at random positions, each moving by a random walk of `step` pixels per frame."""
+    rng = np.random.default_rng(seed)
+    pos = rng.uniform(0, size, (n_obj, 2))
+    frames = []
+    for t in range(n_frame):
+        frames.append(pd.DataFrame({'frame': t, 'Center_of_the_object_0': pos[:, 0],
+                                    'Center_of_the_object_1': pos[:, 1], 'truth': np.arange(n_obj)}))
+        pos = pos + rng.normal(0, step, pos.shape)
+    return pd.concat(frames, ignore_index=True)
+
+
+def accuracy(table, ids):
+    """Fraction of consecutive links of true tracks kept in the linked tracks."""
+    table = table.assign(ids=ids).sort_values(['truth', 'frame'])
+    same = table['truth'].to_numpy()[1:] == table['truth'].to_numpy()[:-1]
+    kept = table['ids'].to_numpy()[1:] == table['ids'].to_numpy()[:-1]
+    return (kept & same).sum() / same.sum()
+
+
+def main(n_frame=20, n_obj=5000, size=4096):
+    table = make_field(n_frame, n_obj, size)
+    distance = 10
+    print('%d frames, %d objects per frame in %d x %d' % (n_frame, n_obj, size, size))
+    for name, linker in [('trackpy', link_trackpy), ('kdtree', link_kdtree)]:
+        t0 = time.perf_counter()
+        ids = linker(table, distance, 1)
+        elapsed = time.perf_counter() - t0
+        print('%s: %.3f s, %d tracks, %.1f%% links recovered' %
+              (name, elapsed, len(np.unique(ids)), 100 * accuracy(table, ids)))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,100 @@
+"""Benchmark refreshing the layers after single-track edits, against comparing every cached row with the table.
+
+Usage: python benchmarks/bench_refresh.py [n_rows] [n_edits]
+"""
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import yaml
+import tifffile
+import napari
+from napari_amdtrk._reader import napari_get_reader
+from napari_amdtrk._widget import AmdTrkWidget
+
+
+def write_dataset(path, n_rows, track_len=100, size=64):
+    """A table of `n_rows` rows, tracks of `track_len` frames; the mask is empty, the table is not aligned."""
+    n_track = n_rows // track_len
+    mask = np.zeros((track_len, size, size), dtype='uint16')
+    rng = np.random.default_rng(0)
+    table = {'frame': np.tile(np.arange(track_len), n_track),
+             'trackId': np.repeat(np.arange(1, n_track + 1), track_len),
+             'continuous_label': np.repeat(np.arange(1, n_track + 1), track_len),
+             'Center_of_the_object_0': rng.random(n_track * track_len) * size,
+             'Center_of_the_object_1': rng.random(n_track * track_len) * size}
+    tifffile.imwrite(os.path.join(path, 'a_GFP.tif'), mask.astype('uint8'), photometric='minisblack')
+    tifffile.imwrite(os.path.join(path, 'a_mask.tif'), mask, photometric='minisblack')
+    pd.DataFrame(table).to_csv(os.path.join(path, 'a_track.csv'), index=False)
+    with open(os.path.join(path, 'config.yaml'), 'w') as f:
+        yaml.safe_dump({'intensity_suffix': 'GFP', 'mask_suffix': 'mask', 'track_suffix': 'track',
+                        'frame_base': 0, 'stateCol': None}, f)
+    return n_track
+
+
+def refresh_legacy(widget):
+    """Former incremental refresh: touched and added rows found by comparing the cache with the whole table."""
+    touched = widget.touched
+    widget.getAnn(touched)
+    widget.touched = set()
+    cache = widget.layer_cache
+    index = widget.track.index.to_numpy()
+    upd = [widget.store.rows(i) for i in touched]
+    upd = np.concatenate(upd) if upd else index[:0]
+    live = np.isin(cache['rows'], index)
+    if not live.all():
+        cache = {k: v[live] for k, v in cache.items()}
+    stale = np.flatnonzero(np.isin(cache['rows'], upd))
+    added = index[~np.isin(index, cache['rows'])]
+    fresh = widget._layer_rows(cache['rows'][stale])
+    for k in ('trackId', 'points', 'name'):
+        cache[k][stale] = fresh[k]
+    if added.size:
+        added = widget._layer_rows(added)
+        cache = {k: np.concatenate([cache[k], added[k]]) for k in cache}
+    widget.layer_cache = cache
+    widget._push_layers(True)
+    return
+
+
+def time_edits(widget, trk_ids, refresh):
+    """Split tracks in two at half their length, refreshing after each edit; return the refresh time."""
+    t = 0
+    for trk in trk_ids:
+        widget.create_or_replace(trk, 50)
+        t0 = time.perf_counter()
+        refresh()
+        t += time.perf_counter() - t0
+    return t
+
+
+def main(n_rows=1_000_000, n_edits=20):
+    with tempfile.TemporaryDirectory() as path:
+        n_track = write_dataset(path, n_rows)
+        viewer = napari.Viewer(show=False)
+        for data, kwargs, kind in napari_get_reader(path)(path):
+            getattr(viewer, 'add_' + kind)(data, **kwargs)
+        widget = AmdTrkWidget(viewer)
+        widget.refresh()
+        trk_ids = np.random.default_rng(0).choice(np.arange(1, n_track + 1), 2 * n_edits, replace=False)
+
+        t_legacy = time_edits(widget, trk_ids[:n_edits], lambda: refresh_legacy(widget))
+        widget._cache_layers()
+        t_new = time_edits(widget, trk_ids[n_edits:], widget.refresh)
+        # what is left: napari takes the whole tracks array
+        t0 = time.perf_counter()
+        for _ in range(n_edits):
+            widget._push_layers(True)
+        t_push = time.perf_counter() - t0
+        viewer.close()
+
+    print('table: %d rows, %d edits' % (n_rows, n_edits))
+    print('refresh, whole table diff: %.3f s per edit' % (t_legacy / n_edits))
+    print('refresh, touched rows diff: %.3f s per edit (x%.1f)' % (t_new / n_edits, t_legacy / t_new))
+    print('  of which pushing layers: %.3f s per edit' % (t_push / n_edits))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
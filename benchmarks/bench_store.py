@@ -0,0 +1,74 @@
+"""Benchmark single-track edits of `TrackStore` against rebuilding the table on each edit.
+
+Usage: python benchmarks/bench_store.py [n_rows] [n_edits]
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+from napari_amdtrk._store import TrackStore
+
+
+def make_table(n_rows, track_len=100, seed=0):
+    """Tracks of `track_len` frames, 30% of them with a parent."""
+    rng = np.random.default_rng(seed)
+    n_track = n_rows // track_len
+    par = np.where(rng.random(n_track) < 0.3, rng.integers(1, n_track + 1, n_track), 0)
+    return pd.DataFrame({'frame': np.tile(np.arange(track_len), n_track),
+                         'trackId': np.repeat(np.arange(1, n_track + 1), track_len),
+                         'continuous_label': np.repeat(np.arange(1, n_track + 1), track_len),
+                         'parentTrackId': np.repeat(par, track_len),
+                         'lineageId': np.repeat(np.arange(1, n_track + 1), track_len),
+                         'Center_of_the_object_0': rng.random(n_rows) * 1000,
+                         'Center_of_the_object_1': rng.random(n_rows) * 1000})
+
+
+def edit_store(table, trk_ids):
+    """Cut each track in two: drop its second half and append it back as a new track."""
+    store = TrackStore(table.copy())
+    new_id = int(table['trackId'].max()) + 1
+    t0 = time.perf_counter()
+    for trk in trk_ids:
+        rows = store.rows(trk)[50:]
+        sub = store.loc[rows].copy()
+        store.drop(rows)
+        sub['trackId'] = new_id
+        store.append(sub)
+        new_id += 1
+    t_edit = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    table = store.table
+    return table, t_edit, time.perf_counter() - t0
+
+
+def edit_rebuild(table, trk_ids):
+    """The same edits, dropping and concatenating the whole table each time."""
+    table = table.copy()
+    new_id = int(table['trackId'].max()) + 1
+    t0 = time.perf_counter()
+    for trk in trk_ids:
+        rows = table.index[table['trackId'].to_numpy() == trk][50:]
+        sub = table.loc[rows].copy()
+        table = table.drop(index=rows)
+        sub['trackId'] = new_id
+        sub.index = np.arange(table.index.max() + 1, table.index.max() + 1 + sub.shape[0])
+        table = pd.concat([table, sub])
+        new_id += 1
+    return table, time.perf_counter() - t0
+
+
+def main(n_rows=1_000_000, n_edits=200):
+    table = make_table(n_rows)
+    trk_ids = np.random.default_rng(1).choice(table['trackId'].unique(), n_edits, replace=False)
+    new, t_store, t_compact = edit_store(table, trk_ids)
+    ref, t_rebuild = edit_rebuild(table, trk_ids)
+
+    pd.testing.assert_frame_equal(new.sort_values(['trackId', 'frame']).reset_index(drop=True),
+                                  ref.sort_values(['trackId', 'frame']).reset_index(drop=True))
+    print('rows: %d, edits: %d' % (n_rows, n_edits))
+    print('rebuild per edit: %.3f s' % t_rebuild)
+    print('TrackStore: %.3f s (x%.1f), then compaction %.3f s' % (t_store, t_rebuild / t_store, t_compact))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
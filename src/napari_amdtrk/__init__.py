@@ -2,10 +2,19 @@ __version__ = "0.1"
 
 from ._reader import napari_get_reader
 from ._sample_data import make_sample_data
-from ._widget import AmdTrkWidget
+from ._engine import AmdTrkEngine
 
 __all__ = (
     "napari_get_reader",
     "make_sample_data",
+    "AmdTrkEngine",
     "AmdTrkWidget",
 )
+
+
+def __getattr__(name):
+    # the widget needs Qt, imported on first use so headless (batch) use does not
+    if name == "AmdTrkWidget":
+        from ._widget import AmdTrkWidget
+        return AmdTrkWidget
+    raise AttributeError(name)
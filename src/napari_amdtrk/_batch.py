@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from ._engine import AmdTrkEngine
+
+
+def process_dataset(path, corrections=None, distance=None, frame_gap=0, save=True, keep_going=False,
+                    cfgname='config.yaml', n_threads=None, linker=None, divisions=False,
+                    use_processes=None):
+    """Correct, re-track and save one dataset directory.
+
+    The mask and table are aligned on save, and before linking when re-tracking.
+
+    Args:
+        path (str): dataset directory.
+        corrections (list): optional, corrections to apply first, see `AmdTrkEngine.apply`.
+        distance (int): optional, re-track with this search distance, see `AmdTrkEngine.retrack`.
+        frame_gap (int): frames an object may disappear for when re-tracking.
+        save (bool): save the dataset.
+        keep_going (bool): skip corrections that fail.
+        cfgname (str): config file name.
+        n_threads (int): threads measuring frames, default from the config.
+        use_processes (bool): measure frames in `n_threads` processes sharing the mask, default from the config.
+        linker (str): linking backend, default from the config, see `_linking.LINKERS`.
+        divisions (bool): detect divisions when re-tracking.
+
+    Returns:
+        (dict): summary: dataset, status ('ok' or 'failed'), seconds, objects, tracks and message.
+    """
+    start = time.time()
+    report = {'dataset': path, 'status': 'ok', 'seconds': 0., 'objects': None, 'tracks': None, 'message': ''}
+    try:
+        engine = AmdTrkEngine.load(path, cfgname, use_processes=use_processes)
+        if n_threads is not None:
+            engine.n_workers = n_threads
+        msgs = engine.apply(corrections or [], keep_going=keep_going)
+        if distance is not None:
+            msgs.append(engine.retrack(distance=distance, frame_gap=frame_gap, linker=linker, divisions=divisions))
+        if save:
+            msgs.append(engine.save())
+        report['objects'] = engine.track.shape[0]
+        report['tracks'] = len([i for i in engine.store.track_ids() if i > 0])
+        report['message'] = msgs[-1] if msgs else ''
+    except Exception as e:
+        # one broken dataset must not stop the batch
+        report['status'] = 'failed'
+        report['message'] = repr(e)
+        report['traceback'] = traceback.format_exc()
+    report['seconds'] = time.time() - start
+    return report
+
+
+def run_batch(paths, corrections=None, n_workers=1, **kwargs):
+    """Process dataset directories in a pool of worker processes, see `process_dataset`.
+
+    Datasets are independent, each worker opens, processes and saves its own. Progress is printed as
+    datasets finish, failures are reported without stopping the others.
+
+    Args:
+        paths (list): dataset directories.
+        corrections (list or dict): optional, corrections for every dataset, or a mapping from dataset
+            directory name (or path) to its corrections.
+        n_workers (int): number of worker processes, 1 to process in the calling process, None for all cores.
+        **kwargs: passed to `process_dataset`.
+
+    Returns:
+        (pandas.DataFrame): summary report, one row per dataset in input order.
+    """
+    if n_workers is None or n_workers < 1:
+        n_workers = os.cpu_count()
+    if n_workers > 1:
+        # datasets run side by side, do not also spread each over all cores
+        kwargs.setdefault('n_threads', max(1, os.cpu_count() // n_workers))
+
+    def _corrections(path):
+        if isinstance(corrections, dict):
+            return corrections.get(os.path.basename(os.path.normpath(path)), corrections.get(path, []))
+        return corrections
+
+    reports = {}
+
+    def _done(path, report):
+        reports[path] = report
+        print('[' + str(len(reports)) + '/' + str(len(paths)) + '] ' + path + ': ' + report['status'] +
+              ' (' + str(round(report['seconds'], 1)) + ' s) ' + report['message'])
+
+    if n_workers == 1 or len(paths) < 2:
+        for path in paths:
+            _done(path, process_dataset(path, _corrections(path), **kwargs))
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = {executor.submit(process_dataset, path, _corrections(path), **kwargs): path for path in paths}
+            for future in as_completed(futures):
+                _done(futures[future], future.result())
+
+    report = pd.DataFrame([reports[p] for p in paths])
+    n_failed = int(sum(report['status'] != 'ok')) if report.shape[0] else 0
+    print('Processed ' + str(len(paths)) + ' datasets, ' + str(n_failed) + ' failed.')
+    return report
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Command line entry point: correct, re-track and save dataset directories without napari.
+
+Usage: amdtrk DATASET [DATASET ...] [--corrections FILE] [--retrack DISTANCE FRAME_GAP] [--linker NAME] [--workers N]
+              [--report FILE] [--keep-going] [--dry-run]
+
+The corrections file (JSON or YAML) is either a list of corrections applied to every dataset, or a mapping
+from dataset directory name to its list. See `AmdTrkEngine.apply` for the format of a correction.
+"""
+import argparse
+import sys
+import yaml
+from ._batch import run_batch
+
+
+def load_corrections(path):
+    """Read a corrections file, JSON or YAML."""
+    with open(path, 'r') as f:
+        corrections = yaml.safe_load(f.read())
+    if corrections is None:
+        return []
+    if not isinstance(corrections, (list, dict)):
+        raise ValueError('Corrections should be a list, or a mapping from dataset name to a list.')
+    return corrections
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='amdtrk',
+                                     description='Correct, re-track and save tracked datasets without a viewer.')
+    parser.add_argument('datasets', nargs='+', help='dataset directories, laid out as for the napari reader.')
+    parser.add_argument('--corrections', help='JSON or YAML file of corrections.')
+    parser.add_argument('--retrack', nargs=2, type=int, metavar=('DISTANCE', 'FRAME_GAP'),
+                        help='re-track with this search distance and frame gap.')
+    parser.add_argument('--linker', help='linking backend for --retrack: trackpy or kdtree, default from the config.')
+    parser.add_argument('--divisions', action='store_true', help='detect divisions and link daughters when re-tracking.')
+    parser.add_argument('--processes', action='store_true',
+                        help='measure frames of each dataset in worker processes sharing its mask.')
+    parser.add_argument('--workers', type=int, default=1, help='datasets processed in parallel, 0 for all cores.')
+    parser.add_argument('--report', help='write the summary report to this CSV.')
+    parser.add_argument('--config', default='config.yaml', help='config file name in each dataset directory.')
+    parser.add_argument('--keep-going', action='store_true', help='skip corrections that fail.')
+    parser.add_argument('--dry-run', action='store_true', help='process without saving.')
+    args = parser.parse_args(argv)
+
+    corrections = load_corrections(args.corrections) if args.corrections else None
+    distance, frame_gap = args.retrack if args.retrack else (None, 0)
+    report = run_batch(args.datasets, corrections, n_workers=args.workers, distance=distance, frame_gap=frame_gap,
+                       save=not args.dry_run, keep_going=args.keep_going, cfgname=args.config, linker=args.linker,
+                       divisions=args.divisions, use_processes=args.processes or None)
+    if args.report:
+        report.drop(columns=['traceback'], errors='ignore').to_csv(args.report, index=False)
+    for tb in report.get('traceback', []):
+        if isinstance(tb, str):
+            print(tb, file=sys.stderr)
+    return 0 if (report['status'] == 'ok').all() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
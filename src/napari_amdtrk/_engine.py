@@ -0,0 +1,1020 @@
+# -*- coding: utf-8 -*-
+import os
+import warnings
+import numpy as np
+from scipy import ndimage
+import skimage.measure as measure
+import pandas as pd
+from ._utils import get_current_time, align_table_and_mask, get_annotation, identity_lut, relabel_frames, \
+    stitch_window, unaligned_frames, BBOX_COLS
+from ._linking import link_objects, link_divisions, LINKERS
+from ._io import imsave_mask, write_table, write_sync_stamp, clear_sync_stamp, writable
+from ._store import TrackStore
+from ._journal import Journal, journaled
+
+
+class AmdTrkEngine:
+    """Edits of a tracked dataset, independent of napari.
+
+    Holds the mask and the object table, with the undo journal, and implements every correction of the
+    widget. `AmdTrkWidget` builds on it with the viewer as the mask holder, `load` opens a dataset
+    directory for headless (batch) use.
+
+    Args:
+        mask (numpy.ndarray): labeled object mask (txy).
+        track (pandas.DataFrame): tracked object table.
+        meta (dict): dataset settings, as in the `segm` layer metadata of the reader:
+            {'frame_base': int, 'stateCol': str, 'stateColName': str, 'track_path': str, 'mask_path': str,
+            'states': list, 'hasState': bool}, optionally 'n_workers', 'export_csv', 'linker', 'mitosis_state',
+            'use_processes' and 'undo_limit'.
+    """
+
+    # methods a correction list can call, see `apply`
+    ACTIONS = ('create_or_replace', 'swap', 'create_parent', 'del_parent', 'correct_cls', 'delete_track',
+               'run_keep_tracks', 'register_obj', 'run_copy_obj', 'edit_div', 'retrack')
+
+    def __init__(self, mask, track, meta):
+        self._mask = mask
+        self.frame_base = meta['frame_base']
+        self.stateCol = meta['stateCol']
+        self.stateColName = meta['stateColName']
+        self.track_path = meta['track_path']
+        self.mask_path = meta['mask_path']
+        self.hasState = meta['hasState']
+        self.states = meta['states']
+        self.n_workers = meta.get('n_workers') or os.cpu_count()  # threads measuring frames on save/retrack
+        self.use_processes = meta.get('use_processes', False)  # measure in processes instead, see `_shm`
+        self.export_csv = meta.get('export_csv', True)  # write the track CSV on save, besides its Parquet cache
+        self.linker = meta.get('linker') or 'trackpy'  # default linking backend of retrack, see `_linking.LINKERS`
+        self.mitosis_state = meta.get('mitosis_state')  # state of mothers before division, helps retrack find them
+
+        # undo/redo history since last save, of the last `undo_limit` actions (0 for all)
+        self.journal = Journal(self._replay, meta.get('undo_limit', 100) or None)
+        self.track = track
+        self.track_count = int(np.max(self.track['trackId']))
+        self.last_reg_id = 0
+        self.label_unassigned = -1
+        self.touched = None  # track IDs edited since last refresh, None to annotate the whole table
+        self.dirty = set()  # mask frames edited since last save, to write on save
+        # mask frames the table may not agree with, to align on save; None if unknown (not saved aligned by us)
+        self.unaligned = set() if meta.get('synced') else None
+        self.bboxes = {}  # per-frame object bounding boxes, built on first use (key: frame, value: {label: bbox})
+
+    @classmethod
+    def load(cls, path, cfgname='config.yaml', use_processes=None):
+        """Open a dataset directory, as laid out for the reader, without the intensity images.
+
+        `use_processes` overrides the config: the mask is then loaded in shared memory, see `_shm`.
+        """
+        from ._reader import read_dataset
+        mask, track, meta = read_dataset(path, cfgname, use_processes)
+        return cls(mask, track, meta)
+
+    def apply(self, corrections, keep_going=False):
+        """Replay a list of corrections, in order.
+
+        Args:
+            corrections (list): each a dict {'action': name, **arguments}, with the name of an edit method
+                in `ACTIONS` and its keyword arguments, e.g. {'action': 'swap', 'track_A': 3, 'frame': 10, 'track_B': 5}.
+            keep_going (bool): skip corrections that fail, instead of raising. A failed correction is rolled back.
+
+        Returns:
+            (list): message of each correction.
+        """
+        msgs = []
+        for k, corr in enumerate(corrections):
+            corr = dict(corr)
+            name = corr.pop('action', None)
+            if name not in self.ACTIONS:
+                raise ValueError('Unknown action ' + str(name) + ' in correction ' + str(k) + '.')
+            try:
+                msgs.append(getattr(self, name)(**corr))
+            except ValueError as e:
+                if not keep_going:
+                    raise ValueError('Correction ' + str(k) + ' (' + name + ') failed: ' + str(e)) from e
+                msgs.append('Skipped correction ' + str(k) + ' (' + name + '): ' + str(e))
+                print(msgs[-1])
+        return msgs
+
+    @property
+    def mask(self):
+        """Labeled object mask."""
+        return self._mask
+
+    def refresh_mask(self):
+        """Called after the mask was edited in place, to redraw it in a viewer."""
+        return
+
+    #================== Edit functions =======================
+
+    @journaled
+    def create_or_replace(self, old_id, frame, new_id=None):
+        """Create a new track ID or replace with some track ID
+        after certain frame. If the old track has daughters, new track ID will be the parent.
+
+        Args:
+            old_id (int): old track ID.
+            frame (int): frame to begin with new ID.
+            new_id (int): new track ID, only required when replacing track identity.
+        """
+        if not self.store.has_track(old_id):
+            raise ValueError('Selected track is not in the table.')
+        old_rows = self.store.rows(old_id)
+        old_frames = self.store.loc[old_rows, 'frame'].to_numpy()
+        if frame not in old_frames:
+            raise ValueError('Selected frame is not in the original track.')
+        relabel = False
+        if not self.store.has_track(new_id):
+            # raise ValueError('Selected new ID not in the table.')
+            relabel = True
+
+        dir_daugs = self.store.daughters(old_id)
+        for dd in dir_daugs:
+            self.del_parent(dd)
+
+        if new_id is None:
+            self.track_count += 1
+            new = self.track_count
+            new_lin = new
+            new_par = 0
+        else:
+            new = new_id
+            if relabel:
+                new_lin = self.store.first(old_id, 'lineageId')
+                if new_lin == old_id: # if this track is a root track, or is not involved in mitosis
+                    new_lin = new
+                new_par = self.store.first(old_id, 'parentTrackId')
+            else:
+                old_frame = list(self.store.loc[self.store.rows(new_id), 'frame'])
+                new_frame = list(old_frames[old_frames >= frame])
+                if len(old_frame + new_frame) != len(set(old_frame + new_frame)):
+                    raise ValueError('Selected new ID track overlaps with old one.')
+                new_lin = self.store.first(new_id, 'lineageId')
+                new_par = self.store.first(new_id, 'parentTrackId')
+        
+        self.store.set(old_rows[old_frames >= frame], {'trackId': new})
+        self.store.set(self.store.rows(new), {'lineageId': new_lin, 'parentTrackId': new_par})
+        
+        # daughters of the new track, change lineage
+        if not relabel:
+            self.store.set_lineage(self.store.descendants(new), new_lin)
+        for dd in dir_daugs:
+            if dd != new:
+                self.create_parent(new, dd)
+        self.mark_touched([old_id, new])
+        
+        msg = 'Track ' + str(old_id) + ' from frame ' + str(frame + self.frame_base) + \
+              ' <- Track ' + str(new) + '.'
+        print(msg)
+        return msg
+
+    @journaled
+    def swap(self, track_A, frame, track_B):
+        """Swap track A with track B after certain frame. If the old track has daughters, new track ID will be the parent.
+
+        Args:
+            track_A (int): track ID A.
+            frame (int): frame to begin with new ID.
+            track_B (int): track ID B.
+        """
+        if not self.store.has_track(track_A):
+            raise ValueError('Selected track is not in the table.')
+        if not self.store.has_track(track_B):
+            raise ValueError('Selected track is not in the table.')
+        rows_A = self.store.rows(track_A)
+        frames_A = self.store.loc[rows_A, 'frame'].to_numpy()
+        if frame not in frames_A:
+            raise ValueError('Selected frame is not in the original track.')
+
+        dir_daugs_A = self.store.daughters(track_A)
+        for dd in dir_daugs_A:
+            self.del_parent(dd)
+        dir_daugs_B = self.store.daughters(track_B)
+        for dd in dir_daugs_B:
+            self.del_parent(dd)
+
+        new_A_lin = self.store.first(track_B, 'lineageId')
+        new_A_par = self.store.first(track_B, 'parentTrackId')
+        new_B_lin = self.store.first(track_A, 'lineageId')
+        new_B_par = self.store.first(track_A, 'parentTrackId')
+
+        # objects after the frame exchange their track identity
+        rows_B = self.store.rows(track_B)
+        rows_B = rows_B[self.store.loc[rows_B, 'frame'].to_numpy() >= frame]
+        rows_A = rows_A[frames_A >= frame]
+        self.store.set(rows_A, {'trackId': track_B, 'lineageId': new_A_lin, 'parentTrackId': new_A_par})
+        self.store.set(rows_B, {'trackId': track_A, 'lineageId': new_B_lin, 'parentTrackId': new_B_par})
+
+        # daughters of the new track, change lineage
+        self.store.set_lineage(self.store.descendants(track_B), new_A_lin)
+        for dd in dir_daugs_A:
+            if dd != track_B:
+                self.create_parent(track_B, dd)
+        self.store.set_lineage(self.store.descendants(track_A), new_B_lin)
+        for dd in dir_daugs_B:
+            if dd != track_A:
+                self.create_parent(track_A, dd)
+        self.mark_touched([track_A, track_B])
+        
+        msg = 'Track ' + str(track_A) + ' from frame ' + str(frame + self.frame_base) + \
+              ' <- swapped with Track ' + str(track_B) + '.'
+        print(msg)
+        return msg
+
+    @journaled
+    def create_parent(self, par, daug):
+        """Create parent-daughter relationship.
+
+        Args:
+            par (int): parent track ID.
+            daug (int): daughter track ID.
+        """
+        if not self.store.has_track(par):
+            raise ValueError('Selected parent is not in the table.')
+        if not self.store.has_track(daug):
+            raise ValueError('Selected daughter is not in the table.')
+
+        ori_par = self.store.first(daug, 'parentTrackId')
+        if ori_par != 0:
+            raise ValueError('One daughter cannot have more than one parent, disassociate ' + str(ori_par) + '-'
+                             + str(daug) + ' first.')
+
+        par_lin = self.store.first(par, 'lineageId')
+        # daughter itself
+        self.store.set(self.store.rows(daug), {'lineageId': par_lin, 'parentTrackId': par})
+        # daughter of the daughter
+        self.store.set_lineage(self.store.descendants(daug), par_lin)
+        self.mark_touched([daug])
+
+        msg =  'Track ' + str(par) + ' linked with ' + str(daug) + '.'
+        print(msg)
+        return msg
+
+    @journaled
+    def del_parent(self, daug):
+        """Remove parent-daughter relationship, for a daughter.
+
+        Args:
+            daug (int): daughter track ID.
+        """
+        if not self.store.has_track(daug):
+            raise ValueError('Selected daughter is not in the table.')
+        if self.store.first(daug, 'parentTrackId') == 0:
+            raise ValueError('Selected daughter does not have a parent.')
+
+        # daughter itself
+        self.store.set(self.store.rows(daug), {'lineageId': daug, 'parentTrackId': 0})
+        # daughters of the daughter, change lineage
+        self.store.set_lineage(self.store.descendants(daug), daug)
+        self.mark_touched([daug])
+
+        msg = 'Track ' + str(daug) + ' unlinked from its mother.'
+        print(msg)
+        return msg
+
+    @journaled
+    def correct_cls(self, trk_id, frame, cls, mode='to_next', end_frame=None):
+        """Correct state classification.
+
+        Args:
+            trk_id (int): track ID to correct.
+            frame (int): frame to correct or begin with correction.
+            cls (str): new state classification ID to assign.
+            mode (str): either 'to_next', 'single', or 'range'
+            end_frame (int): optional, in 'range' mode, stop correction at this frame.
+        """
+        if not self.store.has_track(trk_id):
+            raise ValueError('Selected track is not in the table.')
+        if cls not in self.states:
+            raise ValueError('Input state ID not registered.')
+
+        idx = self.store.rows(trk_id)
+        clss = list(self.store.loc[idx, self.stateColName])
+        frames = list(self.store.loc[idx, 'frame'])
+        if frame not in frames:
+            raise ValueError('Selected frame is not in the original track.')
+        fm_id = frames.index(frame)
+        if mode == 'single':
+            rg = [fm_id]
+        elif mode == 'range':
+            if end_frame not in frames:
+                raise ValueError('Selected end frame is not in the original track.')
+            rg = [i for i in range(fm_id, frames.index(end_frame + 1))]
+        elif mode == 'to_next':
+            cur_cls = clss[fm_id]
+            j = fm_id + 1
+            while j < len(clss):
+                if clss[j] == cur_cls:
+                    j += 1
+                else:
+                    break
+            rg = [i for i in range(fm_id, j)]
+        else:
+            raise ValueError('Mode can only be single, to_next or range, not ' + mode)
+
+        self.store.set(idx[rg], {self.stateColName: cls})
+        self.mark_touched([trk_id])
+        msg = 'Track ' + str(trk_id) + ' state <- ' + str(cls) + ' from ' + \
+              str(frames[rg[0]] + self.frame_base) + ' to ' + str(frames[rg[-1]] + self.frame_base) + '.'
+        print(msg)
+        return msg
+
+    @journaled
+    def delete_track(self, trk_id, frame=None):
+        """Delete entire track. If frame supplied, only delete object at specified frame.
+
+        Args:
+            trk_id (int): track ID.
+            frame (int): time frame.
+        """
+        del_unreg_sel = False
+        if not self.store.has_track(trk_id):
+            if trk_id == 0:
+                del_unreg_sel = True
+            else:
+                raise ValueError('Selected track is not in the table.')
+
+        if del_unreg_sel and frame is None:
+            raise ValueError('No unassigned object in the table, give the frame of the object to delete.')
+        if not del_unreg_sel:
+            del_trk = self.store.track(trk_id)
+        if frame is None and not del_unreg_sel:
+
+            if trk_id != 0:
+                # For all direct daughter of the track to delete, first remove association
+                dir_daugs = self.store.daughters(trk_id)
+                for dd in dir_daugs:
+                    self.del_parent(dd)
+            else:
+                warnings.warn('Deleting all unassigned objects in all frames')
+
+            # Delete entire track
+            for i in range(del_trk.shape[0]):
+                self.clear_label(del_trk['frame'].iloc[i], del_trk['continuous_label'].iloc[i])
+            self.store.drop(del_trk.index)
+            msg = 'Deleted track ' + str(trk_id) + '.'
+        else:
+            if trk_id != 0:
+                del_trk = del_trk[del_trk['frame'] == frame]
+                lb = del_trk['continuous_label'].iloc[0]
+            else:
+                lb = self.label_unassigned
+            self.clear_label(frame, lb)
+            if trk_id != 0:
+                self.store.drop(del_trk.index)
+                msg = 'Deleted track ' + str(trk_id) + ' at frame ' + str(frame) + '.'
+            elif not del_unreg_sel:
+                sub = self.store.loc[self.store.frame_rows(frame), ['trackId', 'continuous_label']]
+                self.store.drop(sub.index[(sub['trackId'] == trk_id) & (sub['continuous_label'] == lb)])
+                msg = 'Deleted unassigned object ' + str(lb) + ' at frame ' + str(frame) + '.'
+            else:
+                msg = 'Deleted an unregistered object.'
+        self.refresh_mask()
+        print(msg)
+        return msg
+
+    @journaled
+    def run_keep_tracks(self, trk_ids):
+        """Only keep tracks specified in the input list.
+        """
+        mask = self.mask
+
+        for trk_id in trk_ids:
+            if self.store.has_track(trk_id):  # no warning if input track is not in the dataset.
+                # For all direct daughters of the track to keep, if not in input list, dissociate.
+                dir_daugs = self.store.daughters(trk_id)
+                for dd in dir_daugs:
+                    if dd not in trk_ids:
+                        self.del_parent(dd)
+                # For parent, if not in input list, dissociate
+                par = self.store.first(trk_id, 'parentTrackId')
+                if par != 0 and par not in trk_ids:
+                    self.del_parent(trk_id)
+        
+        to_drop = [self.store.rows(i) for i in self.store.track_ids() if i not in set(trk_ids)]
+        if to_drop:
+            self.store.drop(np.concatenate(to_drop))
+        # labels of kept objects map to themselves, others to background
+        n = len(identity_lut(mask))
+        chunk_size = 16
+        for start in range(0, mask.shape[0], chunk_size):
+            frames = list(range(start, min(start + chunk_size, mask.shape[0])))
+            luts = np.zeros((len(frames), n), dtype=mask.dtype)
+            for k, frame in enumerate(frames):
+                lb = self.store.loc[self.store.frame_rows(frame), 'continuous_label'].to_numpy()
+                lb = lb[(lb > 0) & (lb < n)]
+                luts[k, lb] = lb
+            relabel_frames(mask, luts, frames, chunk_size=chunk_size, on_change=self._log_frame)
+    
+        self.refresh_mask()
+
+        msg = 'Tracks kept: ' + ','.join(list(map(lambda x:str(x), trk_ids))) + '.'
+        print(msg)
+        return msg
+
+    def save(self, mask_flag=True, progress=None):
+        """Save current table.
+        """
+        return self.save_done(self.save_job(mask_flag)(progress), mask_flag)
+
+    def save_job(self, mask_flag=True):
+        """Snapshot what to save and return the job writing it, see `save`.
+
+        The job only reads the widget state, so it can run in a worker thread while edits are locked.
+        The mask and table are not copied: the job writes from them as they are, and returns a new table.
+        Call `save_done` with its result to apply it.
+
+        Only frames edited since the last save are written, and aligned unless a retrack aligned them since.
+        If the files were not saved aligned by the engine (see `_io.is_synced`), frames whose labels do not
+        match the table are aligned too.
+
+        Returns:
+            (callable): job(progress=None) aligns the table with the mask, writes the mask and the table,
+                and returns the saved table. progress(done, total) is called as mask frames are measured,
+                then written. If it raises (cancel), files on disk are left as they were: it is last called
+                before the mask is moved in place and the table written.
+        """
+        self.getAnn()
+        mask = self.mask
+        track = self.track
+        dirty = sorted(self.dirty)
+        unaligned = None if self.unaligned is None else sorted(self.unaligned)
+
+        def job(progress=None):
+            nonlocal mask, track
+            if mask_flag:
+                frames = unaligned
+                if frames is None:
+                    frames = sorted(set(unaligned_frames(track, mask, self.n_workers)) | set(dirty))
+                if frames:
+                    mask, track = align_table_and_mask(track, mask, align_morph=False, 
+                                                       phase_col=self.stateColName, phase_default=self.states[0],
+                                                       n_workers=self.n_workers, use_processes=self.use_processes,
+                                                       frames=frames, progress=progress, bbox=True)      # warning: align_morph=False
+                imsave_mask(self.mask_path, mask, frames=dirty, progress=progress)
+            elif progress is not None:
+                progress(0, 1)
+            track = track.sort_values(by=['trackId', 'frame'])
+            write_table(self.track_path, track, csv=self.export_csv)
+            if mask_flag:
+                write_sync_stamp(self.mask_path, self.track_path)
+            else:
+                clear_sync_stamp(self.track_path)
+            return track
+        return job
+
+    def save_done(self, track, mask_flag=True):
+        """Apply the result of a save job: the saved table becomes the current one and history is cleared.
+        """
+        if mask_flag:
+            self.dirty = set()
+            self.unaligned = set()
+        self.track = track
+        self.journal.clear()
+        self.touched = None
+        self.bboxes.clear()
+        msg = 'Saved: ' + get_current_time() + '.'
+        return msg
+
+    def revert(self):
+        """Revert to last saved version, by undoing all actions since.
+
+        Actions dropped from the history (see `undo_limit` in the config) can not be reverted.
+        """
+        truncated = self.journal.truncated
+        while self.journal.undo() is not None:
+            pass
+        self.touched = None
+        self.bboxes.clear()
+        msg = 'Reverted: ' + get_current_time() + '.'
+        if truncated:
+            msg += ' Actions older than the undo limit could not be reverted.'
+            warnings.warn(msg)
+        return msg
+    
+    def retrack(self, distance, frame_gap, progress=None, frame_start=None, frame_end=None, margin=None, linker=None,
+                divisions=False):
+        """Re-link objects into tracks, over the whole movie or a window of frames.
+        """
+        job = self.retrack_job(distance, frame_gap, frame_start, frame_end, margin, linker, divisions)
+        return self.retrack_done(job(progress), job.aligned)
+
+    def retrack_job(self, distance, frame_gap, frame_start=None, frame_end=None, margin=None, linker=None,
+                    divisions=False):
+        """Snapshot the table and return the job re-tracking it, see `save_job`.
+
+        Over the whole movie, track IDs are renumbered and mother-daughter links dropped, or detected again
+        with `divisions`. With a window, only
+        objects from `frame_start` to `frame_end` are re-assigned: objects are linked over the window plus
+        `margin` frames on each side, and stitched to the existing tracks through the margins, see `stitch_window`.
+        Tracks and mother-daughter links outside the window are kept. With `divisions`, divisions are detected
+        for daughters starting within the window, see `link_divisions`.
+
+        Args:
+            distance (int): search distance.
+            frame_gap (int): number of frames an object may disappear for.
+            frame_start (int): optional, first frame of the window.
+            frame_end (int): optional, last frame of the window.
+            margin (int): frames linked on each side of the window, default `frame_gap` + 1.
+            linker (str): linking backend, see `_linking.LINKERS`, default `self.linker`.
+            divisions (bool): detect divisions, within `distance` and `frame_gap`. Running tracks are only split
+                with `self.mitosis_state` set.
+
+        Returns:
+            (callable): job(progress=None) returns the re-tracked table, to pass to `retrack_done` with
+                `job.aligned`, the frames the job aligns. progress(done, total) is called as mask frames
+                are measured, then around linking and division detection.
+        """
+        linker = linker or self.linker
+        if linker not in LINKERS:
+            raise ValueError('Unknown linker ' + str(linker) + ', choose from ' + ', '.join(LINKERS) + '.')
+        mask = self.mask
+        trk = self.track  # only read, aligning returns a new table
+        windowed = frame_start is not None or frame_end is not None
+        if windowed:
+            frame_start = 0 if frame_start is None else frame_start
+            frame_end = mask.shape[0] - 1 if frame_end is None else frame_end
+            if frame_end < frame_start:
+                raise ValueError('Window end frame is before its start frame.')
+            margin = frame_gap + 1 if margin is None else margin
+            lo, hi = max(frame_start - margin, 0), min(frame_end + margin, mask.shape[0] - 1)
+        next_id = int(max(self.track_count, np.max(trk['trackId']))) + 1
+
+        def job(progress=None):
+            nonlocal mask, trk
+            # linking steps: before linking, before division detection, done
+            step = progress or (lambda done, total: None)
+            if not windowed:
+                mask, trk = align_table_and_mask(trk, mask, align_morph=False, n_workers=self.n_workers,
+                                                 use_processes=self.use_processes, progress=progress, bbox=True)
+                step(0, 2)
+                trk['trackId'] = link_objects(trk, distance, frame_gap, linker)
+                trk['lineageId'] = trk['trackId']
+                trk['parentTrackId'] = 0
+                step(1, 2)
+                if divisions:
+                    trk = link_divisions(trk, distance, frame_gap, self.stateColName, self.mitosis_state)
+            else:
+                # only frames linked are aligned
+                mask, trk = align_table_and_mask(trk, mask, align_morph=False, phase_col=self.stateColName,
+                                                 phase_default=self.states[0], n_workers=self.n_workers,
+                                                 use_processes=self.use_processes, frames=range(lo, hi + 1),
+                                                 progress=progress, bbox=True)
+                rows = trk.index[((trk['frame'] >= lo) & (trk['frame'] <= hi)).to_numpy()]
+                step(0, 2)
+                particles = link_objects(trk.loc[rows], distance, frame_gap, linker)
+                trk = stitch_window(trk, rows, particles, frame_start, frame_end, next_id)
+                step(1, 2)
+                if divisions:
+                    trk = link_divisions(trk, distance, frame_gap, self.stateColName, self.mitosis_state,
+                                         frames=range(frame_start, frame_end + 1))
+            step(2, 2)
+            trk = trk.sort_values(by=['trackId', 'frame'])
+            trk.index = [_ for _ in range(trk.shape[0])]
+            return trk
+        job.aligned = range(lo, hi + 1) if windowed else range(mask.shape[0])
+        return job
+
+    def retrack_done(self, trk, aligned=()):
+        """Apply the result of a retrack job, as one undoable action.
+
+        Args:
+            trk (pandas.DataFrame): re-tracked table.
+            aligned (range): frames the job aligned with the mask, which the next save then only writes.
+        """
+        with self.journal.action('retrack', lambda: self.store):
+            self.track = trk
+        if self.unaligned is not None:
+            self.unaligned.difference_update(aligned)
+        elif len(aligned) == self.mask.shape[0]:
+            self.unaligned = set()
+        self.track_count = int(max(self.track_count, np.max(trk['trackId'])))
+        self.touched = None
+        self.bboxes.clear()
+        msg = 'Re-tracked.'
+        return msg
+
+    @property
+    def track(self):
+        """Tracked object table, indexed by `self.store`."""
+        return self.store.table
+
+    @track.setter
+    def track(self, table):
+        if hasattr(self, 'store'):
+            self.journal.log_table(self.store)
+        self.store = TrackStore(table, self.journal)
+
+    def undo(self):
+        """Undo the last action.
+        """
+        name = self.journal.undo()
+        msg = 'Nothing to undo.' if name is None else 'Undone: ' + name + '.'
+        print(msg)
+        return msg
+
+    def redo(self):
+        """Redo the last undone action.
+        """
+        name = self.journal.redo()
+        msg = 'Nothing to redo.' if name is None else 'Redone: ' + name + '.'
+        print(msg)
+        return msg
+
+    def _replay(self, entry, undo):
+        """Apply the edits of a journal entry, backward if `undo`.
+        """
+        mask = self.mask
+        frames = set()
+        for op in (reversed(entry.ops) if undo else entry.ops):
+            if op[0] == 'rows':
+                _, labels, before, after = op
+                self.mark_touched(self.store.replace(labels, before if undo else after))
+            elif op[0] == 'table':
+                held = op[1]
+                table, held[0] = held[0], self.store.table
+                self.track = table
+                self.touched = None
+                # the table swapped in was aligned with another state of the mask
+                self.unaligned = None
+            elif op[0] == 'pixels':
+                _, key, idx, old, new = op
+                fr = key[0]
+                if isinstance(fr, slice):
+                    # region over several frames (napari paint), written back whole
+                    region = np.array(mask[key])
+                else:
+                    region = writable(mask, key)
+                if idx is None:
+                    region[...] = old if undo else new
+                else:
+                    region.flat[idx] = old if undo else new
+                if isinstance(fr, slice):
+                    mask[key] = region
+                frames.update(range(*fr.indices(mask.shape[0])) if isinstance(fr, slice) else [fr])
+            else:
+                _, indices, old, new = op
+                mask[indices] = old if undo else new
+                frames.update(np.unique(indices[0]).tolist())
+        self.mark_dirty(frames)
+        self.refresh_mask()
+        return
+
+    def set_mask(self, frame, values, box=None):
+        """Write a frame of the mask, or a bounding box of it, and journal the changed pixels.
+
+        Args:
+            frame (int): time frame.
+            values (numpy.ndarray): new values of the frame or box.
+            box (tuple): optional, (min_row, min_col, max_row, max_col) region to write.
+        """
+        mask = self.mask
+        if box is None:
+            key = (int(frame),)
+        else:
+            key = (int(frame), slice(box[0], box[2]), slice(box[1], box[3]))
+        region = mask[key]
+        idx = np.flatnonzero(region != values)
+        if idx.size:
+            old, new = region.flat[idx], np.asarray(values).flat[idx]
+            self.journal.log_pixels(key, idx, old, new)
+            region = writable(mask, key)
+            region[...] = values
+            boxes = self.bboxes.get(int(frame))
+            self.mark_dirty([frame])
+            if boxes is not None:
+                origin = (0, 0) if box is None else box[:2]
+                self._update_bboxes(boxes, int(frame), origin, region.shape[1], idx, old, new)
+                self.bboxes[int(frame)] = boxes
+        return
+
+    def _update_bboxes(self, boxes, frame, origin, width, idx, old, new):
+        """Update the bounding box index of a frame after some pixels changed.
+
+        Only the old box of each changed label and the changed pixels are scanned.
+        """
+        mask = self.mask
+        rows = idx // width + origin[0]
+        cols = idx % width + origin[1]
+        for lb in set(np.unique(old).tolist()) | set(np.unique(new).tolist()):
+            if lb == 0:
+                continue
+            added = new == lb
+            cand = boxes.get(lb)
+            if added.any():
+                r, c = rows[added], cols[added]
+                grow = (r.min(), c.min(), r.max() + 1, c.max() + 1)
+                cand = grow if cand is None else (min(cand[0], grow[0]), min(cand[1], grow[1]),
+                                                  max(cand[2], grow[2]), max(cand[3], grow[3]))
+            if cand is None:
+                continue
+            hit = mask[frame, cand[0]:cand[2], cand[1]:cand[3]] == lb
+            r, c = np.flatnonzero(hit.any(axis=1)), np.flatnonzero(hit.any(axis=0))
+            if r.size:
+                boxes[lb] = (cand[0] + int(r[0]), cand[1] + int(c[0]), cand[0] + int(r[-1]) + 1, cand[1] + int(c[-1]) + 1)
+            else:
+                boxes.pop(lb, None)
+        return
+
+    def clear_label(self, frame, lbl):
+        """Set pixels of an object to background.
+
+        The box of the object comes from the frame index if built, else from the table (see `table_bbox`), so
+        the edit and its journal entry stay inside the box without scanning the frame. The index of the frame
+        is only built for frames edited since the last save.
+        """
+        frame = int(frame)
+        box = None if frame in self.bboxes else self.table_bbox(frame, lbl)
+        if box is None:
+            box = self.frame_bboxes(frame).get(lbl)
+        if box is not None:
+            crop = self.mask[frame, box[0]:box[2], box[1]:box[3]]
+            self.set_mask(frame, np.where(crop == lbl, 0, crop), box)
+        return
+
+    def _log_frame(self, frame, idx, old, new):
+        """Journal pixels of a frame changed by `relabel_frames`.
+        """
+        self.journal.log_pixels((int(frame),), idx, old, new)
+        self.mark_dirty([frame])
+        return
+
+    def mark_dirty(self, frames):
+        """Register mask frames to align and write on the next save, and drop their bounding box index.
+
+        Args:
+            frames (list): frame indices.
+        """
+        frames = [int(f) for f in frames]
+        for f in frames:
+            self.bboxes.pop(f, None)
+        self.dirty.update(frames)
+        if self.unaligned is not None:
+            self.unaligned.update(frames)
+        return
+
+    def mark_touched(self, trk_ids):
+        """Register track IDs whose annotation should be updated on the next refresh.
+
+        Args:
+            trk_ids (list): track IDs.
+        """
+        if self.touched is not None:
+            self.touched.update(int(i) for i in trk_ids)
+        return
+
+    def getAnn(self, trk_ids=None):
+        """Add an annotation column to tracked object table
+        The annotation format is track ID - (parentTrackId, optional) - stateColName
+
+        Args:
+            trk_ids (set): optional, only annotate rows of these track IDs.
+        """
+        if trk_ids is None:
+            track = self.track
+            if self.hasState:
+                track.loc[pd.isnull(track[self.stateColName]), self.stateColName] = self.states[0]
+            get_annotation(track, self.hasState, self.stateColName)
+            return
+        rows = [self.store.rows(i) for i in trk_ids]
+        if not rows:
+            return
+        sel = np.concatenate(rows)
+        track = self.store.loc[sel].copy()
+        if self.hasState:
+            track.loc[pd.isnull(track[self.stateColName]), self.stateColName] = self.states[0]
+            self.store.loc[sel, self.stateColName] = track[self.stateColName].to_numpy()
+        self.store.loc[sel, 'name'] = get_annotation(track, self.hasState, self.stateColName)['name'].to_numpy()
+        return
+
+    @journaled
+    def edit_div(self, par, daugs, new_frame):
+        """Change division time of parent and daughter to a new time location
+        TODO: check and implement as a widget function
+
+        Args:
+            par (int): parent track ID
+            daugs (list): daughter tracks IDs
+            new_frame (int):
+        """
+        if not self.store.has_track(par):
+            raise ValueError('Selected parent track is not in the table.')
+        for d in daugs:
+            if not self.store.has_track(d):
+                raise ValueError('Selected daughter track is not in the table.')
+            if self.store.first(d, 'parentTrackId') != par:
+                raise ValueError('Selected daughter track does not corresponding to the input parent.')
+
+        new_frame -= 1
+        sub_par = self.store.track(par)
+        time_daugs = []
+        sub_daugs = self.store.loc[np.concatenate([self.store.rows(i) for i in daugs])]
+        time_daugs.extend(list(sub_daugs['frame']))
+        if new_frame not in list(sub_par['frame']) and new_frame not in time_daugs:
+            raise ValueError('Selected new time frame not in either parent or daughter track.')
+
+        if new_frame not in list(sub_par['frame']):
+            # push division later
+            edit = sub_daugs[sub_daugs['frame'] <= new_frame]
+            if len(np.unique(edit['trackId'])) > 1:
+                raise ValueError('Multiple daughters at selected new division, should only have one')
+
+            # get and assign edit index
+            par_id = sub_par['trackId'].iloc[0]
+            par_lin = sub_par['lineageId'].iloc[0]
+            par_par = sub_par['parentTrackId'].iloc[0]
+            self.store.set(edit.index, {'trackId': par_id, 'lineageId': par_lin, 'parentTrackId': par_par})
+        else:
+            new_frame += 1
+            # draw division earlier
+            edit = sub_par[sub_par['frame'] >= new_frame]
+            # pick a daughter that appears earlier and assign tracks to that daughter
+            f_min = np.argmin(sub_daugs['frame'])
+            if len(np.unique(sub_daugs[sub_daugs['frame'] == f_min]['trackId'])) > 1:
+                raise ValueError('Multiple daughters exist at frame of mitosis, should only be one. '
+                                 'Or break mitotic track first.')
+            trk = list(sub_daugs['trackId'])[int(f_min)]
+            sel_daugs = sub_daugs[sub_daugs['trackId'] == trk]
+
+            # get and assign edit index
+            daug_id = sel_daugs['trackId'].iloc[0]
+            daug_par = sel_daugs['parentTrackId'].iloc[0]
+            daug_lin = sel_daugs['lineageId'].iloc[0]
+            self.store.set(edit.index, {'trackId': daug_id, 'parentTrackId': daug_par, 'lineageId': daug_lin})
+
+        self.mark_touched([par] + list(daugs))
+        return
+
+    @journaled
+    def register_obj(self, obj_id, frame, trk_id, cls):
+        """Register a new object that has been drawn on the mask
+
+        Args:
+            obj_id (int): Object ID of the drawn mask.
+            frame (int): Frame location.
+            trk_id (int): Track ID.
+            cls (str): State id.
+        """
+        mask = self.mask
+        msk_slice = mask[frame, :, :]
+        trk_slice = self.store.loc[self.store.frame_rows(frame)]
+        untracked = False if int(trk_id) > 0 else True          # register as an untracked object
+        idx = self.store.row_at(frame, obj_id)
+        if idx is not None:
+            if self.store.at[idx, 'trackId'] == 0:
+                # assign information to untracked object
+                values = {'trackId': trk_id, 'lineageId': trk_id}
+                if self.hasState:
+                    values[self.stateColName] = cls
+                self.store.set([idx], values)
+                self.mark_touched([trk_id])
+                msg = 'Assign obj: track ' + str(trk_id) + '; frame ' + str(frame) + '; state ' + cls + '.'
+                self.last_reg_id = trk_id
+                return msg
+            else:
+                raise ValueError('Object label has been used, draw with a bigger label. Current max label: ' +
+                                  str(np.max(trk_slice['continuous_label'])))
+        if trk_id in list(trk_slice['trackId']) and trk_id != 0:
+            raise ValueError('Track ID already exists in the selected frame.')
+        if cls not in self.states:
+            raise ValueError('Given state ID not registered.')
+        if obj_id not in msk_slice:
+            raise ValueError('Object ID is not in the given frame of mask. Draw again. Current max label: ' +
+                             str(np.max(trk_slice['continuous_label'])))
+
+        new_row = {'frame': frame, 'trackId': trk_id, 'continuous_label': obj_id,
+                   # below fields are not essential for the input and should have been init by default value already
+                   self.stateColName: cls}
+        if self.store.has_track(trk_id):
+            # pld track
+            old_lin = self.store.first(trk_id, 'lineageId')
+            old_par = self.store.first(trk_id, 'parentTrackId')
+            new_row['lineageId'] = old_lin
+            new_row['parentTrackId'] = old_par
+            if old_par != 0:
+                nm = '-'.join([str(trk_id), str(old_par), cls])
+            else:
+                nm = '-'.join([str(trk_id), cls])
+        elif untracked:
+            new_row['lineageId'] = 0
+            new_row['trackId'] = 0
+            new_row['parentTrackId'] = 0
+            nm = 'unassigned'
+        else:
+            # New track
+            self.track_count = int(np.max((self.track_count, trk_id)))
+            new_row['lineageId'] = trk_id
+            new_row['parentTrackId'] = 0
+            nm = '-'.join([str(trk_id), cls])
+        new_row['name'] = nm
+
+        # Register measurements of the object morphology.
+        misc = np.zeros(msk_slice.shape, dtype='uint8')
+        misc[msk_slice == obj_id] = 1
+        p = measure.regionprops(label_image=misc)[0]
+        y, x = p.centroid
+        new_row['Center_of_the_object_0'] = x
+        new_row['Center_of_the_object_1'] = y
+        # For extra fields
+        for i in set(list(self.store.columns)) - set(list(new_row.keys())):
+            new_row[i] = np.nan
+        
+        self.store.append(pd.DataFrame.from_dict([new_row]))
+        self.mark_touched([trk_id])
+        if trk_id != 0:
+            msg = 'New obj: track ' + str(trk_id) + '; frame ' + str(frame) + '; state ' + cls + '.'
+        else:
+            msg = 'New unassigned obj: ' + 'frame ' + str(frame) + '; state ' + cls + '.'
+        self.last_reg_id = trk_id
+        return msg
+
+    @journaled
+    def run_copy_obj(self, ID, fromFrame, toFrame):
+        # copy object (labeled as ID) from frame A to frame B, will overlap on existing objects on B.
+        if fromFrame == toFrame:
+            raise ValueError('Cannot copy object on the same frame.')
+        idx = self.store.row_at(fromFrame, ID)
+        row = self.store.loc[[] if idx is None else [idx]].copy()
+        mask = self.mask
+        if row.shape[0] != 1:
+            # If unassigned object found in fromFrame, register it first.
+            if self.get_bbox(fromFrame, ID) is not None:
+                self.register_obj(obj_id=ID, frame=fromFrame, trk_id=0, cls=self.states[0])
+                row = self.store.loc[[self.store.row_at(fromFrame, ID)]].copy()
+            else:
+                raise ValueError('ID not found in fromFrame.')
+        
+        tar_mx = self.get_mx(toFrame)
+        row.loc[row.index, 'continuous_label'] = tar_mx + 1
+        row.loc[row.index, 'frame'] = toFrame
+        self.store.append(row)
+        self.mark_touched(row['trackId'])
+        box = self.get_bbox(fromFrame, ID)
+        toMask = mask[toFrame, box[0]:box[2], box[1]:box[3]].copy()
+        fromMask = mask[fromFrame, box[0]:box[2], box[1]:box[3]]
+        toMask[fromMask==ID] = tar_mx + 1
+        self.set_mask(toFrame, toMask, box)
+        self.refresh_mask()
+        msg = ''
+        return msg
+
+    def frame_bboxes(self, frame):
+        """Bounding boxes of the objects in a frame, {label: (min_row, min_col, max_row, max_col)}.
+
+        The index of a frame is built with one pass over the frame on first query. It is kept up to
+        date by `set_mask`, and dropped when the frame is edited otherwise (painting, undo).
+        """
+        frame = int(frame)
+        if frame not in self.bboxes:
+            slices = ndimage.find_objects(np.asarray(self.mask[frame]))
+            self.bboxes[frame] = {i + 1: (s[0].start, s[1].start, s[0].stop, s[1].stop)
+                                  for i, s in enumerate(slices) if s is not None}
+        return self.bboxes[frame]
+
+    def table_bbox(self, frame, lbl):
+        """Bounding box of an object from the `BBOX_COLS` columns of the table.
+
+        The columns are written for the frames aligned on save and retrack. They are only trusted for frames
+        aligned since, and not edited after (not in `self.unaligned`).
+
+        Returns:
+            (tuple): min_row, min_col, max_row, max_col (exclusive), None if unknown or possibly stale.
+        """
+        frame = int(frame)
+        if self.unaligned is None or frame in self.unaligned or BBOX_COLS[0] not in self.store.columns:
+            return None
+        row = self.store.row_at(frame, lbl)
+        if row is None:
+            return None
+        box = self.store.loc[row, BBOX_COLS].to_numpy(dtype='float64')
+        if np.isnan(box).any():
+            return None
+        return tuple(int(v) for v in box)
+
+    def get_bbox(self, frame, lbl, pixel=None):
+        """Bounding box of an object, from the frame index in `self.bboxes` or the table (see `table_bbox`).
+
+        The index of the frame is rebuilt if the object is missing, or if `pixel` falls outside the cached box.
+
+        Args:
+            frame (int): time frame.
+            lbl (int): object label on the mask.
+            pixel (tuple): optional, (row, col) known to belong to the object.
+
+        Returns:
+            (tuple): min_row, min_col, max_row, max_col (exclusive), as in regionprops.
+        """
+        frame = int(frame)
+        box = None if frame in self.bboxes else self.table_bbox(frame, lbl)
+        if box is not None and (pixel is None or (box[0] <= pixel[0] < box[2] and box[1] <= pixel[1] < box[3])):
+            return box
+        box = self.frame_bboxes(frame).get(lbl)
+        if box is None or (pixel is not None and not (box[0] <= pixel[0] < box[2] and box[1] <= pixel[1] < box[3])):
+            del self.bboxes[frame]
+            box = self.frame_bboxes(frame).get(lbl)
+        return box
+
+    def get_mx(self, frame):
+        mask = self.mask
+        return int(np.max(mask[frame,:,:]))
+
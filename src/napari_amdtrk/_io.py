@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+import tifffile
+import skimage.io as io
+
+
+def is_zarr(path):
+    """Whether a path is a Zarr array store (a `.zarr` directory), otherwise it is read as a TIFF.
+    """
+    return path.rstrip('/\\').endswith('.zarr')
+
+
+def imread_lazy(path, writable=False):
+    """Open a TIFF stack or a Zarr store without reading it into memory.
+
+    Uncompressed, contiguous files are memory-mapped. Other files are wrapped as a dask array
+    with one chunk per frame (page), so only frames being viewed are decoded. Zarr stores are returned
+    as they are, napari decodes the chunks on display, or as a `FrameStack` if writable.
+
+    Args:
+        path (str): path to the TIFF file.
+        writable (bool): the returned array should accept in-memory edits (e.g. the mask painted in napari).
+            Memory-mapped files are then opened copy-on-write, the file on disk is never touched.
+            Zarr stores keep edited frames in memory. Other files that can not be memory-mapped are read entirely.
+
+    Returns:
+        (numpy.memmap or dask.array.Array or FrameStack or numpy.ndarray): image stack.
+    """
+    if is_zarr(path):
+        import zarr
+        # frames are decoded on display, and kept in memory once edited
+        return FrameStack(path) if writable else zarr.open(path, mode='r')
+    try:
+        return tifffile.memmap(path, mode='c' if writable else 'r')
+    except ValueError:
+        # compressed or non-contiguous file
+        pass
+    if writable:
+        return io.imread(path)
+
+    import dask
+    import dask.array as da
+    with tifffile.TiffFile(path) as tif:
+        series = tif.series[0]
+        shape, dtype = series.shape, series.dtype
+        n_pages = len(series.pages)
+    if len(shape) < 3 or n_pages != shape[0]:
+        # pages do not map to frames
+        return io.imread(path)
+
+    read_page = dask.delayed(tifffile.imread, pure=True)
+    frames = [da.from_delayed(read_page(path, key=i), shape=shape[1:], dtype=dtype) for i in range(shape[0])]
+    return da.stack(frames, axis=0)
+
+
+class FrameStack:
+    """Stack of a Zarr store chunked by frame, read frame by frame, with edited frames kept in memory.
+
+    Like a copy-on-write memory map: reading a frame decodes it without keeping it, `edit` decodes a frame
+    once and keeps it, and reads of that frame return the edited copy. The store is never touched, edits are
+    written back by `imsave_mask`. Reads of frames not edited are read-only, writes go through `__setitem__`
+    or `writable`. NumPy functions given the whole stack (e.g. `np.asarray`) read every frame.
+
+    Args:
+        path (str): path to the Zarr store.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.edited = {}  # edited frames, by index
+        self.reopen()
+        self.dtype = np.dtype(self.store.dtype)
+        self.ndim = len(self.shape)
+
+    def reopen(self):
+        """Open the store again, e.g. after it was rebuilt with another dtype. Frames are still read as
+        the dtype first opened, edits are kept."""
+        import zarr
+        self.store = zarr.open(self.path, mode='r')
+        self.shape = tuple(self.store.shape)
+        return
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None):
+        stack = self[:]
+        return stack if dtype is None else stack.astype(dtype)
+
+    def edit(self, frame):
+        """Frame in memory, decoded on first edit, to write to in place.
+        """
+        frame = int(frame) % self.shape[0]
+        if frame not in self.edited:
+            self.edited[frame] = np.array(self.store[frame], dtype=self.dtype)
+        return self.edited[frame]
+
+    def _read(self, frame):
+        if frame in self.edited:
+            return self.edited[frame]
+        arr = np.asarray(self.store[frame]).astype(self.dtype, copy=False)
+        arr.setflags(write=False)
+        return arr
+
+    def _key(self, key):
+        key = key if isinstance(key, tuple) else (key,)
+        if any(k is Ellipsis for k in key):
+            i = [k is Ellipsis for k in key].index(True)
+            key = key[:i] + (slice(None),) * (self.ndim - len(key) + 1) + key[i + 1:]
+        return key[0], key[1:]
+
+    def __getitem__(self, key):
+        first, rest = self._key(key)
+        if isinstance(first, (int, np.integer)):
+            return self._read(int(first) % self.shape[0])[rest]
+        if any(np.ndim(k) > 0 for k in rest):
+            # points, e.g. painted pixels: fancy indices of the same length
+            first, *rest = np.broadcast_arrays(first, *[k for k in rest])
+            out = np.empty(first.shape, dtype=self.dtype)
+            for f in np.unique(first).tolist():
+                sel = first == f
+                out[sel] = self._read(f % self.shape[0])[tuple(k[sel] for k in rest)]
+            return out
+        frames = np.arange(self.shape[0])[first]
+        if not frames.size:
+            return np.zeros((0,) + np.empty(self.shape[1:], dtype='bool')[rest].shape, dtype=self.dtype)
+        return np.stack([self._read(f)[rest] for f in frames.tolist()])
+
+    def __setitem__(self, key, value):
+        first, rest = self._key(key)
+        if isinstance(first, (int, np.integer)):
+            self.edit(first)[rest] = value
+            return
+        if any(np.ndim(k) > 0 for k in rest):
+            first, *rest = np.broadcast_arrays(first, *[k for k in rest])
+            value = np.broadcast_to(value, first.shape)
+            for f in np.unique(first).tolist():
+                sel = first == f
+                self.edit(f)[tuple(k[sel] for k in rest)] = value[sel]
+            return
+        frames = np.arange(self.shape[0])[first].tolist()
+        value = np.broadcast_to(value, (len(frames),) + np.empty(self.shape[1:], dtype='bool')[rest].shape)
+        for k, f in enumerate(frames):
+            self.edit(f)[rest] = value[k]
+        return
+
+
+def writable(mask, key):
+    """Writable view of `mask[key]`, for a key starting with a frame index.
+
+    Args:
+        mask (numpy.ndarray or FrameStack): labeled object mask.
+        key (tuple): (frame, ...) index.
+    """
+    if isinstance(mask, FrameStack):
+        return mask.edit(key[0])[tuple(key[1:])]
+    return mask[key]
+
+
+def imsave_mask(path, mask, frames=None, progress=None):
+    """Write the mask stack, as uint8 if labels allow.
+
+    The file is written aside and moved over the old one, so a stack still memory-mapped
+    from `path` stays readable during the write. Frames are converted and written one at a time,
+    the stack is never copied whole.
+
+    Args:
+        path (str): path to the mask TIFF, or to a Zarr store (`.zarr`) chunked by frame.
+        mask (numpy.ndarray): labeled object mask.
+        frames (list): optional, frames changed since the file was written. If the file on disk is an
+            uncompressed TIFF or a Zarr store of the same shape and its dtype holds the new labels,
+            only these frames (pages or chunks) are overwritten in place. Otherwise the whole stack is written.
+        progress (callable): optional, progress(done, total) is called before anything is written, then
+            after each frame written aside. If it raises (e.g. the job was cancelled), the file on disk is
+            left as it was. Frames overwritten in place are written after the first call only.
+    """
+    if progress is not None:
+        progress(0, mask.shape[0])
+    if is_zarr(path):
+        _write_zarr(path, mask, frames, progress)
+        return
+    if frames is not None and _write_frames(path, mask, sorted(frames)):
+        return
+    dtype = np.dtype('uint8') if int(np.max(mask)) <= 255 else mask.dtype
+    tmp = path + '.tmp'
+    try:
+        # one contiguous, uncompressed series, as `imwrite` would write it, so frames can be memory-mapped
+        with tifffile.TiffWriter(tmp, bigtiff=mask.size * dtype.itemsize > 2**32 - 2**25) as tif:
+            for f in range(mask.shape[0]):
+                tif.write(np.asarray(mask[f]).astype(dtype, copy=False), photometric='minisblack', contiguous=True)
+                if progress is not None:
+                    progress(f + 1, mask.shape[0])
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, path)
+    return
+
+
+def _write_frames(path, mask, frames):
+    """Overwrite frames of a memory-mappable TIFF in place, return False if not possible.
+    """
+    if not frames:
+        return True
+    try:
+        disk = tifffile.memmap(path, mode='r+')
+    except (ValueError, OSError):
+        return False
+    if disk.shape != mask.shape:
+        return False
+    new = np.asarray(mask[frames])
+    if np.issubdtype(disk.dtype, np.integer) and int(np.max(new)) > np.iinfo(disk.dtype).max:
+        return False
+    disk[frames] = new
+    disk.flush()
+    del disk
+    return True
+
+
+def _write_zarr(path, mask, frames=None, progress=None):
+    """Write frames of the mask to a Zarr store with one chunk per frame.
+
+    The store is created, or rebuilt aside and moved over the old one, if it does not fit the mask.
+    `progress` is called after each frame written aside, see `imsave_mask`.
+    """
+    import zarr
+    frames = range(mask.shape[0]) if frames is None else sorted(frames)
+    if os.path.isdir(path):
+        try:
+            store = zarr.open(path, mode='r+')
+        except (ValueError, OSError, KeyError):
+            store = None
+        if store is not None and store.shape == mask.shape and (not frames or not np.issubdtype(store.dtype, np.integer)
+                                                                or int(np.max(mask[frames])) <= np.iinfo(store.dtype).max):
+            for f in frames:
+                store[f] = np.asarray(mask[f])
+            return
+
+    # frame by frame, a FrameStack is never read whole
+    top = max([int(np.max(mask[f])) for f in range(mask.shape[0])], default=0)
+    dtype = 'uint8' if top <= 255 else mask.dtype
+    head, tail = os.path.split(path.rstrip('/\\'))
+    tmp = os.path.join(head, '.' + tail + '.tmp')  # hidden from the reader's suffix matching
+    if os.path.isdir(tmp):
+        shutil.rmtree(tmp)
+    # default codec of the zarr version installed (Blosc or Zstd), fast and lossless
+    try:
+        store = zarr.open(tmp, mode='w', shape=mask.shape, chunks=(1,) + tuple(mask.shape[1:]), dtype=dtype)
+        for f in range(mask.shape[0]):
+            store[f] = np.asarray(mask[f]).astype(dtype, copy=False)
+            if progress is not None:
+                progress(f + 1, mask.shape[0])
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.replace(tmp, path)
+    if isinstance(mask, FrameStack) and os.path.abspath(mask.path) == os.path.abspath(path):
+        mask.reopen()
+    return
+
+
+def table_cache_path(path):
+    """Path of the columnar cache of a track table, hidden next to the CSV.
+
+    The leading dot keeps the reader from matching it as the track file.
+    """
+    head, tail = os.path.split(path)
+    return os.path.join(head, '.' + tail + '.parquet')
+
+
+def read_table(path):
+    """Read a track table, from its Parquet cache if it is newer than the CSV.
+
+    The cache is (re)written after parsing the CSV. It needs `pyarrow`, without it the CSV is always parsed.
+
+    Args:
+        path (str): path to the track CSV.
+
+    Returns:
+        (pandas.DataFrame): track table.
+    """
+    cache = table_cache_path(path)
+    if os.path.exists(cache) and (not os.path.exists(path) or os.path.getmtime(cache) >= os.path.getmtime(path)):
+        try:
+            return pd.read_parquet(cache)
+        except (ImportError, ValueError, OSError):
+            pass
+    table = pd.read_csv(path)
+    _write_cache(cache, table)
+    return table
+
+
+def write_table(path, table, csv=True, compression='snappy'):
+    """Write a track table as CSV and as its Parquet cache, see `read_table`.
+
+    Args:
+        path (str): path to the track CSV.
+        table (pandas.DataFrame): track table.
+        csv (bool): also export the CSV. If False, only the cache is written, which the reader then
+            prefers as it is newer. The CSV is still written if the cache can not be.
+        compression (str): Parquet codec, e.g. 'snappy', 'zstd' or None.
+    """
+    cache = table_cache_path(path)
+    if csv:
+        table.to_csv(path, index=None)
+    if not _write_cache(cache, table, compression) and not csv:
+        table.to_csv(path, index=None)
+    return
+
+
+def _write_cache(cache, table, compression='snappy'):
+    """Write the Parquet cache of a table, return False if not possible.
+
+    A failed write removes the old cache so it is never read in place of a newer CSV.
+    """
+    tmp = cache + '.tmp'
+    try:
+        table.to_parquet(tmp, index=False, compression=compression)
+        os.replace(tmp, cache)
+        return True
+    except (ImportError, ValueError, TypeError, OSError):
+        for f in (tmp, cache):
+            if os.path.exists(f):
+                os.remove(f)
+        return False
+
+
+def sync_stamp_path(track_path):
+    """Path of the stamp recording that the mask and the table on disk agree, hidden next to the CSV.
+    """
+    head, tail = os.path.split(track_path)
+    return os.path.join(head, '.' + tail + '.sync')
+
+
+def _file_stamps(mask_path, track_path):
+    paths = [mask_path, track_path, table_cache_path(track_path)]
+    return [[os.path.basename(p), os.stat(p).st_mtime_ns, os.stat(p).st_size] for p in paths if os.path.exists(p)]
+
+
+def write_sync_stamp(mask_path, track_path):
+    """Record that the table was aligned with the mask as they are now on disk, see `is_synced`.
+    """
+    with open(sync_stamp_path(track_path), 'w') as f:
+        json.dump(_file_stamps(mask_path, track_path), f)
+    return
+
+
+def clear_sync_stamp(track_path):
+    """Forget that the mask and the table on disk agree, e.g. after writing only one of them.
+    """
+    path = sync_stamp_path(track_path)
+    if os.path.exists(path):
+        os.remove(path)
+    return
+
+
+def is_synced(mask_path, track_path):
+    """Whether the mask and the table on disk are unchanged since they were last saved aligned together.
+
+    Any change of modification time or size of either file, e.g. by another program, voids the stamp.
+    """
+    try:
+        with open(sync_stamp_path(track_path)) as f:
+            return json.load(f) == _file_stamps(mask_path, track_path)
+    except (OSError, ValueError):
+        return False
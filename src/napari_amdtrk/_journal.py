@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+import functools
+from contextlib import contextmanager
+import pandas as pd
+
+
+class _Entry:
+    """Edits of one action, in the order they were made.
+
+    Ops:
+        - ('rows', labels, before, after): table rows by index label; labels missing from `before`
+          did not exist before the action, labels missing from `after` were dropped by it.
+        - ('table', held): the whole table was replaced. `held` is a one-item list with the table not in
+          use, swapped with the current one on replay: the table before the action until it is undone,
+          then the one after it.
+        - ('pixels', key, idx, old, new): mask region `key` (basic indexing), with changed pixels at
+          flat indices `idx` into the region, or the whole region if `idx` is None.
+        - ('points', indices, old, new): mask pixels at fancy `indices`.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.ops = []
+        self._labels = None
+        self._before = None
+
+    def log_rows(self, store, labels):
+        if self._labels is None:
+            self._labels, self._before = set(), []
+        new = [l for l in labels if l not in self._labels]
+        if not new:
+            return
+        self._labels.update(new)
+        # appended rows are not in the table yet
+        existing = store.present(new)
+        if existing:
+            self._before.append(store.loc[existing].copy())
+        return
+
+    def close_rows(self, store):
+        """Read the rows after the edit, closing the current rows op."""
+        if self._labels is None:
+            return
+        labels = list(self._labels)
+        before = pd.concat(self._before) if self._before else store.loc[[]].copy()
+        after = store.loc[store.present(labels)].copy()
+        self.ops.append(('rows', labels, before, after))
+        self._labels, self._before = None, None
+        return
+
+
+class Journal:
+    """Undo/redo history of widget actions, stored as deltas instead of copies of the table and mask.
+
+    Edits are recorded while an action is open (see `action` and `journaled`): the track store logs the
+    rows it is about to change, and mask edits log the old and new values of changed pixels.
+    Nested actions are recorded into the outermost one. If an action raises, its edits are undone.
+
+    Args:
+        replay (callable): replay(entry, undo) applies an entry to the widget, backward if `undo`.
+        max_entries (int): optional, number of actions kept for undo. Older ones are dropped, and
+            `truncated` is then set as the history no longer goes back to where it was cleared.
+    """
+
+    def __init__(self, replay, max_entries=None):
+        self.replay = replay
+        self.max_entries = max_entries
+        self.undo_stack = []
+        self.redo_stack = []
+        self.truncated = False
+        self._entry = None
+        self._depth = 0
+        self._store = None
+
+    @contextmanager
+    def action(self, name, store=None):
+        """Record edits made in the block as one entry.
+
+        Args:
+            name (str): action name.
+            store (callable): returns the current track store, read when the entry is closed.
+        """
+        if self._depth == 0:
+            self._entry = _Entry(name)
+            self._store = store
+        self._depth += 1
+        try:
+            yield self._entry
+        except BaseException:
+            self._depth -= 1
+            if self._depth == 0:
+                entry = self._close()
+                self.replay(entry, True)
+            raise
+        self._depth -= 1
+        if self._depth == 0:
+            entry = self._close()
+            if entry.ops:
+                self.undo_stack.append(entry)
+                self.redo_stack = []
+                if self.max_entries is not None and len(self.undo_stack) > self.max_entries:
+                    del self.undo_stack[:len(self.undo_stack) - self.max_entries]
+                    self.truncated = True
+        return
+
+    def _close(self):
+        entry = self._entry
+        if self._store is not None:
+            entry.close_rows(self._store())
+        self._entry, self._store = None, None
+        return entry
+
+    #================== Logging =======================
+
+    def log_rows(self, store, labels):
+        """Log rows of a track store about to change, by index label."""
+        if self._entry is not None:
+            self._entry.log_rows(store, labels)
+        return
+
+    def log_table(self, store):
+        """Log a replacement of the whole table, before it happens.
+
+        Only the table being replaced is kept: the new one is the current table until the action is undone.
+
+        Args:
+            store (TrackStore): store of the table being replaced, must not be modified afterwards.
+        """
+        if self._entry is not None:
+            self._entry.close_rows(store)
+            self._entry.ops.append(('table', [store.table]))
+        return
+
+    def log_pixels(self, key, idx, old, new):
+        """Log mask pixels changed in region `key`."""
+        if self._entry is not None:
+            self._entry.ops.append(('pixels', key, idx, old, new))
+        return
+
+    def log_points(self, indices, old, new):
+        """Log mask pixels changed at fancy `indices`."""
+        if self._entry is not None:
+            self._entry.ops.append(('points', indices, old, new))
+        return
+
+    #================== History =======================
+
+    def can_undo(self):
+        return len(self.undo_stack) > 0
+
+    def can_redo(self):
+        return len(self.redo_stack) > 0
+
+    def undo(self):
+        """Undo the last action, return its name or None."""
+        if not self.undo_stack:
+            return None
+        entry = self.undo_stack.pop()
+        self.replay(entry, True)
+        self.redo_stack.append(entry)
+        return entry.name
+
+    def redo(self):
+        """Redo the last undone action, return its name or None."""
+        if not self.redo_stack:
+            return None
+        entry = self.redo_stack.pop()
+        self.replay(entry, False)
+        self.undo_stack.append(entry)
+        return entry.name
+
+    def clear(self):
+        self.undo_stack = []
+        self.redo_stack = []
+        self.truncated = False
+        return
+
+
+def journaled(method):
+    """Record a widget method as one undoable action of `self.journal`."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.journal.action(method.__name__, lambda: self.store):
+            return method(self, *args, **kwargs)
+    return wrapper
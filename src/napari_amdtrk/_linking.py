@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""Linking backends: assign objects of consecutive frames to tracks.
+
+A linker is a function linker(table, distance, frame_gap) returning the track ID of each row of the table,
+starting from 1. It reads the `frame`, `Center_of_the_object_0` and `Center_of_the_object_1` columns.
+Mother-daughter links are recovered afterwards from linked tracks, see `link_divisions`.
+"""
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+from scipy.spatial import cKDTree
+from ._utils import resolve_lineage
+
+
+def link_trackpy(table, distance, frame_gap):
+    """Link with `trackpy.link`, adaptive search down to 40% of `distance` in dense regions."""
+    import trackpy
+    pos = table[['frame', 'Center_of_the_object_0', 'Center_of_the_object_1']].reset_index(drop=True)
+    pos['index'] = np.arange(pos.shape[0])
+    t = trackpy.link(pos, search_range=distance, memory=frame_gap, adaptive_stop=0.4*distance, 
+                     pos_columns=['Center_of_the_object_0', 'Center_of_the_object_1'])
+    ids = np.zeros(pos.shape[0], dtype='int64')
+    ids[t['index'].to_numpy()] = t['particle'].to_numpy() + 1   # trackpy output start from ID=0
+    return ids
+
+
+def _assign(src, dst, cost, n_src, n_dst, cutoff):
+    """Minimum cost assignment between two sets, where any element may stay unassigned at cost `cutoff`.
+
+    Candidate pairs (src, dst) are given sparse. Each set is padded with one dummy per element of the other
+    set, and the problem solved as a full bipartite matching on the sparse augmented matrix.
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray): assigned source and destination indices.
+    """
+    n = n_src + n_dst
+    eps = cutoff * 1e-6
+    rows = np.concatenate([src, np.arange(n_src), n_src + np.arange(n_dst), n_src + dst])
+    cols = np.concatenate([dst, n_dst + np.arange(n_src), np.arange(n_dst), n_dst + src])
+    vals = np.concatenate([cost + eps, np.full(n_src, cutoff), np.full(n_dst, cutoff), np.full(src.size, eps)])
+    graph = sparse.csr_matrix((vals, (rows, cols)), shape=(n, n))
+    r, c = min_weight_full_bipartite_matching(graph)
+    real = (r < n_src) & (c < n_dst)
+    return r[real], c[real]
+
+
+def link_kdtree(table, distance, frame_gap, n_neighbors=8):
+    """Link frame to frame by global assignment, with candidates from a KD-tree.
+
+    Each frame, the end of every track seen within the last `frame_gap` + 1 frames is matched against the
+    objects of the frame: the `n_neighbors` nearest objects within `distance` are candidates, and a minimum
+    total distance assignment is solved on the sparse candidate graph. Ends of tracks and objects left
+    unassigned cost `distance`, so every candidate link is preferred to no link. Links across a gap
+    cost slightly more than direct ones at equal distance.
+
+    Cost per frame grows with the number of candidate pairs, not with the size of linked subnetworks.
+    """
+    frame = table['frame'].to_numpy()
+    pos = table[['Center_of_the_object_0', 'Center_of_the_object_1']].to_numpy(dtype='float')
+    ids = np.zeros(frame.size, dtype='int64')
+    order = np.argsort(frame, kind='stable')
+    fs = frame[order]
+    bounds = np.flatnonzero(np.r_[True, fs[1:] != fs[:-1], True]) if fs.size else [0]
+
+    # track ends: position, frame and ID
+    end_pos, end_frame, end_id = np.zeros((0, 2)), np.zeros(0, dtype=fs.dtype), np.zeros(0, dtype='int64')
+    next_id = 1
+    for k in range(len(bounds) - 1):
+        rows = order[bounds[k]:bounds[k + 1]]
+        t = fs[bounds[k]]
+        alive = end_frame >= t - frame_gap - 1
+        end_pos, end_frame, end_id = end_pos[alive], end_frame[alive], end_id[alive]
+        p = pos[rows]
+        new = np.zeros(rows.size, dtype='int64')
+        src = dst = np.zeros(0, dtype='int64')
+        if end_id.size:
+            nn = min(n_neighbors, rows.size)
+            d, j = cKDTree(p).query(end_pos, k=nn, distance_upper_bound=distance)
+            d, j = d.reshape(end_id.size, nn), j.reshape(end_id.size, nn)
+            hit = np.isfinite(d)
+            if hit.any():
+                cand = np.repeat(np.arange(end_id.size), nn).reshape(hit.shape)[hit]
+                cost = d[hit] + 1e-3 * distance * (t - end_frame[cand] - 1)
+                src, dst = _assign(cand, j[hit], cost, end_id.size, rows.size, distance)
+                new[dst] = end_id[src]
+        fresh = new == 0
+        new[fresh] = np.arange(next_id, next_id + fresh.sum())
+        next_id += int(fresh.sum())
+        ids[rows] = new
+
+        # linked tracks move their end, new tracks start one
+        end_pos[src] = p[dst]
+        end_frame[src] = t
+        end_pos = np.concatenate([end_pos, p[fresh]])
+        end_frame = np.concatenate([end_frame, np.full(int(fresh.sum()), t, dtype=end_frame.dtype)])
+        end_id = np.concatenate([end_id, new[fresh]])
+    return ids
+
+
+# registered linkers, by name
+LINKERS = {'trackpy': link_trackpy, 'kdtree': link_kdtree}
+
+
+def register_linker(name, linker):
+    """Make a linker available to `link_objects` (and to the widget and batch runner) under a name."""
+    LINKERS[name] = linker
+    return
+
+
+def link_objects(table, distance, frame_gap, linker='trackpy'):
+    """Link objects of consecutive frames into tracks.
+
+    Args:
+        table (pandas.DataFrame): object table with frame and center columns.
+        distance (float): maximum displacement between two frames.
+        frame_gap (int): number of frames an object may disappear for.
+        linker (str): name of a registered linker, see `LINKERS`.
+
+    Returns:
+        (numpy.ndarray): track ID of each row, starting from 1.
+    """
+    if linker not in LINKERS:
+        raise ValueError('Unknown linker ' + str(linker) + ', choose from ' + ', '.join(LINKERS) + '.')
+    return LINKERS[linker](table, distance, frame_gap)
+
+
+def link_divisions(track, distance, frame_gap=0, phase_col=None, mitosis=None, frames=None):
+    """Detect divisions among linked tracks and write back mother-daughter links.
+
+    A track starting without a parent, within `distance` of an object of another track (the mother) at most
+    `frame_gap` + 1 frames before, is a daughter candidate. The nearest (then latest) object is the mother's last
+    object before division. A division needs two daughters:
+
+        - the mother track ends: the two nearest candidates are the daughters,
+        - the mother track continues after division, only with `mitosis` states given and the mother in one
+          of them: it is split there, the continuation becomes the sister of the nearest candidate.
+
+    Candidates left alone (a track broken by the linker, or an object appearing next to a running track)
+    are not linked. Lineages are resolved again.
+
+    Args:
+        track (pandas.DataFrame): tracked object table.
+        distance (float): maximum distance between the mother and a daughter.
+        frame_gap (int): number of frames between the mother and a daughter.
+        phase_col (str): optional, state column of the table.
+        mitosis (str or list): optional, state(s) of mitosis in `phase_col`, the mother must be in. Without it,
+            running tracks are never split.
+        frames (iterable): optional, only look for daughters starting in these frames.
+
+    Returns:
+        (pandas.DataFrame): the table, with split mother tracks, parent and lineage IDs.
+    """
+    track = track.copy()
+    trk = track[track['trackId'] > 0].sort_values(['trackId', 'frame'])
+    if trk.shape[0] == 0:
+        return track
+    tid = trk['trackId'].to_numpy()
+    frame = trk['frame'].to_numpy()
+    pos = trk[['Center_of_the_object_0', 'Center_of_the_object_1']].to_numpy(dtype='float')
+    last = trk.groupby('trackId')['frame'].transform('max').to_numpy()
+    # frame of the next object of the same track, inf if last
+    nxt = np.append(np.where(tid[1:] == tid[:-1], frame[1:], np.inf), np.inf)
+
+    # daughter candidates: first objects of tracks without parent, after the first frame
+    head = np.r_[True, tid[1:] != tid[:-1]] & (trk['parentTrackId'].to_numpy() == 0) & (frame > frame.min())
+    if frames is not None:
+        head &= np.isin(frame, list(frames))
+    eligible = np.ones(tid.size, dtype='bool')
+    by_state = mitosis is not None and phase_col is not None
+    if by_state:
+        eligible = trk[phase_col].isin(np.atleast_1d(mitosis)).to_numpy()
+
+    # mother candidates: nearest object of another track, closest in time first
+    starts = np.flatnonzero(head)
+    mother = np.full(starts.size, -1)
+    dist = np.full(starts.size, np.inf)
+    order = np.argsort(frame, kind='stable')
+    uf, idx = np.unique(frame[order], return_index=True)
+    by_frame = dict(zip(uf.tolist(), np.split(order, idx[1:])))
+    for g in range(frame_gap + 1):
+        todo = mother < 0
+        for t in np.unique(frame[starts[todo]]).tolist():
+            rows = by_frame.get(t - 1 - g)
+            if rows is None:
+                continue
+            # the last object of its track before the daughter starts
+            rows = rows[eligible[rows] & (nxt[rows] >= t)]
+            if rows.size == 0:
+                continue
+            sel = np.flatnonzero(todo & (frame[starts] == t))
+            d, j = cKDTree(pos[rows]).query(pos[starts[sel]], distance_upper_bound=distance)
+            hit = np.isfinite(d)
+            mother[sel[hit]] = rows[j[hit]]
+            dist[sel[hit]] = d[hit]
+
+    found = mother >= 0
+    ev = pd.DataFrame({'daug': tid[starts[found]], 'mother': tid[mother[found]], 'm_frame': frame[mother[found]],
+                       'cont': last[mother[found]] > frame[mother[found]], 'dist': dist[found]})
+    ev = ev.sort_values('dist', kind='stable')
+    point = ev.groupby(['mother', 'm_frame'])
+    rank, size = point.cumcount(), point['daug'].transform('size')
+    # a running track is only split on a mitosis state, proximity alone is not enough
+    ev = ev[(ev['cont'] & by_state & (rank == 0)) | (~ev['cont'] & (rank < 2) & (size >= 2))]
+    if ev.shape[0] == 0:
+        return resolve_lineage(track)
+
+    # split continuing mothers: objects after the division get a new track ID
+    next_id = int(track['trackId'].max()) + 1
+    cuts = ev.loc[ev['cont'], ['mother', 'm_frame']].drop_duplicates().sort_values('m_frame')
+    cuts = cuts.rename(columns={'mother': 'trackId'})
+    cuts['new'] = np.arange(next_id, next_id + cuts.shape[0])
+
+    def segment(ids, frames):
+        # track ID after splits, of objects of tracks `ids` at `frames`
+        q = pd.DataFrame({'trackId': np.asarray(ids).astype(cuts['trackId'].dtype), 'frame': frames,
+                          'order': np.arange(len(ids))}).sort_values('frame')
+        q = pd.merge_asof(q, cuts, left_on='frame', right_on='m_frame', by='trackId', allow_exact_matches=False)
+        q = q.sort_values('order')
+        return q['new'].fillna(q['trackId']).to_numpy().astype(track['trackId'].dtype)
+
+    # existing daughters of split tracks follow the segment they start after
+    heads = track[track['trackId'] > 0].drop_duplicates('trackId')
+    heads = heads[heads['parentTrackId'].isin(cuts['trackId'])]
+    parent = dict(zip(heads['trackId'], segment(heads['parentTrackId'].to_numpy(), heads['frame'].to_numpy() - 1)))
+    split = track['trackId'].isin(cuts['trackId']).to_numpy()
+    track.loc[split, 'trackId'] = segment(track.loc[split, 'trackId'].to_numpy(), track.loc[split, 'frame'].to_numpy())
+
+    # daughters and sisters split off, linked to the mother segment at division
+    parent.update(zip(ev['daug'], segment(ev['mother'].to_numpy(), ev['m_frame'].to_numpy())))
+    parent.update(zip(cuts['new'], segment(cuts['trackId'].to_numpy(), cuts['m_frame'].to_numpy())))
+    linked = track['trackId'].isin(list(parent)).to_numpy()
+    track.loc[linked, 'parentTrackId'] = track.loc[linked, 'trackId'].map(parent).to_numpy()
+    return resolve_lineage(track)
@@ -11,6 +11,8 @@ import yaml
 import pandas as pd
 import skimage.io as io
 from ._utils import get_annotation
+from ._io import imread_lazy, read_table, is_zarr, is_synced
+from ._shm import share
 
 
 def napari_get_reader(path):
@@ -86,6 +88,56 @@ def reader_function(path):
         path = os.path.join(root, '_sample_data')
 
 
+    intensity_path = read_config(path, cfgname)[1]
+    if intensity_path == []:
+        raise ValueError('Missing input file, check if filenames match the config.')
+    mask, track, meta = read_dataset(path, cfgname)
+    lazy = meta['lazy']
+
+    rt = []
+    i = 1
+    colors = ['green', 'red', 'yellow', 'blue', 'magenta', 'cyan']
+    if len(intensity_path) == 1:
+        colors[0] = 'gray'
+    if intensity_path is not None:
+        for j in range(len(intensity_path)):
+            comp = imread_lazy(intensity_path[j], writable=not lazy) if lazy or is_zarr(intensity_path[j]) \
+                else io.imread(intensity_path[j])
+            if len(comp.shape) > 3:
+                for i in range(comp.shape):
+                    rt.append((comp[:, :, :, i], {'name':'intensity_' + str(i), 'blending':'additive',
+                                                  'colormap':colors[i-1] if i<7 else 'gray'}, 'image'))
+                    i += 1
+            else:
+                rt.append((comp, {'name':'intensity_' + str(i), 'blending':'additive',
+                                  'colormap':colors[i-1] if i<7 else 'gray'}, 'image'))
+                i += 1
+
+    rt.append((mask, {'name':'segm','metadata':meta}, 'labels'))
+    track_data = track.loc[:][['trackId', 'frame', 'Center_of_the_object_1', 'Center_of_the_object_0']]
+    # with a name window, only label objects around the first frame, the widget follows the time slider
+    name_window = meta['name_window']
+    label_track = track if name_window is None else track[track['frame'] <= name_window]
+    label_data = label_track.loc[:][['frame', 'Center_of_the_object_1', 'Center_of_the_object_0']]
+    label_data = label_data.to_numpy()
+    track_data = track_data.to_numpy() # track layer only allow ndarray! pass track info to widget.
+    text_config = {'text':'name', 'size': 8, 'color': 'yellow'}
+    rt.append((track_data, {'name':'tracks', 'metadata':{'ori_data':track}}, 'tracks'))
+    rt.append((label_data, {'name':'name', 'size':0,
+                            'features':{'name':label_track.loc[:]['name'].to_numpy()}, 
+                            'text':text_config}, 'points'))
+    return rt
+
+
+def read_config(path, cfgname='config.yaml'):
+    """Read the config of a dataset directory and find its files by suffix.
+
+    Returns:
+        cfg (dict): config.
+        intensity_path (list): paths to the intensity images.
+        mask_path (str): path to the mask, '' if not found.
+        track_path (str): path to the object table, '' if not found.
+    """
     # look for config
     try:
         with open(os.path.join(path, cfgname), 'r') as f:
@@ -106,12 +158,28 @@ def reader_function(path):
             mask_path = os.path.join(path, fname)
         if sfx == cfg['track_suffix']:
             track_path = os.path.join(path, fname)
-    
-    if intensity_path == [] or mask_path == '' or track_path == '':
+    return cfg, intensity_path, mask_path, track_path
+
+
+def read_dataset(path, cfgname='config.yaml', use_processes=None):
+    """Read the mask and object table of a dataset directory, without the intensity images.
+
+    Args:
+        path (str): dataset directory.
+        cfgname (str): config file name.
+        use_processes (bool): optional, overrides the `use_processes` config key.
+
+    Returns:
+        mask (numpy.ndarray or _io.FrameStack): labeled object mask, a `FrameStack` for Zarr stores.
+        track (pandas.DataFrame): object table, sorted by track and frame, with lineage and name columns.
+        meta (dict): dataset settings, the metadata of the `segm` layer.
+    """
+    cfg, _, mask_path, track_path = read_config(path, cfgname)
+    if mask_path == '' or track_path == '':
         raise ValueError('Missing input file, check if filenames match the config.')
         
     stateCol = cfg['stateCol']
-    track = pd.read_csv(track_path)
+    track = read_table(track_path)
 
     # if no state column specified, will use a dummy column.
     if stateCol is None:
@@ -142,36 +210,22 @@ def reader_function(path):
     
     track = check_input_track(track, hasState, stateColName)
     track = track.sort_values(by=['trackId','frame'])
-    mask = io.imread(mask_path)
 
-    rt = []
-    i = 1
-    colors = ['green', 'red', 'yellow', 'blue', 'magenta', 'cyan']
-    if len(intensity_path) == 1:
-        colors[0] = 'gray'
-    if intensity_path is not None:
-        for j in range(len(intensity_path)):
-            comp = io.imread(intensity_path[j])
-            if len(comp.shape) > 3:
-                for i in range(comp.shape):
-                    rt.append((comp[:, :, :, i], {'name':'intensity_' + str(i), 'blending':'additive',
-                                                  'colormap':colors[i-1] if i<7 else 'gray'}, 'image'))
-                    i += 1
-            else:
-                rt.append((comp, {'name':'intensity_' + str(i), 'blending':'additive',
-                                  'colormap':colors[i-1] if i<7 else 'gray'}, 'image'))
-                i += 1
-
-    rt.append((mask, {'name':'segm','metadata':{'frame_base': cfg['frame_base'], 'stateCol': stateCol, 
-                        'stateColName': stateColName, 'track_path': track_path, 'phaseVis': phaseVis,
-                        'mask_path': mask_path, 'states':states, 'hasState':hasState}}, 'labels'))
-    track_data = track.loc[:][['trackId', 'frame', 'Center_of_the_object_1', 'Center_of_the_object_0']]
-    label_data = track.loc[:][['frame', 'Center_of_the_object_1', 'Center_of_the_object_0']]
-    label_data = label_data.to_numpy()
-    track_data = track_data.to_numpy() # track layer only allow ndarray! pass track info to widget.
-    text_config = {'text':'name', 'size': 8, 'color': 'yellow'}
-    rt.append((track_data, {'name':'tracks', 'metadata':{'ori_data':track}}, 'tracks'))
-    rt.append((label_data, {'name':'name', 'size':0,
-                            'features':{'name':track.loc[:]['name'].to_numpy()}, 
-                            'text':text_config}, 'points'))
-    return rt
+    # lazy mode: memory-map (or read frame by frame) instead of loading whole stacks
+    lazy = cfg.get('lazy', False)
+    mask = imread_lazy(mask_path, writable=True) if lazy or is_zarr(mask_path) else io.imread(mask_path)
+    # worker processes measuring frames attach the mask instead of receiving copies
+    if use_processes is None:
+        use_processes = cfg.get('use_processes', False)
+    if use_processes and not lazy and not is_zarr(mask_path):
+        mask = share(mask)
+
+    meta = {'frame_base': cfg['frame_base'], 'stateCol': stateCol, 
+            'stateColName': stateColName, 'track_path': track_path, 'phaseVis': phaseVis,
+            'mask_path': mask_path, 'states':states, 'hasState':hasState, 'lazy':lazy,
+            'n_workers': cfg.get('n_workers'), 'name_window': cfg.get('name_window'),
+            'export_csv': cfg.get('export_csv', True), 'linker': cfg.get('linker'),
+            'mitosis_state': cfg.get('mitosis_state'), 'use_processes': use_processes,
+            'undo_limit': cfg.get('undo_limit', 100),
+            'synced': is_synced(mask_path, track_path)}
+    return mask, track, meta
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Mask stacks shared with worker processes.
+
+A worker process receives a handle to the stack, a small picklable tuple, and `attach`es it to a view on
+the same memory, instead of a pickled copy of the frames it works on. Stacks memory-mapped from a file
+are shared by path. Others are copied once into a `multiprocessing.shared_memory` block with `share`,
+which then holds the mask in place of the original (e.g. as the napari layer data).
+"""
+import mmap
+import weakref
+from multiprocessing import shared_memory
+import numpy as np
+
+# arrays in shared memory, by id: (weak reference to the array, handle)
+_shared = {}
+# stacks attached in this (worker) process, by handle: (array, shared memory block or None)
+_attached = {}
+
+
+def _release(key, shm):
+    _shared.pop(key, None)
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def share(mask):
+    """Copy a stack into shared memory.
+
+    The block is freed with the returned array (and its views). Worker processes still attached keep
+    their mapping until they exit.
+
+    Args:
+        mask (numpy.ndarray): stack to share.
+
+    Returns:
+        (numpy.ndarray): the copy, backed by shared memory, see `handle_of`.
+    """
+    mask = np.asarray(mask)
+    shm = shared_memory.SharedMemory(create=True, size=max(mask.nbytes, 1))
+    arr = np.ndarray(mask.shape, dtype=mask.dtype, buffer=shm.buf)
+    arr[...] = mask
+    _shared[id(arr)] = (weakref.ref(arr), ('shm', shm.name, 0, mask.shape, mask.dtype.str))
+    weakref.finalize(arr, _release, id(arr), shm)
+    return arr
+
+
+def handle_of(mask):
+    """Handle of a stack that worker processes can attach without copying, see `attach`.
+
+    Args:
+        mask (numpy.ndarray): the array returned by `share`, or a memory-mapped file opened read-only
+            or read-write. Copy-on-write maps (e.g. the lazy mask) hold edits private to this process.
+
+    Returns:
+        (tuple or None): the handle, None if the stack is not shared.
+    """
+    entry = _shared.get(id(mask))
+    if entry is not None and entry[0]() is mask:
+        return entry[1]
+    if isinstance(mask, np.memmap) and isinstance(mask.base, mmap.mmap) and mask.filename \
+            and mask.mode in ('r', 'r+') and mask.flags.c_contiguous:
+        return ('memmap', mask.filename, mask.offset, mask.shape, mask.dtype.str)
+    return None
+
+
+def attach(handle):
+    """View on a shared stack, from a worker process. Attachments are kept for the life of the process.
+
+    Args:
+        handle (tuple): see `handle_of`.
+
+    Returns:
+        (numpy.ndarray): the stack, not to be written to.
+    """
+    if handle not in _attached:
+        kind, name, offset, shape, dtype = handle
+        if kind == 'memmap':
+            _attached[handle] = (np.memmap(name, dtype=dtype, mode='r', offset=offset, shape=shape), None)
+        else:
+            shm = shared_memory.SharedMemory(name=name)
+            _attached[handle] = (np.ndarray(shape, dtype=dtype, buffer=shm.buf), shm)
+    return _attached[handle][0]
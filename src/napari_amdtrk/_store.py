@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+
+
+def _group(keys, rows):
+    """Split row labels by key, return {key: row labels}.
+    """
+    if len(keys) == 0:
+        return {}
+    order = np.argsort(keys, kind='stable')
+    keys, rows = keys[order], rows[order]
+    bounds = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+    return dict(zip(keys[np.r_[0, bounds]].tolist(), np.split(rows, bounds)))
+
+
+class TrackStore:
+    """Object table with hash indexes for track, frame and parent lookups.
+
+    Rows are identified by the table index labels. Changes to `trackId`, `frame`, `continuous_label`
+    and `parentTrackId` must go through `set`, `drop` and `append` so the indexes are updated
+    for the affected rows only. Other columns can be written directly to `table`, or to rows by label
+    through `loc` and `at`.
+
+    Dropped rows are only removed from the indexes and left in the backing table, appended rows fill
+    spare rows allocated in chunks at its end, so edits cost O(rows edited). The backing table is
+    compacted when `table` is next read.
+
+    Indexes:
+        - track ID -> row labels, sorted by frame.
+        - frame -> row labels, and per frame a label -> row lookup built when first queried.
+        - parent track ID -> daughter track IDs.
+
+    Args:
+        table (pandas.DataFrame): tracked object table.
+        journal (Journal): optional, logs rows before they are changed, for undo.
+    """
+
+    INDEXED = ('trackId', 'frame', 'continuous_label', 'parentTrackId')
+
+    def __init__(self, table, journal=None):
+        if not table.index.is_unique:
+            table = table.reset_index(drop=True)
+        self._data = table
+        self.journal = journal
+        # dropped row labels, still in the backing table
+        self._dead = set()
+        # spare rows at the end of the backing table, labelled from `_next` on
+        self._spare = 0
+        self._next = int(table.index.max()) + 1 if table.shape[0] else 0
+        self._frame_lut = {}
+        frame = table['frame'].to_numpy()
+        order = np.argsort(frame, kind='stable')
+        rows = table.index.to_numpy()[order]
+        self._by_frame = _group(frame[order], rows)
+        # grouping is stable, rows of a track stay sorted by frame
+        self._by_track = _group(table['trackId'].to_numpy()[order], rows)
+
+        self._daughters = {}
+        self._parents = {}
+        links = table.loc[table['parentTrackId'] != 0, ['parentTrackId', 'trackId']].drop_duplicates()
+        for par, trk in links.itertuples(index=False):
+            self._daughters.setdefault(par, set()).add(trk)
+            self._parents.setdefault(trk, set()).add(par)
+
+    @property
+    def table(self):
+        """The table, without dropped or spare rows."""
+        if self._dead or self._spare:
+            data = self._data.iloc[:self._data.shape[0] - self._spare]
+            self._data = data.drop(index=list(self._dead)) if self._dead else data.copy()
+            self._dead.clear()
+            self._spare = 0
+        return self._data
+
+    @property
+    def loc(self):
+        """Label indexer on the rows, without compacting the table."""
+        return self._data.loc
+
+    @property
+    def at(self):
+        """Label accessor on single values, without compacting the table."""
+        return self._data.at
+
+    @property
+    def columns(self):
+        return self._data.columns
+
+    #================== Queries =======================
+
+    def present(self, labels):
+        """Labels of rows in the table, in order."""
+        index = self._data.index
+        return [l for l in labels if l in index and l not in self._dead and l < self._next]
+
+    def has_track(self, trk_id):
+        return trk_id in self._by_track
+
+    def track_ids(self):
+        return list(self._by_track.keys())
+
+    def rows(self, trk_id):
+        """Row labels of a track, sorted by frame."""
+        return self._by_track.get(trk_id, self._data.index[:0].to_numpy())
+
+    def track(self, trk_id):
+        """Rows of a track as a table, sorted by frame."""
+        return self._data.loc[self.rows(trk_id)]
+
+    def first(self, trk_id, col):
+        """Value of a column at the first row of a track."""
+        return self._data.at[self.rows(trk_id)[0], col]
+
+    def frame_rows(self, frame):
+        """Row labels of a frame."""
+        return self._by_frame.get(frame, self._data.index[:0].to_numpy())
+
+    def row_at(self, frame, label):
+        """Row label of the object with `label` on the mask at `frame`, or None."""
+        if frame not in self._frame_lut:
+            rows = self.frame_rows(frame)
+            lbs = self._data.loc[rows, 'continuous_label'].tolist()
+            # first row wins on duplicated labels
+            self._frame_lut[frame] = dict(zip(reversed(lbs), reversed(rows.tolist())))
+        return self._frame_lut[frame].get(label)
+
+    def daughters(self, trk_id):
+        """Direct daughter track IDs of a track, sorted."""
+        return sorted(self._daughters.get(trk_id, ()))
+
+    def descendants(self, trk_id):
+        """All track IDs descending from a track, walking the parent -> daughter links."""
+        found = []
+        seen = {trk_id}
+        stack = [trk_id]
+        while stack:
+            for d in self.daughters(stack.pop()):
+                if d not in seen:
+                    seen.add(d)
+                    found.append(d)
+                    stack.append(d)
+        return found
+
+    #================== Updates =======================
+
+    def set(self, rows, values):
+        """Assign column values to rows and update the indexes.
+
+        Args:
+            rows (array-like): row labels.
+            values (dict): column name -> scalar or array of values.
+        """
+        rows = np.asarray(rows)
+        if rows.size == 0:
+            return
+        self._log(rows)
+        reindex = any(c in self.INDEXED for c in values)
+        if reindex:
+            self._unindex(rows)
+        for col, val in values.items():
+            self._data.loc[rows, col] = val
+        if reindex:
+            self._index(rows)
+        return
+
+    def drop(self, rows):
+        """Remove rows from the table."""
+        rows = np.asarray(rows)
+        if rows.size == 0:
+            return
+        self._log(rows)
+        self._unindex(rows)
+        self._dead.update(rows.tolist())
+        return
+
+    def append(self, new_rows):
+        """Append rows to the table, return their new labels.
+
+        Args:
+            new_rows (pandas.DataFrame): rows with the table columns.
+        """
+        k = new_rows.shape[0]
+        rows = np.arange(self._next, self._next + k)
+        self._log(rows)
+        if k > self._spare:
+            self._grow(new_rows, k - self._spare)
+        new_rows = new_rows[self._data.columns]
+        start = self._data.shape[0] - self._spare
+        for j in range(new_rows.shape[1]):
+            self._data.iloc[start:start + k, j] = new_rows.iloc[:, j].to_numpy()
+        self._spare -= k
+        self._next += k
+        self._index(rows)
+        return rows
+
+    def set_lineage(self, trk_ids, lin_id):
+        """Assign a lineage ID to all rows of some tracks."""
+        rows = [self.rows(i) for i in trk_ids]
+        if rows:
+            rows = np.concatenate(rows)
+            self._log(rows)
+            self._data.loc[rows, 'lineageId'] = lin_id
+        return
+
+    def replace(self, labels, rows):
+        """Replace the rows with some labels, used to undo and redo edits.
+
+        Args:
+            labels (list): row labels to remove if present.
+            rows (pandas.DataFrame): rows to put back, with their labels as index.
+
+        Returns:
+            (set): track IDs of the removed and inserted rows.
+        """
+        present = np.asarray(self.present(labels), dtype=self._data.index.dtype)
+        trk_ids = set(self._data.loc[present, 'trackId'].tolist()) | set(rows['trackId'].tolist())
+        if present.size:
+            self._unindex(present)
+            self._dead.update(present.tolist())
+        if rows.shape[0]:
+            rows = rows[self._data.columns]
+            index = self._data.index
+            kept = np.array([l in index and l < self._next for l in rows.index.tolist()], dtype=bool)
+            # rows still in the backing table are written back in place
+            if kept.any():
+                back = rows[kept]
+                for col in back.columns:
+                    self._data.loc[back.index, col] = back[col].to_numpy()
+                self._dead.difference_update(back.index.tolist())
+            # rows removed by a compaction are appended
+            if not kept.all():
+                table = self.table
+                self._data = pd.concat([table, rows[~kept]]) if table.shape[0] else rows[~kept].copy()
+                self._next = max(self._next, int(rows.index.max()) + 1)
+            self._index(rows.index.to_numpy())
+        return trk_ids
+
+    def _grow(self, new_rows, n):
+        """Add at least `n` spare rows, copies of `new_rows` so the column types are kept."""
+        n = max(n, self._data.shape[0] // 2, 64)
+        spare = new_rows[self._data.columns].iloc[np.resize(np.arange(new_rows.shape[0]), n)]
+        spare.index = np.arange(self._next + self._spare, self._next + self._spare + n)
+        self._data = pd.concat([self._data, spare]) if self._data.shape[0] else spare.copy()
+        self._spare += n
+        return
+
+    def _log(self, rows):
+        if self.journal is not None:
+            self.journal.log_rows(self, np.asarray(rows).tolist())
+        return
+
+    def _unindex(self, rows):
+        sub = self._data.loc[rows, ['trackId', 'frame']]
+        tracks = _group(sub['trackId'].to_numpy(), rows)
+        for trk, r in tracks.items():
+            left = self._by_track[trk][~np.isin(self._by_track[trk], r)]
+            if left.size:
+                self._by_track[trk] = left
+            else:
+                del self._by_track[trk]
+        for fme, r in _group(sub['frame'].to_numpy(), rows).items():
+            left = self._by_frame[fme][~np.isin(self._by_frame[fme], r)]
+            if left.size:
+                self._by_frame[fme] = left
+            else:
+                del self._by_frame[fme]
+            self._frame_lut.pop(fme, None)
+        self._link(tracks.keys())
+        return
+
+    def _index(self, rows):
+        sub = self._data.loc[rows, ['trackId', 'frame']]
+        tracks = _group(sub['trackId'].to_numpy(), rows)
+        for trk, r in tracks.items():
+            if trk in self._by_track:
+                self._by_track[trk] = np.concatenate([self._by_track[trk], r])
+            else:
+                self._by_track[trk] = r
+            self._sort_track(trk)
+        for fme, r in _group(sub['frame'].to_numpy(), rows).items():
+            if fme in self._by_frame:
+                self._by_frame[fme] = np.concatenate([self._by_frame[fme], r])
+            else:
+                self._by_frame[fme] = r
+            self._frame_lut.pop(fme, None)
+        self._link(tracks.keys())
+        return
+
+    def _sort_track(self, trk):
+        rows = self._by_track[trk]
+        if rows.size > 1:
+            order = np.argsort(self._data.loc[rows, 'frame'].to_numpy(), kind='stable')
+            self._by_track[trk] = rows[order]
+        return
+
+    def _link(self, tracks):
+        """Rebuild parent -> daughter links of tracks from their rows."""
+        for trk in list(tracks):
+            for par in self._parents.pop(trk, ()):
+                self._daughters[par].discard(trk)
+                if not self._daughters[par]:
+                    del self._daughters[par]
+            if trk not in self._by_track:
+                continue
+            pars = set(pd.unique(self._data.loc[self._by_track[trk], 'parentTrackId']).tolist()) - {0}
+            if pars:
+                self._parents[trk] = pars
+                for par in pars:
+                    self._daughters.setdefault(par, set()).add(trk)
+        return
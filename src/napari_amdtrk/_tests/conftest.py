@@ -0,0 +1,37 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import yaml
+import tifffile
+
+
+def write_dataset(path, n_frame=5, n_obj=4, size=64, state=True, lazy=False, compress=False, **extra):
+    """Write a synthetic dataset folder: objects moving right, one track per object."""
+    os.makedirs(path, exist_ok=True)
+    rng = np.random.default_rng(0)
+    mask = np.zeros((n_frame, size, size), dtype='uint8')
+    rows = []
+    yy, xx = np.mgrid[:size, :size]
+    for t in range(n_frame):
+        for k in range(n_obj):
+            cy, cx = 8 + 14 * k, 8 + 5 * t
+            obj = (yy - cy) ** 2 + (xx - cx) ** 2 <= 16
+            mask[t][obj] = k + 1
+            rows.append({'frame': t, 'trackId': k + 1, 'continuous_label': k + 1,
+                         'Center_of_the_object_0': xx[obj].mean(), 'Center_of_the_object_1': yy[obj].mean(),
+                         'phase': 'G1' if t < n_frame // 2 else 'S'})
+    kw = {'photometric': 'minisblack', 'compression': 'zlib' if compress else None}
+    tifffile.imwrite(os.path.join(path, 'a_GFP.tif'), rng.integers(0, 255, mask.shape, dtype='uint8'), **kw)
+    tifffile.imwrite(os.path.join(path, 'a_mask.tif'), mask, **kw)
+    pd.DataFrame(rows).to_csv(os.path.join(path, 'a_track.csv'), index=False)
+    cfg = {'intensity_suffix': 'GFP', 'mask_suffix': 'mask', 'track_suffix': 'track', 'frame_base': 0,
+           'stateCol': 'phase' if state else None, 'lazy': lazy, **extra}
+    with open(os.path.join(path, 'config.yaml'), 'w') as f:
+        yaml.safe_dump(cfg, f)
+    return str(path)
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    return write_dataset(tmp_path / 'dataset')
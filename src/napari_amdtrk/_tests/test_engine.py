@@ -0,0 +1,239 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import tifffile
+
+import napari_amdtrk._engine as engine_module
+from napari_amdtrk._engine import AmdTrkEngine
+from napari_amdtrk._cli import main
+from napari_amdtrk._batch import run_batch
+from .conftest import write_dataset
+
+
+def test_engine_apply(tmp_path):
+    path = write_dataset(tmp_path / 'dataset')
+    engine = AmdTrkEngine.load(path)
+    msgs = engine.apply([{'action': 'swap', 'track_A': 1, 'frame': 2, 'track_B': 2},
+                         {'action': 'delete_track', 'trk_id': 4}])
+    assert len(msgs) == 2
+    with pytest.raises(ValueError):
+        engine.apply([{'action': 'delete_track', 'trk_id': 99}])
+    with pytest.raises(ValueError):
+        engine.apply([{'action': 'save'}])
+    assert 'Skipped' in engine.apply([{'action': 'delete_track', 'trk_id': 99}], keep_going=True)[0]
+    engine.save()
+
+    saved = AmdTrkEngine.load(path)
+    assert not saved.store.has_track(4)
+    assert not np.any(saved.mask == 4)
+    rows = saved.store.track(1)
+    assert list(rows['continuous_label']) == [1, 1, 2, 2, 2]
+
+
+def test_delete_in_box(tmp_path):
+    path = write_dataset(tmp_path / 'dataset')
+    engine = AmdTrkEngine.load(path)
+    lb = int(engine.store.track(1).set_index('frame').at[2, 'continuous_label'])
+    assert 2 not in engine.bboxes
+    engine.delete_track(1, frame=2)
+    # the frame was indexed first, the edit and its journal entry only cover the object box
+    pixels = [op for op in engine.journal.undo_stack[-1].ops if op[0] == 'pixels']
+    assert len(pixels) == 1 and isinstance(pixels[0][1][1], slice)
+    assert pixels[0][2].size == np.sum(tifffile.imread(os.path.join(path, 'a_mask.tif'))[2] == lb)
+    assert lb not in engine.bboxes[2] and not np.any(engine.mask[2] == lb)
+    engine.undo()
+    assert np.any(engine.mask[2] == lb)
+
+
+def test_delete_with_table_boxes(tmp_path):
+    path = write_dataset(tmp_path / 'dataset')
+    AmdTrkEngine.load(path).save()
+    engine = AmdTrkEngine.load(path)
+    # boxes saved with the table match the mask, but not on frames painted since
+    region = engine.mask[3, 0:2, 0:2].copy()
+    region[...] = 7
+    engine.set_mask(3, region, (0, 0, 2, 2))
+    lbs = engine.store.track(1).set_index('frame')['continuous_label']
+    assert engine.table_bbox(3, lbs[3]) is None
+    # only the painted frame is scanned to delete the track
+    engine.delete_track(1)
+    assert sorted(engine.bboxes) == [3]
+    for f, lb in lbs.items():
+        assert not np.any(engine.mask[f] == lb)
+    lb = int(engine.store.track(2).set_index('frame').at[0, 'continuous_label'])
+    assert engine.table_bbox(0, lb) == engine.frame_bboxes(0)[lb]
+
+
+def test_unassigned_edits(tmp_path):
+    path = write_dataset(tmp_path / 'dataset')
+    engine = AmdTrkEngine.load(path)
+    with pytest.raises(ValueError):
+        engine.delete_track(0)
+    # an object drawn without a table row is registered, then copied with its row
+    region = engine.mask[1, 58:62, 40:44].copy()
+    region[...] = 9
+    engine.set_mask(1, region, (58, 40, 62, 44))
+    engine.run_copy_obj(9, 1, 3)
+    rows = engine.store.track(0)
+    assert list(rows['frame']) == [1, 3] and list(rows['continuous_label']) == [9, 5]
+    assert np.all(engine.mask[3, 58:62, 40:44] == 5)
+
+
+def test_cli(tmp_path):
+    a = write_dataset(tmp_path / 'a')
+    b = write_dataset(tmp_path / 'b')
+    corrections = str(tmp_path / 'corrections.json')
+    with open(corrections, 'w') as f:
+        json.dump({'a': [{'action': 'delete_track', 'trk_id': 3}]}, f)
+    assert main([a, b, '--corrections', corrections]) == 0
+    assert not AmdTrkEngine.load(a).store.has_track(3)
+    assert AmdTrkEngine.load(b).store.has_track(3)
+
+    with open(corrections, 'w') as f:
+        json.dump([{'action': 'delete_track', 'trk_id': 99}], f)
+    assert main([a, '--corrections', corrections]) == 1
+
+
+def test_run_batch(tmp_path):
+    paths = [write_dataset(tmp_path / str(i)) for i in range(3)] + [str(tmp_path / 'missing')]
+    report = run_batch(paths, n_workers=2, distance=10, frame_gap=0)
+    assert list(report['dataset']) == paths
+    assert list(report['status']) == ['ok'] * 3 + ['failed']
+    assert list(report['tracks'][:3]) == [4] * 3
+    assert 'Missing config file' in report['message'].iloc[3]
+
+
+def _spy_align(monkeypatch):
+    calls = []
+    align = engine_module.align_table_and_mask
+
+    def spy(table, mask, *args, **kwargs):
+        calls.append(kwargs.get('frames'))
+        return align(table, mask, *args, **kwargs)
+    monkeypatch.setattr(engine_module, 'align_table_and_mask', spy)
+    return calls
+
+
+def test_save_incremental(tmp_path, monkeypatch):
+    path = write_dataset(tmp_path / 'dataset')
+    mask_path = os.path.join(path, 'a_mask.tif')
+    calls = _spy_align(monkeypatch)
+
+    engine = AmdTrkEngine.load(path)
+    assert engine.dirty == set() and engine.unaligned is None
+    # mark frame 0 on disk, it must not be rewritten
+    disk = tifffile.memmap(mask_path, mode='r+')
+    disk[0, 0, 0] = 9
+    disk.flush()
+    del disk
+    frame = engine.mask[2]
+    engine.set_mask(2, np.where(frame == 1, 0, frame))
+    engine.save()
+    # files never saved aligned: labels of every frame are checked, only the edited frame differs
+    assert calls == [[2]]
+    saved = tifffile.imread(mask_path)
+    assert saved[0, 0, 0] == 9 and not np.any(saved[2] == 1)
+    assert list(AmdTrkEngine.load(path).store.track(1)['frame']) == [0, 1, 3, 4]
+
+    # saved aligned: the next session knows the files agree
+    engine = AmdTrkEngine.load(path)
+    assert engine.unaligned == set()
+    frame = engine.mask[3]
+    engine.set_mask(3, np.where(frame == 2, 0, frame))
+    engine.save()
+    assert calls[1:] == [[3]]
+    assert tifffile.imread(mask_path)[0, 0, 0] == 9
+
+
+def test_save_out_of_sync(tmp_path, monkeypatch):
+    path = write_dataset(tmp_path / 'dataset')
+    track_path = os.path.join(path, 'a_track.csv')
+    table = pd.read_csv(track_path)
+    table[~((table['frame'] == 1) & (table['trackId'] == 3))].to_csv(track_path, index=False)
+    calls = _spy_align(monkeypatch)
+
+    engine = AmdTrkEngine.load(path)
+    engine.save()
+    # the object missing from the table is found and registered, no frame is written
+    assert calls == [[1]]
+    saved = AmdTrkEngine.load(path).track
+    assert ((saved['frame'] == 1) & (saved['continuous_label'] == 3)).sum() == 1
+
+
+def test_retrack_then_save(tmp_path, monkeypatch):
+    path = write_dataset(tmp_path / 'dataset')
+    calls = _spy_align(monkeypatch)
+    engine = AmdTrkEngine.load(path)
+    frame = engine.mask[2]
+    engine.set_mask(2, np.where(frame == 1, 0, frame))
+    engine.retrack(distance=10, frame_gap=1)
+    # the retrack aligned every frame, the save only writes
+    engine.save()
+    assert calls == [None]
+    assert not np.any(tifffile.imread(os.path.join(path, 'a_mask.tif'))[2] == 1)
+
+    # a windowed retrack only aligns its frames
+    engine = AmdTrkEngine.load(path)
+    for f in (0, 4):
+        frame = engine.mask[f]
+        engine.set_mask(f, np.where(frame == 2, 0, frame))
+    engine.retrack(distance=10, frame_gap=0, frame_start=0, frame_end=1, margin=1)
+    engine.save()
+    assert calls[1:] == [range(0, 3), [4]]
+
+
+def test_retrack_undo_redo(tmp_path):
+    path = write_dataset(tmp_path / 'dataset')
+    engine = AmdTrkEngine.load(path)
+    before = engine.track.copy()
+    engine.retrack(distance=10, frame_gap=1)
+    after = engine.track.copy()
+    # the entry keeps only the table not in use
+    ops = [op for op in engine.journal.undo_stack[-1].ops if op[0] == 'table']
+    assert len(ops) == 1 and len(ops[0][1]) == 1
+    engine.undo()
+    pd.testing.assert_frame_equal(engine.track, before)
+    engine.redo()
+    pd.testing.assert_frame_equal(engine.track, after)
+
+
+class _Cancel(Exception):
+    pass
+
+
+def test_save_cancel(tmp_path):
+    # compressed: the whole mask is written aside, with a checkpoint per frame
+    path = write_dataset(tmp_path / 'dataset', compress=True)
+    files = [os.path.join(path, f) for f in ('a_mask.tif', 'a_track.csv')]
+    before = [open(f, 'rb').read() for f in files]
+    k = 0
+    while True:
+        k += 1
+        engine = AmdTrkEngine.load(path)
+        frame = engine.mask[2]
+        engine.set_mask(2, np.where(frame == 1, 0, frame))
+        calls = []
+
+        def progress(done, total):
+            calls.append((done, total))
+            if len(calls) == k:
+                raise _Cancel()
+        try:
+            engine.save(progress=progress)
+        except _Cancel:
+            # cancelled at any checkpoint, files are untouched and nothing is left aside
+            assert [open(f, 'rb').read() for f in files] == before
+            assert not [f for f in os.listdir(path) if f.endswith('.tmp')]
+            continue
+        break
+    assert (5, 5) in calls
+    assert not np.any(tifffile.imread(files[0])[2] == 1)
+
+
+def test_retrack_steps(tmp_path):
+    engine = AmdTrkEngine.load(write_dataset(tmp_path / 'dataset'))
+    calls = []
+    engine.retrack(distance=10, frame_gap=0, progress=lambda done, total: calls.append((done, total)))
+    assert calls[-3:] == [(0, 2), (1, 2), (2, 2)]
@@ -0,0 +1,163 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+import pytest
+import tifffile
+
+from napari_amdtrk._io import imread_lazy, imsave_mask, is_zarr, read_table, write_table, table_cache_path, \
+    FrameStack, writable
+from napari_amdtrk._reader import reader_function
+from .conftest import write_dataset
+
+
+def test_imread_lazy_memmap(tmp_path):
+    path = str(tmp_path / 'stack.tif')
+    data = np.arange(4 * 8 * 8, dtype='uint16').reshape((4, 8, 8))
+    tifffile.imwrite(path, data, photometric='minisblack')
+
+    stack = imread_lazy(path)
+    assert isinstance(stack, np.memmap)
+    np.testing.assert_array_equal(stack, data)
+
+    # copy-on-write: edits stay in memory
+    stack = imread_lazy(path, writable=True)
+    stack[0] = 0
+    np.testing.assert_array_equal(tifffile.imread(path), data)
+
+
+def test_imread_lazy_compressed(tmp_path):
+    path = str(tmp_path / 'stack.tif')
+    data = np.arange(4 * 8 * 8, dtype='uint16').reshape((4, 8, 8))
+    tifffile.imwrite(path, data, photometric='minisblack', compression='zlib')
+
+    stack = imread_lazy(path)
+    assert stack.chunks[0] == (1, 1, 1, 1)
+    np.testing.assert_array_equal(stack.compute(), data)
+
+
+def test_imsave_mask_over_memmap(tmp_path):
+    path = str(tmp_path / 'mask.tif')
+    data = np.ones((3, 8, 8), dtype='uint16')
+    tifffile.imwrite(path, data, photometric='minisblack')
+
+    mask = imread_lazy(path, writable=True)
+    mask[1] = 2
+    imsave_mask(path, mask)
+    saved = tifffile.imread(path)
+    assert saved.dtype == np.uint8
+    np.testing.assert_array_equal(saved, mask)
+    # written frame by frame as one memory-mappable series
+    assert tifffile.memmap(path).shape == (3, 8, 8)
+
+
+def test_reader_lazy(tmp_path):
+    eager = reader_function(write_dataset(tmp_path / 'eager'))
+    lazy = reader_function(write_dataset(tmp_path / 'lazy', lazy=True, compress=True))
+    assert len(eager) == len(lazy) == 4
+    for a, b in zip(eager[:2], lazy[:2]):
+        np.testing.assert_array_equal(a[0], np.asarray(b[0]))
+    assert lazy[1][1]['metadata']['lazy']
+
+
+def test_reader_name_window(tmp_path):
+    layers = reader_function(write_dataset(tmp_path / 'data', name_window=1))
+    points = layers[-1]
+    # 4 objects on each of frames 0 and 1
+    assert points[0].shape[0] == 8
+    assert len(points[1]['features']['name']) == 8
+    assert layers[1][1]['metadata']['name_window'] == 1
+
+
+def test_imsave_mask_frames(tmp_path):
+    path = str(tmp_path / 'mask.tif')
+    mask = np.zeros((4, 8, 8), dtype='uint16')
+    imsave_mask(path, mask)
+    stamp = open(path, 'rb').read()
+
+    mask[2, 1:3, 1:3] = 7
+    imsave_mask(path, mask, frames=[2])
+    np.testing.assert_array_equal(tifffile.imread(path), mask)
+    assert len(open(path, 'rb').read()) == len(stamp)
+
+    # labels no longer fit in the file dtype, the stack is rewritten
+    mask[1, 0, 0] = 300
+    imsave_mask(path, mask, frames=[1])
+    saved = tifffile.imread(path)
+    assert saved.dtype == np.uint16
+    np.testing.assert_array_equal(saved, mask)
+
+
+def test_table_cache(tmp_path):
+    pytest.importorskip('pyarrow')
+    path = str(tmp_path / 'a_track.csv')
+    table = pd.DataFrame({'frame': [0, 1], 'trackId': [1, 1], 'phase': ['G1', np.nan]})
+    write_table(path, table, csv=False)
+    assert not os.path.exists(path)
+    pd.testing.assert_frame_equal(read_table(path), table)
+
+    # a CSV edited after the cache is parsed again, and the cache refreshed
+    time.sleep(0.01)
+    table.loc[0, 'trackId'] = 2
+    table.to_csv(path, index=False)
+    assert read_table(path).loc[0, 'trackId'] == 2
+    assert os.path.getmtime(table_cache_path(path)) >= os.path.getmtime(path)
+    assert pd.read_parquet(table_cache_path(path)).loc[0, 'trackId'] == 2
+
+
+def test_imsave_mask_zarr(tmp_path):
+    zarr = pytest.importorskip('zarr')
+    path = str(tmp_path / 'a_mask.zarr')
+    assert is_zarr(path)
+    mask = np.zeros((4, 8, 8), dtype='uint16')
+    mask[0, 1:3, 1:3] = 3
+    imsave_mask(path, mask)
+    store = zarr.open(path, mode='r')
+    assert store.dtype == np.uint8 and store.chunks == (1, 8, 8)
+    np.testing.assert_array_equal(imread_lazy(path, writable=True), mask)
+
+    # only the edited frame is written
+    mask[2, 0, 0] = 5
+    mask[3, 0, 0] = 6
+    imsave_mask(path, mask, frames=[2])
+    saved = imread_lazy(path)[...]
+    assert saved[2, 0, 0] == 5 and saved[3, 0, 0] == 0
+
+    # labels no longer fit in the store dtype, the store is rebuilt
+    mask[1, 0, 0] = 300
+    imsave_mask(path, mask, frames=[1])
+    saved = zarr.open(path, mode='r')
+    assert saved.dtype == np.uint16
+    np.testing.assert_array_equal(saved[...], mask)
+    assert sorted(os.listdir(tmp_path)) == ['a_mask.zarr']
+
+
+def test_frame_stack(tmp_path):
+    zarr = pytest.importorskip('zarr')
+    path = str(tmp_path / 'a_mask.zarr')
+    mask = np.zeros((4, 8, 8), dtype='uint8')
+    mask[1, 2:4, 2:4] = 3
+    imsave_mask(path, mask)
+    on_disk = mask.copy()
+
+    stack = imread_lazy(path, writable=True)
+    assert isinstance(stack, FrameStack) and stack.shape == (4, 8, 8) and stack.dtype == np.uint8
+    np.testing.assert_array_equal(stack[1:3], mask[1:3])
+    # frames are read, not kept, and can not be written to in place
+    assert stack.edited == {} and not stack[0].flags.writeable
+
+    # edits stay in memory
+    stack[2, 0, 0] = 7
+    writable(stack, (3, slice(0, 2))).fill(5)
+    stack[(np.array([0, 0, 1]), np.array([1, 2, 2]), np.array([1, 2, 2]))] = [1, 2, 0]
+    mask[2, 0, 0] = 7
+    mask[3, 0:2] = 5
+    mask[0, 1, 1], mask[0, 2, 2], mask[1, 2, 2] = 1, 2, 0
+    assert sorted(stack.edited) == [0, 1, 2, 3]
+    np.testing.assert_array_equal(stack[(np.array([0, 1]), np.array([2, 2]), np.array([2, 3]))], [2, 3])
+    np.testing.assert_array_equal(stack, mask)
+    np.testing.assert_array_equal(zarr.open(path, mode='r')[...], on_disk)
+
+    # written back frame by frame
+    imsave_mask(path, stack, frames=[0, 1, 2, 3])
+    np.testing.assert_array_equal(zarr.open(path, mode='r')[...], mask)
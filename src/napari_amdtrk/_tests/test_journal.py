@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from napari_amdtrk._journal import Journal
+from napari_amdtrk._store import TrackStore
+
+
+def _state():
+    table = pd.DataFrame({'frame': [0, 1, 0], 'trackId': [1, 1, 2], 'continuous_label': [1, 1, 2],
+                          'parentTrackId': [0, 0, 0], 'lineageId': [1, 1, 2]})
+    mask = np.zeros((2, 6, 6), dtype='uint8')
+    mask[0, 1:3, 1:3] = 1
+    mask[1, 2:4, 2:4] = 1
+    mask[0, 4:6, 4:6] = 2
+    return table, mask
+
+
+def _replayer(store, mask):
+    def replay(entry, undo):
+        for op in (reversed(entry.ops) if undo else entry.ops):
+            if op[0] == 'rows':
+                store.replace(op[1], op[2] if undo else op[3])
+            elif op[0] == 'pixels':
+                mask[op[1]].flat[op[2]] = op[3] if undo else op[4]
+    return replay
+
+
+def _edit(journal, store, mask):
+    region = mask[0]
+    idx = np.flatnonzero(region == 2)
+    journal.log_pixels((0,), idx, region.flat[idx], 0)
+    region[region == 2] = 0
+    store.drop(store.rows(2))
+    store.set(store.rows(1), {'parentTrackId': 3})
+    store.append(pd.DataFrame({'frame': [1], 'trackId': [3], 'continuous_label': [2],
+                               'parentTrackId': [0], 'lineageId': [3]}))
+
+
+def _same(store, table):
+    pd.testing.assert_frame_equal(store.table.sort_index(), table.sort_index(), check_dtype=False)
+
+
+def test_journal_undo_redo():
+    table, mask = _state()
+    store = TrackStore(table.copy())
+    journal = Journal(None)
+    journal.replay = _replayer(store, mask)
+    store.journal = journal
+    ori_mask = mask.copy()
+
+    with journal.action('edit', lambda: store):
+        _edit(journal, store, mask)
+    edited, edited_mask = store.table.copy(), mask.copy()
+    assert [e.name for e in journal.undo_stack] == ['edit']
+
+    assert journal.undo() == 'edit'
+    _same(store, table)
+    np.testing.assert_array_equal(mask, ori_mask)
+    assert store.daughters(3) == [] and not store.has_track(3)
+    assert journal.undo() is None
+
+    assert journal.redo() == 'edit'
+    _same(store, edited)
+    np.testing.assert_array_equal(mask, edited_mask)
+    assert store.daughters(3) == [1]
+
+
+def test_journal_rollback():
+    table, mask = _state()
+    store = TrackStore(table.copy())
+    journal = Journal(None)
+    journal.replay = _replayer(store, mask)
+    store.journal = journal
+    ori_mask = mask.copy()
+
+    with pytest.raises(ValueError):
+        with journal.action('edit', lambda: store):
+            with journal.action('nested', lambda: store):
+                _edit(journal, store, mask)
+            raise ValueError('failed')
+    _same(store, table)
+    np.testing.assert_array_equal(mask, ori_mask)
+    assert not journal.can_undo()
+
+
+def test_journal_limit():
+    journal = Journal(lambda entry, undo: None, max_entries=2)
+    for name in ('a', 'b', 'c'):
+        with journal.action(name):
+            journal.log_pixels((0,), None, 0, 1)
+    assert [e.name for e in journal.undo_stack] == ['b', 'c'] and journal.truncated
+    journal.clear()
+    assert not journal.truncated
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+import pandas as pd
+
+from napari_amdtrk._linking import link_objects, link_kdtree, link_divisions, register_linker, LINKERS
+
+
+def moving_objects(gap_frame=None):
+    """Two objects moving towards each other, the first one missing at `gap_frame`."""
+    rows = []
+    for t in range(6):
+        if t != gap_frame:
+            rows.append({'frame': t, 'Center_of_the_object_0': 10 + 3 * t, 'Center_of_the_object_1': 10})
+        rows.append({'frame': t, 'Center_of_the_object_0': 50 - 3 * t, 'Center_of_the_object_1': 14})
+    return pd.DataFrame(rows)
+
+
+def test_link_kdtree():
+    table = moving_objects()
+    ids = link_kdtree(table, distance=5, frame_gap=0)
+    first = ids[table['Center_of_the_object_1'].to_numpy() == 10]
+    second = ids[table['Center_of_the_object_1'].to_numpy() == 14]
+    assert len(set(first)) == 1 and len(set(second)) == 1 and first[0] != second[0]
+    assert set(ids) == {1, 2}
+
+    # an object missing for one frame is linked across the gap only if allowed
+    table = moving_objects(gap_frame=2)
+    assert len(set(link_kdtree(table, distance=7, frame_gap=1))) == 2
+    assert len(set(link_kdtree(table, distance=7, frame_gap=0))) == 3
+
+    # too far to link
+    assert len(set(link_kdtree(table, distance=1, frame_gap=1))) == table.shape[0]
+
+
+def test_link_objects():
+    table = moving_objects()
+    with pytest.raises(ValueError):
+        link_objects(table, 5, 0, linker='unknown')
+
+    register_linker('single', lambda table, distance, frame_gap: np.ones(table.shape[0], dtype='int64'))
+    try:
+        assert set(link_objects(table, 5, 0, linker='single')) == {1}
+    finally:
+        del LINKERS['single']
+
+
+def test_link_divisions():
+    rows = []
+    # track 1 continues as one daughter, track 2 starts next to it
+    rows += [(1, t, 10, 10, 'M' if t == 2 else 'G2') for t in range(6)] + [(2, t, 13, 10, 'G1') for t in range(3, 6)]
+    # track 3 is broken by the linker: ends next to the start of track 4
+    rows += [(3, t, 200, 10, 'G2') for t in range(3)] + [(4, t, 201, 10, 'G2') for t in range(3, 6)]
+    # track 5 ends, tracks 6 and 7 start on each side of it
+    rows += [(5, t, 300, 10, 'G2') for t in range(2)] + [(5, 2, 300, 10, 'M')]
+    rows += [(6, t, 297, 10, 'G1') for t in range(3, 6)] + [(7, t, 303, 10, 'G1') for t in range(3, 6)]
+    track = pd.DataFrame(rows, columns=['trackId', 'frame', 'Center_of_the_object_0', 'Center_of_the_object_1',
+                                        'phase'])
+    track['parentTrackId'] = 0
+    track['lineageId'] = track['trackId']
+
+    # from proximity alone, only the track ending next to two new tracks divides
+    out = link_divisions(track, distance=5)
+    parent = out.drop_duplicates('trackId').set_index('trackId')['parentTrackId'].to_dict()
+    assert parent == {1: 0, 2: 0, 3: 0, 4: 0, 5: 0, 6: 5, 7: 5}
+    assert list(out['trackId']) == list(track['trackId'])
+
+    # with a mitosis state, the continuation of track 1 is split off as the sister of track 2
+    out = link_divisions(track, distance=5, phase_col='phase', mitosis='M')
+    parent = out.drop_duplicates('trackId').set_index('trackId')['parentTrackId'].to_dict()
+    lineage = out.drop_duplicates('trackId').set_index('trackId')['lineageId'].to_dict()
+    assert list(out.loc[out['Center_of_the_object_0'] == 10, 'trackId']) == [1, 1, 1, 8, 8, 8]
+    assert parent == {1: 0, 2: 1, 8: 1, 3: 0, 4: 0, 5: 0, 6: 5, 7: 5}
+    assert lineage == {1: 1, 2: 1, 8: 1, 3: 3, 4: 4, 5: 5, 6: 5, 7: 5}
+    assert track['parentTrackId'].eq(0).all()
+
+    # mothers must be in mitosis at their last frame, division only found from frame 3 on
+    out = link_divisions(track.assign(phase=track['phase'].where(track['trackId'] != 1, 'G2')), distance=5,
+                         phase_col='phase', mitosis='M', frames=range(3, 6))
+    parent = out.drop_duplicates('trackId').set_index('trackId')['parentTrackId'].to_dict()
+    assert parent == {1: 0, 2: 0, 3: 0, 4: 0, 5: 0, 6: 5, 7: 5}
+
+
+def test_link_divisions_running_track():
+    # an object appearing next to a running track is not its daughter
+    track = pd.DataFrame({'trackId': [1] * 10 + [2] * 5, 'frame': list(range(10)) + list(range(5, 10)),
+                          'Center_of_the_object_0': [10.] * 10 + [15.] * 5, 'Center_of_the_object_1': 10.,
+                          'parentTrackId': 0, 'phase': 'G2'})
+    track['lineageId'] = track['trackId']
+    out = link_divisions(track, distance=10)
+    assert list(out['trackId']) == list(track['trackId'])
+    assert out['parentTrackId'].eq(0).all()
+    out = link_divisions(track, distance=10, phase_col='phase', mitosis='M')
+    assert out['parentTrackId'].eq(0).all()
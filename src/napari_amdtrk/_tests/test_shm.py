@@ -0,0 +1,47 @@
+import gc
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pytest
+
+from napari_amdtrk._shm import share, handle_of, attach
+from napari_amdtrk._utils import measure_stack
+
+
+def _frame_sums(handle):
+    return attach(handle).sum(axis=(1, 2)).tolist()
+
+
+def test_share():
+    mask = np.arange(4 * 5 * 6, dtype='uint16').reshape(4, 5, 6)
+    assert handle_of(mask) is None
+    shared = share(mask)
+    np.testing.assert_array_equal(shared, mask)
+    handle = handle_of(shared)
+    assert handle is not None and handle_of(shared[1:]) is None
+
+    # edits in place are seen by workers
+    shared[2] = 0
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        assert executor.submit(_frame_sums, handle).result() == shared.sum(axis=(1, 2)).tolist()
+
+    serial = measure_stack(shared)
+    for a, b in zip(serial, measure_stack(shared, n_workers=2, chunk_size=2, use_processes=True)):
+        np.testing.assert_array_equal(a, b)
+
+    # the block is released with the array
+    del shared
+    gc.collect()
+    from multiprocessing import shared_memory
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=handle[1])
+
+
+def test_handle_of_memmap(tmp_path):
+    path = str(tmp_path / 'mask.dat')
+    mask = np.memmap(path, dtype='uint8', mode='w+', shape=(3, 4, 4))
+    mask[1] = 7
+    mask.flush()
+    assert handle_of(np.memmap(path, dtype='uint8', mode='c', shape=(3, 4, 4))) is None
+    readonly = np.memmap(path, dtype='uint8', mode='r', shape=(3, 4, 4))
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        assert executor.submit(_frame_sums, handle_of(readonly)).result() == [0, 112, 0]
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+from napari_amdtrk._store import TrackStore
+
+
+def _table():
+    return pd.DataFrame({'frame':            [1, 0, 0, 1, 2, 2, 2],
+                         'trackId':          [1, 1, 2, 2, 3, 4, 0],
+                         'continuous_label': [1, 1, 2, 2, 1, 2, 3],
+                         'parentTrackId':    [0, 0, 0, 0, 2, 2, 0],
+                         'lineageId':        [1, 1, 2, 2, 2, 2, 0]})
+
+
+def test_store_queries():
+    store = TrackStore(_table())
+    assert list(store.rows(1)) == [1, 0]  # sorted by frame
+    assert store.has_track(0) and not store.has_track(5)
+    assert list(store.frame_rows(2)) == [4, 5, 6]
+    assert store.row_at(2, 2) == 5 and store.row_at(2, 9) is None
+    assert store.daughters(2) == [3, 4]
+    assert store.first(3, 'parentTrackId') == 2
+
+
+def test_store_updates():
+    store = TrackStore(_table())
+    store.set(store.rows(4), {'parentTrackId': 0, 'lineageId': 4})
+    assert store.daughters(2) == [3]
+    store.set([3], {'trackId': 5})
+    assert list(store.rows(2)) == [2] and list(store.rows(5)) == [3]
+    store.drop(store.rows(1))
+    assert not store.has_track(1) and list(store.frame_rows(0)) == [2]
+
+    new = store.append(pd.DataFrame({'frame': [0], 'trackId': [3], 'continuous_label': [7],
+                                     'parentTrackId': [2], 'lineageId': [2]}))
+    assert list(new) == [7]
+    assert list(store.rows(3)) == [7, 4]
+    assert store.row_at(0, 7) == 7
+
+    # indexes match a store rebuilt from the table
+    fresh = TrackStore(store.table)
+    for i in fresh.track_ids():
+        np.testing.assert_array_equal(store.rows(i), fresh.rows(i))
+        assert store.daughters(i) == fresh.daughters(i)
+    assert sorted(store.track_ids()) == sorted(fresh.track_ids())
+
+
+def test_store_descendants():
+    track = pd.DataFrame({'frame': [0, 1, 2, 3, 4, 0],
+                          'trackId': [1, 2, 2, 3, 4, 5],
+                          'continuous_label': [1, 2, 2, 3, 4, 5],
+                          'parentTrackId': [0, 1, 1, 1, 3, 0]})
+    store = TrackStore(track)
+    assert store.daughters(1) == [2, 3]
+    assert sorted(store.descendants(1)) == [2, 3, 4]
+    assert store.descendants(4) == []
+
+
+def test_store_lineage():
+    store = TrackStore(_table())
+    store.set(store.rows(1), {'parentTrackId': 3})
+    assert sorted(store.descendants(2)) == [1, 3, 4]
+    assert store.descendants(1) == []
+    store.set_lineage(store.descendants(2), 9)
+    assert set(store.table.loc[store.table['trackId'].isin([1, 3, 4]), 'lineageId']) == {9}
+    assert set(store.table.loc[store.table['trackId'] == 2, 'lineageId']) == {2}
+
+
+def test_store_compaction():
+    store = TrackStore(_table())
+    store.drop(store.rows(2))
+    new = store.append(pd.DataFrame({'frame': [3, 4], 'trackId': [4, 4], 'continuous_label': [2, 2],
+                                     'parentTrackId': [2, 2], 'lineageId': [2, 2]}))
+    assert list(new) == [7, 8]
+    # dropped and spare rows stay out of queries before compaction
+    assert store.present([2, 3, 7, 9]) == [7]
+    assert list(store.rows(4)) == [5, 7, 8] and list(store.frame_rows(1)) == [0]
+    assert store.at[8, 'frame'] == 4
+
+    table = store.table
+    assert list(table.index) == [0, 1, 4, 5, 6, 7, 8]
+    assert table['frame'].dtype == _table()['frame'].dtype
+
+    # rows compacted away are put back, rows still held are written in place
+    before = _table().loc[[2, 3]]
+    store.replace([7, 8], before)
+    assert sorted(store.table.index) == [0, 1, 2, 3, 4, 5, 6]
+    assert list(store.rows(2)) == [2, 3] and list(store.rows(4)) == [5]
+    assert list(store.append(before)) == [9, 10]
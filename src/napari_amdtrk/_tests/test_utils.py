@@ -0,0 +1,141 @@
+import numpy as np
+import pytest
+import pandas as pd
+
+from napari_amdtrk._utils import get_annotation, label_props, align_table_and_mask, measure_stack, \
+    identity_lut, relabel_frames, stitch_window, resolve_lineage, BBOX_COLS
+
+
+def test_get_annotation():
+    track = pd.DataFrame({'trackId': [1, 1, 2, 0, 0, 3],
+                          'parentTrackId': [0, 0, 1, 0, 0, 1],
+                          'phase': ['G1', 'S', 'G1', 'S', np.nan, 'M']})
+    names = get_annotation(track.copy(), True, 'phase')['name']
+    assert list(names) == ['1-G1', '1-S', '2-1-G1', 'unassigned-S', 'unassigned', '3-1-M']
+
+    names = get_annotation(track.copy(), False, 'state')['name']
+    assert list(names) == ['1', '1', '2-1', 'unassigned', 'unassigned', '3-1']
+
+    assert get_annotation(track.iloc[:0].copy(), True, 'phase').shape[0] == 0
+
+
+def test_label_props():
+    from skimage.measure import regionprops
+
+    sls = np.zeros((30, 40), dtype='uint16')
+    sls[2:9, 3:7] = 5
+    sls[10:12, 20:35] = 2
+    sls[20:29, 1:4] = 9
+    sls[25, 30] = 9
+    labels, centroids, bboxes = label_props(sls)
+    props = regionprops(sls)
+    assert list(labels) == [p.label for p in props]
+    np.testing.assert_array_equal(centroids, [p.centroid for p in props])
+    np.testing.assert_array_equal(bboxes, [p.bbox for p in props])
+    assert label_props(np.zeros((3, 3), dtype='uint8'))[0].size == 0
+
+
+def test_align_table_and_mask():
+    mask = np.zeros((2, 10, 10), dtype='uint8')
+    mask[0, 1:4, 1:4] = 1
+    mask[0, 6:9, 6:8] = 2
+    mask[1, 1:4, 2:5] = 1
+    track = pd.DataFrame({'frame': [0, 1, 1, 3], 'trackId': [1, 1, 2, 1], 'continuous_label': [1, 1, 3, 1],
+                          'Center_of_the_object_0': [2., 2., 5., 2.], 'Center_of_the_object_1': [2., 2., 5., 2.],
+                          'phase': ['S'] * 4, 'lineageId': [1, 1, 2, 1], 'parentTrackId': [0] * 4})
+    _, new = align_table_and_mask(track, mask, align_morph=True, phase_col='phase', phase_default='G1')
+
+    # label 3 at frame 1 and frame 3 are not in the mask, label 2 at frame 0 is registered
+    assert list(new['frame']) == [0, 0, 1]
+    assert list(new['continuous_label']) == [1, 2, 1]
+    assert list(new['trackId']) == [1, 0, 1]
+    assert list(new['phase']) == ['S', 'G1', 'S']
+    assert list(new.index) == [0, 1, 2]
+    np.testing.assert_array_equal(new['Center_of_the_object_0'], [2., 6.5, 3.])
+    np.testing.assert_array_equal(new['Center_of_the_object_1'], [2., 7., 2.])
+
+
+def test_measure_stack_parallel():
+    rng = np.random.default_rng(0)
+    mask = rng.integers(0, 6, (9, 16, 16)).astype('uint16')
+    serial = measure_stack(mask)
+    for use_processes in [False, True]:
+        parallel = measure_stack(mask, n_workers=3, chunk_size=2, use_processes=use_processes)
+        for a, b in zip(serial, parallel):
+            np.testing.assert_array_equal(a, b)
+
+    calls = []
+    measure_stack(mask, n_workers=2, chunk_size=4, progress=lambda done, total: calls.append((done, total)))
+    assert calls == [(4, 9), (8, 9), (9, 9)]
+
+    def _abort(done, total):
+        raise KeyboardInterrupt()
+    with pytest.raises(KeyboardInterrupt):
+        measure_stack(mask, chunk_size=2, progress=_abort)
+
+
+def test_align_table_and_mask_frames():
+    mask = np.zeros((3, 10, 10), dtype='uint8')
+    mask[:, 1:4, 1:4] = 1
+    mask[2, 6:9, 6:9] = 2
+    track = pd.DataFrame({'frame': [0, 1, 1, 2], 'trackId': [1, 1, 2, 1], 'continuous_label': [1, 1, 5, 1],
+                          'Center_of_the_object_0': [2.] * 4, 'Center_of_the_object_1': [2.] * 4,
+                          'lineageId': [1, 1, 2, 1], 'parentTrackId': [0] * 4})
+    _, new = align_table_and_mask(track, mask, frames=[2])
+
+    # label 5 at frame 1 is out of scope and kept, label 2 at frame 2 is registered
+    assert list(new['frame']) == [0, 1, 1, 2, 2]
+    assert list(new['continuous_label']) == [1, 1, 5, 1, 2]
+
+    # boxes are only measured for the frames aligned
+    _, new = align_table_and_mask(track, mask, frames=[2], bbox=True)
+    assert np.isnan(new.loc[:2, BBOX_COLS].to_numpy()).all()
+    np.testing.assert_array_equal(new.loc[3:, BBOX_COLS], [[1, 1, 4, 4], [6, 6, 9, 9]])
+
+
+def test_relabel_frames():
+    mask = np.zeros((3, 6, 6), dtype='uint8')
+    mask[:, 0:2, 0:2] = 1
+    mask[:, 3:5, 3:5] = 2
+    lut = identity_lut(mask)
+    assert lut.size == 256
+    lut[2] = 0
+    changes = []
+    changed = relabel_frames(mask, lut, frames=[0, 2], chunk_size=1,
+                             on_change=lambda f, idx, old, new: changes.append((f, idx.size)))
+    assert changed == [0, 2]
+    assert changes == [(0, 4), (2, 4)]
+    assert not np.any(mask[[0, 2]] == 2) and np.sum(mask[1] == 2) == 4
+
+    # one lookup table per frame
+    luts = np.zeros((3, 256), dtype='uint8')
+    luts[1, 1] = 1
+    assert relabel_frames(mask, luts) == [0, 1, 2]
+    assert np.all(mask[0] == 0) and np.sum(mask[1] == 1) == 4 and not np.any(mask[1] == 2)
+
+
+def test_resolve_lineage():
+    track = pd.DataFrame({'trackId': [1, 2, 3, 4, 0], 'parentTrackId': [0, 1, 2, 9, 0], 'lineageId': [0] * 5})
+    assert list(resolve_lineage(track)['lineageId']) == [1, 1, 1, 4, 0]
+
+
+def test_stitch_window():
+    # two objects, track IDs swapped from frame 4 on, track 3 born at frame 8 from the upper object
+    rows = []
+    for t in range(10):
+        for y, trk in [(10, 1 if t < 4 else 2), (30, 2 if t < 4 else 1)]:
+            rows.append({'frame': t, 'trackId': trk, 'y': y, 'parentTrackId': 0, 'lineageId': trk})
+    for t in range(8, 10):
+        rows.append({'frame': t, 'trackId': 3, 'y': 12, 'parentTrackId': 2, 'lineageId': 2})
+    track = pd.DataFrame(rows)
+
+    # link frames 2 to 6 for a window of 3 to 5: one particle per object
+    sel = track.index[(track['frame'] >= 2) & (track['frame'] <= 6) & (track['trackId'] != 3)]
+    particles = np.where(track.loc[sel, 'y'] == 10, 7, 8)
+    stitch_window(track, sel, particles, 3, 5, next_id=4)
+
+    upper = track[track['y'] == 10]
+    assert set(upper['trackId']) == {1}
+    assert set(track.loc[track['y'] == 30, 'trackId']) == {2}
+    daughter = track[track['trackId'] == 3]
+    assert set(daughter['parentTrackId']) == {1} and set(daughter['lineageId']) == {1}
@@ -1,36 +1,99 @@
+import threading
 import numpy as np
 
-from napari_amdtrk import ExampleQWidget, example_magic_widget
+from napari_amdtrk._reader import napari_get_reader
+from .conftest import write_dataset
+
+
+def _open(viewer, path):
+    """Add the layers of a dataset to the viewer and dock the widget."""
+    from napari_amdtrk._widget import AmdTrkWidget
+
+    for data, kwargs, kind in napari_get_reader(path)(path):
+        getattr(viewer, 'add_' + kind)(data, **kwargs)
+    return AmdTrkWidget(viewer)
+
+
+def _wait_job(qtbot, widget):
+    qtbot.waitUntil(lambda: widget.job is None, timeout=10000)
+    return widget.job_widgets['msg'].value
 
 
 # make_napari_viewer is a pytest fixture that returns a napari viewer object
-# capsys is a pytest fixture that captures stdout and stderr output streams
-def test_example_q_widget(make_napari_viewer, capsys):
-    # make viewer and add an image layer using our fixture
-    viewer = make_napari_viewer()
-    viewer.add_image(np.random.random((100, 100)))
+def test_paint_undo(make_napari_viewer, tmp_path):
+    widget = _open(make_napari_viewer(), write_dataset(tmp_path / 'dataset'))
+    labels = widget.viewer.layers['segm']
+    before = np.array(labels.data)
+
+    widget.viewer.dims.set_current_step(0, 2)
+    labels.selected_label = 3
+    labels.brush_size = 5
+    labels.paint((2, 40, 40), 3)
+    assert labels.data[2, 40, 40] == 3
+    assert widget.journal.undo_stack[-1].name == 'paint' and 2 in widget.dirty
+
+    assert widget.forms['undo']() == 'Undone: paint.'
+    np.testing.assert_array_equal(np.asarray(labels.data), before)
+    widget.forms['redo']()
+    assert labels.data[2, 40, 40] == 3
+
+
+def test_cancel_job(make_napari_viewer, tmp_path, qtbot):
+    widget = _open(make_napari_viewer(), write_dataset(tmp_path / 'dataset'))
+    gate = threading.Event()
+    applied = []
 
-    # create our widget, passing in the viewer
-    my_widget = ExampleQWidget(viewer)
+    def job(progress):
+        progress(0, 2)
+        gate.wait(5)
+        progress(1, 2)
+        return 'result'
 
-    # call our widget method
-    my_widget._on_click()
+    widget.run_job('Testing', job, applied.append)
+    # edits are locked while the job runs
+    assert not widget.viewer.layers['segm'].editable
+    assert not widget.job_widgets['locked'][0].enabled
+    widget.cancel_job()
+    gate.set()
+    assert _wait_job(qtbot, widget) == 'Cancelled.'
+    assert applied == [] and widget.viewer.layers['segm'].editable
 
-    # read captured output and check that it's as we expected
-    captured = capsys.readouterr()
-    assert captured.out == "napari has 1 layers\n"
 
+def test_windowed_retrack(make_napari_viewer, tmp_path, qtbot):
+    widget = _open(make_napari_viewer(), write_dataset(tmp_path / 'dataset'))
+    ids = sorted(widget.store.track_ids())
+    retrack = widget.forms['retrack']
+    # a window ending at the first frame
+    retrack.update({'distance': 10, 'frame_gap': 0, 'whole_movie': False, 'frame_start': 0, 'frame_end': 0})
+    retrack()
+    assert _wait_job(qtbot, widget) == 'Re-tracked.'
+    assert widget.journal.undo_stack[-1].name == 'retrack'
+    # objects in the window were stitched back to their tracks
+    assert sorted(widget.store.track_ids()) == ids
+    for i in ids:
+        assert list(widget.store.track(i)['frame']) == [0, 1, 2, 3, 4]
 
-def test_example_magic_widget(make_napari_viewer, capsys):
-    viewer = make_napari_viewer()
-    layer = viewer.add_image(np.random.random((100, 100)))
 
-    # this time, our widget will be a MagicFactory or FunctionGui instance
-    my_widget = example_magic_widget()
+def test_refresh_edited_rows(make_napari_viewer, tmp_path):
+    widget = _open(make_napari_viewer(), write_dataset(tmp_path / 'dataset'))
+    widget.refresh()
 
-    # if we "call" this object, it'll execute our function
-    my_widget(viewer.layers[0])
+    def layers():
+        tracks = widget.viewer.layers['tracks'].data
+        names = widget.viewer.layers['name']
+        order = np.lexsort(names.data.T)
+        return tracks[np.lexsort(tracks.T[::-1])], names.data[order], names.features['name'].to_numpy()[order]
 
-    # read captured output and check that it's as we expected
-    captured = capsys.readouterr()
-    assert captured.out == f"you have selected {layer}\n"
+    # rows dropped, moved between tracks and put back, against a refresh of the whole table
+    widget.delete_track(1, frame=2)
+    widget.refresh()
+    widget.create_or_replace(2, 3)
+    widget.refresh()
+    widget.undo()
+    widget.refresh()
+    edited = layers()
+    widget.touched = None
+    widget.refresh()
+    for a, b in zip(edited, layers()):
+        np.testing.assert_array_equal(a, b)
+    assert widget.layer_cache['rows'].size == widget.track.shape[0]
@@ -1,8 +1,15 @@
 # -*- coding: utf-8 -*-
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import numpy as np
 import pandas as pd
-import skimage.measure as measure
 import time
+from ._shm import share, handle_of, attach
+from ._io import writable
+
+# object bounding box columns of the table, (min_row, min_col, max_row, max_col) as in `regionprops_table`
+BBOX_COLS = ['bbox-0', 'bbox-1', 'bbox-2', 'bbox-3']
+
 
 def get_current_time():
     return time.strftime('%H:%M:%S')
@@ -20,117 +27,269 @@ def get_layer_id_by_name(viewer, nm):
 
 
 def get_annotation(track, hasState, stateColName):
-    ann = []
-    cls_col = stateColName
-    track_id = list(track['trackId'])
-    parent_id = list(track['parentTrackId'])
-    cls_lb = list(track[cls_col])
-    for i in range(track.shape[0]):
-        if int(track_id[i]) > 0:
-            if hasState:
-                inform = [str(track_id[i]), str(parent_id[i]), cls_lb[i]]
-            else:
-                inform = [str(track_id[i]), str(parent_id[i])]
-            if inform[1] == '0':
-                del inform[1]
-            ann.append('-'.join(inform))
-        else:
-            if hasState:
-                if cls_lb[i] != cls_lb[i]: # for nan
-                    ann.append('unassigned')
-                else:
-                    ann.append('unassigned-' + cls_lb[i])
-            else:
-                ann.append('unassigned')
-    track['name'] = ann
+    """Add the `name` column: track ID - (parent track ID, optional) - state.
+
+    Names are built with vectorized string operations, once per distinct (trackId, parentTrackId, state)
+    combination, and broadcast back to the rows with integer codes.
+
+    Args:
+        track (pandas.DataFrame): tracked object table.
+        hasState (bool): whether the state column is part of the annotation.
+        stateColName (str): column name of the state.
+    """
+    cols = ['trackId', 'parentTrackId']
+    if hasState:
+        cols.append(stateColName)
+    # combine per-column codes into one code per distinct row, numbered by first appearance
+    if track.shape[0] == 0:
+        track['name'] = []
+        return track
+    key, _ = pd.factorize(track[cols[0]], use_na_sentinel=False)
+    for c in cols[1:]:
+        codes, uniq = pd.factorize(track[c], use_na_sentinel=False)
+        key, _ = pd.factorize(key * len(uniq) + codes)
+    cm = np.maximum.accumulate(key)
+    first = np.flatnonzero(np.r_[True, cm[1:] > cm[:-1]])
+
+    trk = track['trackId'].iloc[first].reset_index(drop=True)
+    par = track['parentTrackId'].iloc[first].reset_index(drop=True).astype(str)
+    name = trk.astype(str)
+    name = pd.Series(np.where(par == '0', name, name.str.cat(par, sep='-')), dtype=object)
+    if hasState:
+        state = track[stateColName].iloc[first].reset_index(drop=True)
+        state_str = state.astype(str)
+        name = name.str.cat(state_str, sep='-')
+        unassigned = np.where(state.isna(), 'unassigned', 'unassigned-' + state_str)
+    else:
+        unassigned = 'unassigned'
+    name = np.where(trk > 0, name, unassigned).astype(object)
+    track['name'] = name[key]
     return track
 
 
-def align_table_and_mask(table, mask, align_morph=False, phase_col=None, phase_default=None):
+def label_props(sls):
+    """Measure every labeled object of a 2D frame in a single pass.
+
+    Args:
+        sls (numpy.ndarray): 2D labeled object mask.
+
+    Returns:
+        labels (numpy.ndarray): sorted object labels (background excluded).
+        centroids (numpy.ndarray): (y, x) centroid of each object.
+        bboxes (numpy.ndarray): (min_row, min_col, max_row, max_col) of each object,
+            maximum exclusive as in `skimage.measure.regionprops`.
+    """
+    flat = sls.ravel()
+    pix = np.flatnonzero(flat)
+    lbs = flat[pix]
+    order = np.argsort(lbs, kind='stable')
+    lbs, pix = lbs[order], pix[order]
+    if lbs.size == 0:
+        return np.zeros(0, dtype='int64'), np.zeros((0, 2)), np.zeros((0, 4), dtype='int64')
+
+    y, x = np.divmod(pix, sls.shape[1])
+    starts = np.flatnonzero(np.r_[True, lbs[1:] != lbs[:-1]])
+    area = np.diff(np.r_[starts, lbs.size])
+    centroids = np.stack([np.add.reduceat(y, starts) / area, np.add.reduceat(x, starts) / area], axis=1)
+    bboxes = np.stack([np.minimum.reduceat(y, starts), np.minimum.reduceat(x, starts),
+                       np.maximum.reduceat(y, starts) + 1, np.maximum.reduceat(x, starts) + 1], axis=1)
+    return lbs[starts].astype('int64'), centroids, bboxes
+
+
+def _measure_frames(mask, frame_ids):
+    """Measure objects of frames, `mask[k]` being frame `frame_ids[k]`, see `measure_stack`.
+    """
+    frames, labels, centroids, bboxes = [], [], [], []
+    for k, i in enumerate(frame_ids):
+        lbs, cts, bbs = label_props(np.asarray(mask[k, :, :]))
+        frames.append(np.full(lbs.size, i, dtype='int64'))
+        labels.append(lbs)
+        centroids.append(cts)
+        bboxes.append(bbs)
+    if not frames:
+        return np.zeros(0, dtype='int64'), np.zeros(0, dtype='int64'), np.zeros((0, 2)), np.zeros((0, 4), dtype='int64')
+    return np.concatenate(frames), np.concatenate(labels), np.concatenate(centroids), np.concatenate(bboxes)
+
+
+def _block(mask, frame_ids):
+    # contiguous chunks are views, others copy their frames
+    if frame_ids[-1] - frame_ids[0] + 1 == frame_ids.size:
+        return mask[frame_ids[0]:frame_ids[-1] + 1]
+    return mask[frame_ids]
+
+
+def _measure_shared(handle, frame_ids):
+    """Measure frames of a shared stack in a worker process, see `_shm.attach`.
+    """
+    return _measure_frames(_block(attach(handle), frame_ids), frame_ids)
+
+
+def measure_stack(mask, n_workers=1, chunk_size=None, use_processes=False, frames=None, progress=None):
+    """Measure labels, centroids and bounding boxes of objects in every frame.
+
+    Frames are independent, so chunks of frames can be measured by a pool of workers.
+    Results are merged in frame order whatever the order workers finish in.
+
+    Args:
+        mask (numpy.ndarray): labeled object mask (txy).
+        n_workers (int): number of workers, 1 to measure in the calling thread.
+        chunk_size (int): frames per task, by default about four tasks per worker.
+        use_processes (bool): use a process pool instead of a thread pool. Workers attach the mask
+            through shared memory (see `_shm`): a mask from `_shm.share` or a file memory map is not copied,
+            others are copied once into shared memory for the call.
+        frames (list): optional, only measure these frames.
+        progress (callable): optional, progress(done, total) is called with the number of frames measured
+            after each chunk. It may raise to abort.
+
+    Returns:
+        frames (numpy.ndarray): frame of each object.
+        labels (numpy.ndarray): label of each object, sorted within a frame.
+        centroids (numpy.ndarray): (y, x) centroid of each object.
+        bboxes (numpy.ndarray): (min_row, min_col, max_row, max_col) of each object, see `label_props`.
+    """
+    if frames is None:
+        frame_ids = np.arange(mask.shape[0])
+    else:
+        frame_ids = np.unique(np.asarray(list(frames), dtype='int64'))
+    n_frame = frame_ids.size
+    if n_workers is None or n_workers < 1:
+        n_workers = os.cpu_count()
+    if chunk_size is None:
+        chunk_size = int(np.ceil(n_frame / (4 * n_workers)))
+    chunks = [frame_ids[s:s + chunk_size] for s in range(0, n_frame, max(chunk_size, 1))]
+
+    results = []
+
+    def _collect(res):
+        done = 0
+        for r, c in zip(res, chunks):
+            results.append(r)
+            done += c.size
+            if progress is not None:
+                progress(done, n_frame)
+
+    if n_workers == 1 or len(chunks) < 2:
+        _collect(_measure_frames(_block(mask, c), c) for c in chunks)
+    else:
+        shared = None
+        if use_processes:
+            # workers get a handle to the mask, not its frames
+            handle = handle_of(mask)
+            if handle is None:
+                shared = share(mask)
+                handle = handle_of(shared)
+            pool, task, args = ProcessPoolExecutor, _measure_shared, [(handle, c) for c in chunks]
+        else:
+            pool, task, args = ThreadPoolExecutor, _measure_frames, [(_block(mask, c), c) for c in chunks]
+        with pool(max_workers=n_workers) as executor:
+            futures = [executor.submit(task, *arg) for arg in args]
+            try:
+                _collect(f.result() for f in futures)
+            except BaseException:
+                # do not wait for chunks not started when aborted
+                for f in futures:
+                    f.cancel()
+                raise
+        del shared
+    if not results:
+        return _measure_frames(mask[:0], [])
+    return tuple(np.concatenate(r) for r in zip(*results))
+
+
+def align_table_and_mask(table, mask, align_morph=False, phase_col=None, phase_default=None,
+                         n_workers=1, chunk_size=None, use_processes=False, frames=None, progress=None, bbox=False):
     """For every object in the mask, check if is consistent with the table. If no, remove the object in the mask.
 
+    Objects of each frame are measured in one pass (`label_props`), then the table is reconciled with
+    the measured objects by (frame, label) keys.
+
     Args:
         table (pandas.DataFrame): (tracked) object table.
         mask (numpy.ndarray): labeled object mask, object label should be corresponding to `continuous_label` column in the table.
         align_morph (bool): align morphologically (match xy coordinate) or not.
         phase_col (str): column name of cell phases.
         phase_default (str): default phase, for registering unassigned objects.
+        n_workers (int): number of workers measuring frames in parallel, see `measure_stack`.
+        chunk_size (int): frames per worker task.
+        use_processes (bool): measure frames in worker processes instead of threads.
+        frames (list): optional, only align these frames (e.g. frames edited since the last alignment),
+            rows of other frames are kept as they are.
+        progress (callable): optional, progress(done, total) as frames are measured, see `measure_stack`.
+        bbox (bool): also write the bounding box of measured objects to the `BBOX_COLS` columns, added if
+            missing. Rows of frames not aligned keep theirs.
     """
+    obj_frame, obj_label, obj_ct, obj_box = measure_stack(mask, n_workers, chunk_size, use_processes, frames,
+                                                          progress)
+    if bbox and any(c not in table.columns for c in BBOX_COLS):
+        table = table.assign(**{c: np.nan for c in BBOX_COLS if c not in table.columns})
+    obj = pd.DataFrame({'frame': obj_frame, 'continuous_label': obj_label})
+    base = int(obj['continuous_label'].max()) + 1 if obj.shape[0] else 1
+    obj_key = obj['frame'].to_numpy() * base + obj['continuous_label'].to_numpy()
+
+    # table rows keyed by (frame, label), rows with invalid frame or label never match an object
+    frame = table['frame'].to_numpy(dtype='float')
+    label = table['continuous_label'].to_numpy(dtype='float')
+    valid = (frame >= 0) & (frame < mask.shape[0]) & (label > 0) & (label < base)
+    key = np.full(table.shape[0], -1, dtype='int64')
+    key[valid] = frame[valid].astype('int64') * base + label[valid].astype('int64')
+    in_scope = np.ones(table.shape[0], dtype=bool) if frames is None else np.isin(frame, list(frames))
+
+    # objects in the table but not in the mask - unregister them
+    keep = ~in_scope | (valid & np.isin(key, obj_key))
+    count2 = int(np.sum(in_scope & ~keep))
+
+    # objects in the mask but not registered in the table - register with default value
+    # TODO address situation: user draw mask with label same as another object, how can we detect?
+    rmd = ~np.isin(obj_key, key[keep])
+    count = int(np.sum(rmd))
+    cols = {}
+    for c in table.columns:
+        cols[c] = np.full(count, np.nan)
+    cols['frame'] = obj['frame'].to_numpy()[rmd]
+    cols['continuous_label'] = obj['continuous_label'].to_numpy()[rmd]
+    cols['Center_of_the_object_0'] = obj_ct[rmd, 1]
+    cols['Center_of_the_object_1'] = obj_ct[rmd, 0]
+    cols['parentTrackId'] = np.zeros(count, dtype='int64')
+    cols['trackId'] = np.zeros(count, dtype='int64')      # set to NaN will cause napari error
+    cols['lineageId'] = np.zeros(count, dtype='int64')
+    if phase_col is not None:
+        cols[phase_col] = np.full(count, phase_default, dtype=object)
+    registered = pd.DataFrame(cols)[table.columns]
+
+    # rows of each frame keep their order, newly registered objects follow
+    new = table[keep]
+    new_key = key[keep]
+    new_frame = frame[keep]
+    if count:
+        new = pd.concat([new, registered], ignore_index=True)
+        new_key = np.concatenate([new_key, obj_key[rmd]])
+        new_frame = np.concatenate([new_frame, obj_frame[rmd]])
+    order = np.argsort(new_frame, kind='stable')
+    new = new.iloc[order]
+    new.index = [_ for _ in range(new.shape[0])]
+    new_key = new_key[order]
 
-    count = 0
     count_up = 0
-    nrow = table.shape[0]
-    new = pd.DataFrame()
-    
-    empty_row = table.iloc[0].copy()
-    for i in empty_row.index:
-        empty_row[i] = np.nan
-    empty_row['parentTrackId'] = 0
-    empty_row['trackId'] = 0      # set to NaN will cause napari error
-    empty_row['lineageId'] = 0
-    empty_row[phase_col] = phase_default
-    
-    for i in range(mask.shape[0]):
-        sub = table[table['frame'] == i].copy()
-        sls = mask[i,:,:].copy()
-        lbs = sorted(list(np.unique(sls)))
-        if lbs[0] == 0:
-            del lbs[0]
-        registered = list(sub['continuous_label'])
-
-        # objects in the mask but not registered in the table - register with default value
-        # TODO address situation: user draw mask with label same as another object, how can we detect?
-        rmd = list(set(lbs) - set(registered))
-        if rmd:
-            for j in rmd:
-                tempsls = sls.copy()
-                tempsls[tempsls!=j] = 0
-                ct = 0
-                for p in measure.regionprops(tempsls):
-                    y,x = p.centroid
-                    row = empty_row.copy()
-                    row['frame'] = i
-                    row['continuous_label'] = j
-                    row['Center_of_the_object_0'] = x
-                    row['Center_of_the_object_1'] = y
-                    row = pd.DataFrame(row)
-                    row.columns = [nrow+1]
-                    nrow += 1
-                    sub = pd.concat([sub, row.transpose()], axis=0)
-                    ct += 1
-                assert ct == 1
-                count += 1
-                # sls[sls == j] = 0
-            # mask[i,:,:] = sls
-        
-        # objects in the table but not in the mask - unregister them
-        to_unregister = list(set(registered) - set(lbs))
-        count2 = 0
-        if to_unregister:
-            for j in to_unregister:
-                sub = sub[~sub['continuous_label'].isin(to_unregister)]
-                count2 += 1
-        
-        if align_morph:
-            props = measure.regionprops(mask[i,:,:])
-            for p in props:
-                lb = p.label
-                obj = sub[sub['continuous_label'] == lb]
-                if obj.shape[0]<1:
-                    raise ValueError('Object in the mask not registered in the table!')
-                y,x = p.centroid
-                if np.round(obj['Center_of_the_object_0'].iloc[0],3) == np.round(x,3) and np.round(obj['Center_of_the_object_1'].iloc[0],3) == np.round(y,3):
-                    # The object is unchanged if coordinate matches
-                    continue
-                else:
-                    print('Update object ' + str(lb) + ' at frame ' + str(i))
-                    count_up += 1
-                    # Update morphology
-                    sub.loc[obj.index, 'Center_of_the_object_0'] = x
-                    sub.loc[obj.index, 'Center_of_the_object_1'] = y
-        new = pd.concat([new, sub.copy()])
-        new.index = [_ for _ in range(new.shape[0])]
-    
+    if align_morph:
+        # an object is unchanged if the coordinate of its first row matches
+        measured = np.flatnonzero(np.isin(new_key, obj_key))
+        uniq, first, inv = np.unique(new_key[measured], return_index=True, return_inverse=True)
+        ct = obj_ct[np.searchsorted(obj_key, uniq)]
+        x0 = new['Center_of_the_object_0'].to_numpy(dtype='float')[measured[first]]
+        x1 = new['Center_of_the_object_1'].to_numpy(dtype='float')[measured[first]]
+        changed = (np.round(x0, 3) != np.round(ct[:, 1], 3)) | (np.round(x1, 3) != np.round(ct[:, 0], 3))
+        for k in uniq[changed]:
+            print('Update object ' + str(k % base) + ' at frame ' + str(k // base))
+        count_up = int(np.sum(changed))
+        rows = changed[inv]
+        new.iloc[measured[rows], new.columns.get_loc('Center_of_the_object_0')] = ct[inv[rows], 1]
+        new.iloc[measured[rows], new.columns.get_loc('Center_of_the_object_1')] = ct[inv[rows], 0]
+
+    if bbox:
+        measured = np.flatnonzero(np.isin(new_key, obj_key))
+        new.iloc[measured, [new.columns.get_loc(c) for c in BBOX_COLS]] = \
+            obj_box[np.searchsorted(obj_key, new_key[measured])]
+
     if count:
         print('Registered ' + str(count) + ' objects with spatial information only.')
     if count2:
@@ -141,6 +300,217 @@ def align_table_and_mask(table, mask, align_morph=False, phase_col=None, phase_d
     return mask, new
 
 
+def unaligned_frames(table, mask, n_workers=1):
+    """Frames where the labels of the mask differ from the labels registered in the table.
+
+    These are the frames `align_table_and_mask` (without `align_morph`) would change. Only labels are read,
+    objects are not measured.
+
+    Args:
+        table (pandas.DataFrame): (tracked) object table.
+        mask (numpy.ndarray): labeled object mask.
+        n_workers (int): threads reading frames.
+
+    Returns:
+        (list): frame indices.
+    """
+    n_frame = mask.shape[0]
+    frame = table['frame'].to_numpy(dtype='float')
+    label = table['continuous_label'].to_numpy(dtype='float')
+    valid = (frame >= 0) & (frame < n_frame) & (label > 0)
+    registered = pd.Series(label[valid].astype('int64')).groupby(frame[valid].astype('int64')).unique().to_dict()
+
+    def _differs(f):
+        lbs = pd.unique(np.asarray(mask[f]).ravel())
+        lbs = np.sort(lbs[lbs > 0]).astype('int64')
+        return not np.array_equal(lbs, np.sort(registered.get(f, np.zeros(0, dtype='int64'))))
+
+    if n_workers is None or n_workers < 1:
+        n_workers = os.cpu_count()
+    if n_workers == 1:
+        differs = [_differs(f) for f in range(n_frame)]
+    else:
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            differs = list(executor.map(_differs, range(n_frame)))
+    return [f for f in range(n_frame) if differs[f]]
+
+
+def resolve_lineage(track):
+    """Set `lineageId` of every tracked row to the root of its parent chain, in place.
+
+    The parent of a track is read from its first row. A parent missing from the table ends the chain.
+
+    Args:
+        track (pandas.DataFrame): tracked object table.
+    """
+    first = track.drop_duplicates('trackId')
+    parent = dict(zip(first['trackId'].tolist(), first['parentTrackId'].tolist()))
+    roots = {}
+    for trk in parent:
+        chain = []
+        cur = trk
+        while cur not in roots:
+            chain.append(cur)
+            par = parent[cur]
+            if par == 0 or par not in parent or par in chain:
+                roots[cur] = cur
+                break
+            cur = par
+        for c in chain:
+            roots[c] = roots[cur]
+    rows = (track['trackId'] > 0).to_numpy()
+    track.loc[rows, 'lineageId'] = track.loc[rows, 'trackId'].map(roots).to_numpy()
+    return track
+
+
+def stitch_window(track, rows, particles, start, end, next_id):
+    """Merge tracks linked over a window of frames into a tracked table, keeping track IDs outside the window.
+
+    Objects of frames `start` to `end` are re-assigned from `particles`, linked over the window plus a margin
+    on each side. Linked tracks are stitched to existing tracks through the margins:
+
+        - a linked track continues the track its objects belong to just before the window,
+        - otherwise the track its objects belong to just after the window,
+        - otherwise it gets a new ID.
+
+    When a linked track enters the window as track A and leaves it as track B, the part of B after the window
+    is renamed A (e.g. two tracks swapped within the window are swapped back), with its daughters re-parented.
+    Mother-daughter links outside the window are kept, lineages are resolved again.
+
+    Args:
+        track (pandas.DataFrame): tracked object table, edited in place.
+        rows (array-like): row labels of the objects linked, from `start` - margin to `end` + margin.
+        particles (numpy.ndarray): linked track of each row.
+        start (int): first frame of the window.
+        end (int): last frame of the window.
+        next_id (int): first track ID free for new tracks.
+
+    Returns:
+        (pandas.DataFrame): the table.
+    """
+    rows = np.asarray(rows)
+    frame = track.loc[rows, 'frame'].to_numpy()
+    old = track.loc[rows, 'trackId'].to_numpy()
+    sub = pd.DataFrame({'p': particles, 'f': frame, 'old': old})
+    left = sub[(frame < start) & (old > 0)].sort_values('f')
+    right = sub[(frame > end) & (old > 0)].sort_values('f')
+    enter = left.groupby('p')['old'].last().to_dict()     # track just before the window
+    leave = right.groupby('p')['old'].first().to_dict()   # track just after the window
+
+    all_frame = track['frame'].to_numpy()
+    all_id = track['trackId'].to_numpy()
+    tails = set(pd.unique(all_id[(all_frame > end) & (all_id > 0)]).tolist())
+
+    # tracks after the window renamed to the track they are linked from
+    tail_map = {}
+    used = set()
+    for p, a in enter.items():
+        b = leave.get(p)
+        if b is not None and b != a and b not in tail_map and a not in used:
+            tail_map[b] = a
+            used.add(a)
+    fresh = set()
+    for a in sorted(used):
+        if a in tails and a not in tail_map:
+            # the own tail of a track taken over, and not linked elsewhere
+            tail_map[a] = next_id
+            fresh.add(next_id)
+            next_id += 1
+
+    # track ID of each linked track within the window, first come first served
+    inside = (frame >= start) & (frame <= end)
+    win = sub[inside]
+    taken = {}
+    ids = {}
+    order = sorted(pd.unique(win['p']).tolist(), key=lambda p: (p not in enter, p not in leave, p))
+    for p in order:
+        fs = set(win.loc[win['p'] == p, 'f'].tolist())
+        trk = enter.get(p)
+        if trk is None and p in leave:
+            trk = tail_map.get(leave[p], leave[p])
+        if trk is None or fs & taken.get(trk, set()):
+            trk = next_id
+            fresh.add(next_id)
+            next_id += 1
+        taken.setdefault(trk, set()).update(fs)
+        ids[p] = trk
+    track.loc[rows[inside], 'trackId'] = win['p'].map(ids).to_numpy()
+
+    after = all_frame > end
+    if tail_map:
+        tail = track.loc[after, 'trackId']
+        track.loc[after, 'trackId'] = tail.map(tail_map).fillna(tail).astype(tail.dtype).to_numpy()
+        # daughters born after the window follow their mother's tail
+        born = track.groupby('trackId')['frame'].transform('min').to_numpy() > end
+        par = track['parentTrackId']
+        moved = born & par.isin(list(tail_map.keys())).to_numpy()
+        track.loc[moved, 'parentTrackId'] = par[moved].map(tail_map).to_numpy()
+
+    # parent of each track edited: from its rows before the window, else after it, new tracks have none
+    edited = (set(ids.values()) | set(tail_map.values())) - {0}
+    sel = track['trackId'].isin(edited).to_numpy()
+    in_win = (all_frame >= start) & (all_frame <= end)
+    outside = track[sel & ~in_win].sort_values('frame').drop_duplicates('trackId')
+    parent = dict(zip(outside['trackId'].tolist(), outside['parentTrackId'].tolist()))
+    for trk in fresh:
+        parent[trk] = 0
+    track.loc[sel, 'parentTrackId'] = track.loc[sel, 'trackId'].map(parent).fillna(0).astype('int64').to_numpy()
+    resolve_lineage(track)
+    return track
+
+
+def identity_lut(mask):
+    """Lookup table mapping every label of the mask to itself, as the base of a relabelling.
+
+    For 8 and 16-bit masks the table covers the whole dtype range, otherwise up to the max label.
+    """
+    if mask.dtype.itemsize <= 2:
+        n = np.iinfo(mask.dtype).max + 1
+    else:
+        n = int(np.max(mask)) + 1
+    return np.arange(n, dtype=mask.dtype)
+
+
+def relabel_frames(mask, lut, frames=None, chunk_size=16, on_change=None):
+    """Map labels of mask frames through a lookup table in place, new label = lut[old label].
+
+    Frames are mapped in batches of `chunk_size`, one NumPy call per batch. Only changed pixels are written back,
+    so unchanged frames of a copy-on-write memory-mapped mask are not copied.
+
+    Args:
+        mask (numpy.ndarray or _io.FrameStack): labeled object mask, (t, y, x).
+        lut (numpy.ndarray): lookup table covering all labels of the frames, see `identity_lut`.
+            1D to map all frames the same way, or 2D with one row per frame in `frames`.
+        frames (list): frames to map, default all.
+        chunk_size (int): number of frames mapped in one call.
+        on_change (callable): optional, on_change(frame, idx, old, new) is called before a frame is written,
+            with flat indices of its changed pixels, and their old and new values.
+
+    Returns:
+        (list): frames with changed pixels.
+    """
+    frames = list(range(mask.shape[0]) if frames is None else frames)
+    chunk_size = max(1, chunk_size)
+    changed = []
+    for i in range(0, len(frames), chunk_size):
+        batch = frames[i:i + chunk_size]
+        block = np.asarray(mask[batch])
+        if lut.ndim == 1:
+            new = lut[block]
+        else:
+            new = lut[i:i + len(batch)][np.arange(len(batch))[:, None, None], block]
+        for k, f in enumerate(batch):
+            idx = np.flatnonzero(block[k] != new[k])
+            if idx.size == 0:
+                continue
+            vals = new[k].flat[idx]
+            if on_change is not None:
+                on_change(f, idx, block[k].flat[idx], vals)
+            writable(mask, (f,)).flat[idx] = vals
+            changed.append(f)
+    return changed
+
+
 def expand_bbox(bbox, factor, limit):
     """Expand bounding box by factor times.
 
@@ -179,20 +549,3 @@ def expand_bbox(bbox, factor, limit):
         new_bbox[3] = limit[1] - 1
 
     return tuple(new_bbox)
-
-
-def find_daugs(track, track_id):
-    """Return list of daughters according to certain parent track ID.
-
-    Args:
-        track (pandas.DataFrame): tracked object table.
-        track_id (int): track ID.
-    """
-    rt = list(np.unique(track.loc[track['parentTrackId'] == track_id, 'trackId']))
-    if not rt:
-        return []
-    else:
-        to_rt = rt.copy()
-        for trk in rt:
-            to_rt.extend(find_daugs(track, trk))
-        return to_rt
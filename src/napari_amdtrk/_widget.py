@@ -5,58 +5,109 @@ It implements the Widget specification.
 see: https://napari.org/stable/plugins/guides.html?#widgets
 """
 from typing import TYPE_CHECKING
+import threading
 import warnings
 from magicgui import magicgui
-from magicgui.widgets import RadioButtons, Container
+from magicgui.widgets import RadioButtons, Container, ProgressBar, PushButton, Label
+from napari.qt.threading import create_worker
+from qtpy.QtCore import QObject, Signal
 from qtpy.QtWidgets import QWidget
-from ._utils import get_current_time, find_daugs, align_table_and_mask, get_annotation
+from ._engine import AmdTrkEngine
+from ._linking import LINKERS
 import numpy as np
-import skimage.io as io
-import skimage.measure as measure
 import skimage.morphology as morph
-import pandas as pd
-import trackpy
 
 if TYPE_CHECKING:
     import napari
 warnings.filterwarnings("ignore", category=DeprecationWarning) 
 
-class AmdTrkWidget(QWidget):
+
+def painted_frames(history, current):
+    """Frames changed by a napari Labels paint event.
+
+    Args:
+        history (list): history atoms of the paint event, either (indices, old values, new values)
+            tuples or atoms with a `slice_key` bounding box.
+        current (int): frame on display, used when an atom can not be read.
+    """
+    frames = set()
+    for atom in history:
+        if hasattr(atom, 'slice_key') and isinstance(atom.slice_key[0], slice) and atom.slice_key[0].stop:
+            sl = atom.slice_key[0]
+            frames.update(range(sl.start or 0, sl.stop))
+        elif isinstance(atom, tuple) and len(atom[0]):
+            frames.update(np.unique(atom[0][0]).tolist())
+        else:
+            frames.add(current)
+    return frames
+
+
+class JobCancelled(Exception):
+    """Raised in a background job when its Cancel button was pressed."""
+
+
+class _JobSignals(QObject):
+    # (frames measured, total frames), emitted from the worker thread and received in the GUI thread
+    progress = Signal(int, int)
+
+
+class AmdTrkWidget(AmdTrkEngine, QWidget):
     # your QWidget.__init__ can optionally request the napari viewer instance
     # in one of two ways:
     # 1. use a parameter called `napari_viewer`, as done here
     # 2. use a type annotation of 'napari.viewer.Viewer' for any parameter
     def __init__(self, viewer : 'napari.viewer.Viewer'):
 
-        super().__init__()
+        QWidget.__init__(self)
         self.viewer = viewer
         # meta: {'frame_base': int, 'stateCol': int, 'stateColName': str, 'track_path': str, 'mask_path': str}
         meta = self.viewer.layers['segm'].metadata
-        self.frame_base = meta['frame_base']
-        self.stateCol = meta['stateCol']
-        self.stateColName = meta['stateColName']
-        self.track_path = meta['track_path']
-        self.mask_path = meta['mask_path']
+        AmdTrkEngine.__init__(self, self.viewer.layers['segm'].data, self.viewer.layers['tracks'].metadata['ori_data'], meta)
         phaseVis = meta['phaseVis']
         states = meta['states']
-        self.hasState = meta['hasState']
-        self.states = meta['states']
-
-        self.track = self.viewer.layers['tracks'].metadata['ori_data']
-        self.saved = self.track.copy()
-        self.mask = self.viewer.layers['segm'].data.copy()
-        self.track_count = int(np.max(self.track['trackId']))
-        self.DILATE_FACTOR = int((self.viewer.layers['segm'].data.shape[1] + 
-                                  self.viewer.layers['segm'].data.shape[2]) / 2 / 240)
+        self.DILATE_FACTOR = int((self.mask.shape[1] + self.mask.shape[2]) / 2 / 240)
 
-        self.high = 255 if np.max(self.viewer.layers['segm'].data) < 255 else 65536
+        self.high = 255 if self.mask.dtype.itemsize == 1 else 65536  # from the dtype, the mask may not be in memory
         self.select = {}  # register selected obj (key: frame-label, value: (bbox, id in sel list, frame, label on mask))
-        self.last_reg_id = 0
-        self.label_unassigned = -1
+        self.layer_cache = None  # layer data per table row since last refresh, see `refresh`
+        self.layer_pos = None  # position of each row label in `layer_cache`, -1 if not there
+        self.layer_tracks = None  # track ID -> row labels in `layer_cache`
+        self.name_window = meta.get('name_window')  # frames labeled around the one on display, None for all
+        self.name_index = None  # (row order by frame, sorted frames) of `layer_cache`, to slice the name window
+        self.name_shown = None  # frame range in the name layer
+        self.job = None  # running background job: (name, cancel event), edits are locked meanwhile
+        self.job_signals = _JobSignals()
+        self.job_signals.progress.connect(self._job_progress)
 
 
         #================== Widget definitions =======================
 
+        @magicgui(labels=False,
+                auto_call=True,
+                result_widget=True,
+                ud={
+                    "widget_type": "PushButton",
+                    "text": "Undo",
+                })
+        def undo(ud):
+            self.clear_selection()
+            msg = self.undo()
+            self.refresh()
+            return msg
+
+        @magicgui(labels=False,
+                auto_call=True,
+                result_widget=True,
+                rd={
+                    "widget_type": "PushButton",
+                    "text": "Redo",
+                })
+        def redo(rd):
+            self.clear_selection()
+            msg = self.redo()
+            self.refresh()
+            return msg
+
         @magicgui(labels=False,
           auto_call=True,
           result_widget=True,
@@ -79,17 +130,20 @@ class AmdTrkWidget(QWidget):
                 })
         def save(sv):
             self.clear_selection()
-            msg = self.save()
-            self.refresh()
-            return msg
+            return self.run_job('Saving', self.save_job(), self.save_done)
         
-        @magicgui(labels=True, result_widget=True)
-        def retrack(distance: int, frame_gap: int):
+        @magicgui(labels=True,
+                result_widget=True,
+                linker={
+                    'widget_type': 'ComboBox',
+                    'choices': list(LINKERS)
+                })
+        def retrack(distance: int, frame_gap: int, whole_movie: bool=True, frame_start: int=0, frame_end: int=0,
+                    linker=self.linker, divisions: bool=False):
             self.clear_selection()
-            msg = self.retrack(distance=distance, frame_gap=frame_gap)
-            self.refresh()
-            print('refreshed')
-            return msg
+            window = {} if whole_movie else {'frame_start': frame_start, 'frame_end': frame_end}
+            job = self.retrack_job(distance=distance, frame_gap=frame_gap, linker=linker, divisions=divisions, **window)
+            return self.run_job('Re-tracking', job, lambda trk: self.retrack_done(trk, job.aligned))
 
         @magicgui(labels=True, result_widget=True)
         def create_or_replace(track_A: int, track_B: int=0, frame: int=0):
@@ -192,7 +246,7 @@ class AmdTrkWidget(QWidget):
                                     (" Unlink mother - daughter", 4), (" Register object", 5),
                                     (" Swap track A with B", 6), (" Keep selected tracks", 7),
                                     (" Copy an object to another frame",8),
-                                    (" Commit mask and re-track (TrackPy)", 9)]
+                                    (" Commit mask and re-track", 9)]
         if phaseVis:
             btnChoice.append((" Edit state", 10))
         btns = RadioButtons(name='',
@@ -229,12 +283,24 @@ class AmdTrkWidget(QWidget):
                                 labels=False)
 
         container_opt.margins = (0, 0, 0, 0)
-        container_but = Container(widgets=[revert, save],
+        container_but = Container(widgets=[undo, redo, revert, save],
                                 layout='horizontal',
                                 labels=False)
         container_but.margins = (0, 0, 0, 0)
-        container_ext = Container(widgets=[container_opt, container_but],
+        # progress of background jobs (save, retrack)
+        job_bar = ProgressBar(value=0, min=0, max=1, visible=False)
+        job_msg = Label(value='')
+        job_cancel = PushButton(text='Cancel', visible=False)
+        job_cancel.changed.connect(lambda: self.cancel_job())
+        container_job = Container(widgets=[job_bar, job_cancel], layout='horizontal', labels=False)
+        container_job.margins = (0, 0, 0, 0)
+        container_ext = Container(widgets=[container_opt, container_but, container_job, job_msg],
                                 layout='vertical')
+        self.job_widgets = {'bar': job_bar, 'msg': job_msg, 'cancel': job_cancel,
+                            'locked': [container_opt, undo, redo, revert, save]}
+        # forms by name, to drive the widget without the viewer (e.g. in tests)
+        self.forms = {'undo': undo, 'redo': redo, 'revert': revert, 'save': save, 'retrack': retrack,
+                      'delete': delete, 'swap': swap}
         container_ext.margins = (5, 5, 5, 5)
         # container.show(run=True)
 
@@ -252,12 +318,24 @@ class AmdTrkWidget(QWidget):
             register_obj.update({'object_ID':0, 'frame':0, 'track':0, 'state': self.states[0]})
             keep_tracks.update({'IDs':''})
             copy_obj.update({'ID':0, 'fromFrame':0, 'toFrame':1})
-            retrack.update({'distance':0, 'frame_gap':0})
+            retrack.update({'distance':0, 'frame_gap':0, 'whole_movie':True, 'frame_start':0, 'frame_end':0})
         self.reset_widget = reset_widget
 
         self.viewer.add_shapes(name='[selection]', edge_width=2*self.DILATE_FACTOR, edge_color='coral', face_color=[0,0,0,0], ndim=3)
         
         labels = self.viewer.layers['segm']
+
+        @labels.events.paint.connect
+        def _on_paint(event):
+            with self.journal.action('paint'):
+                for atom in event.value:
+                    if hasattr(atom, 'slice_key'):
+                        idx = None if atom.mask is None else np.flatnonzero(atom.mask)
+                        self.journal.log_pixels(atom.slice_key, idx, atom.old_values, atom.new_value)
+                    elif isinstance(atom, tuple):
+                        self.journal.log_points(*atom)
+            self.mark_dirty(painted_frames(event.value, self.viewer.dims.current_step[0]))
+
         #sels = self.viewer.layers['[selection]']
         #trkly = self.viewer.layers['tracks']
         #namely = self.viewer.layers['name']
@@ -275,24 +353,21 @@ class AmdTrkWidget(QWidget):
                 pos = event.position
                 # label position, only work for txy (t+2D) data!
                 pos = np.round(pos).astype('int')
-                sle = layer.data[pos[0], :, :].copy()
-                try:
-                    _ = sle[pos[1], pos[2]]
-                except: # if outside the image region
+                if len(pos) != 3 or np.any(pos < 0) or np.any(pos >= layer.data.shape):
+                    # if outside the image region
                     return
-                if sle[pos[1], pos[2]] != 0:
-                    lbl = sle[pos[1], pos[2]]
-                    trk_id = self.track[(self.track['frame'] == pos[0]) & (self.track['continuous_label'] == lbl)]
-                    if trk_id.shape[0]:
-                        trk_id = trk_id['trackId'].iloc[0]
+                lbl = layer.data[pos[0], pos[1], pos[2]]
+                if lbl != 0:
+                    row = self.store.row_at(pos[0], lbl)
+                    if row is not None:
+                        trk_id = self.store.at[row, 'trackId']
                     else:
                         trk_id = self.last_reg_id
                     if not self.hasState:
                         state = '0'
                     else:
-                        state = self.track[(self.track['frame'] == pos[0]) & (self.track['continuous_label'] == lbl)]
-                        if state.shape[0]:
-                            state = state[self.stateColName].iloc[0]
+                        if row is not None:
+                            state = self.store.at[row, self.stateColName]
                         else:
                             state = self.states[0]
                     ky = str(pos[0]) + '-' + str(lbl)
@@ -319,8 +394,7 @@ class AmdTrkWidget(QWidget):
                         copy_obj.update({'ID':lbl, 'fromFrame':pos[0], 'toFrame': pos[0] + 1})
 
                         # find the bounding box
-                        msk = sle == lbl
-                        minx, miny, maxx, maxy = measure.regionprops(measure.label(msk))[0].bbox
+                        minx, miny, maxx, maxy = self.get_bbox(pos[0], lbl, pos[1:])
                         objBox = np.array([[pos[0], minx, miny], [pos[0], maxx, miny],
                                            [pos[0], maxx, maxy], [pos[0], minx, maxy]])
                         idx = len(viewer.layers['[selection]'].data)
@@ -383,6 +457,8 @@ class AmdTrkWidget(QWidget):
         def _resolve_key(self):
             # run widget from keyboard
             nonlocal btns, widget_map
+            if self.job is not None:
+                return
             wig = widget_map[btns.value]
             wig()
             return
@@ -412,27 +488,32 @@ class AmdTrkWidget(QWidget):
         def _run_dilate_sel(mode='dilate'):
             nonlocal self
             sel = list(self.select.keys())
-            if len(sel) == 0:
+            if len(sel) == 0 or self.job is not None:
                 return
             else:
                 mask = self.viewer.layers['segm'].data
                 bbox, _, fid, lbl = self.select[sel[0]]
-                frame = mask[fid,:,:].copy()
-                frame_copy = frame.copy()
-                frame[frame!=lbl] = 0
-                frame[frame==lbl] = 1
                 to_dilate = int(np.max([bbox[2,1] - bbox[0,1], bbox[2,2] - bbox[2,1]]) / 80) # What's good scaling here???
+                if mode not in ('dilate', 'erode'):
+                    return
+                box = self.get_bbox(fid, lbl)
+                if box is None:
+                    return
+                # morphology only reaches `to_dilate` pixels around the object
+                pad = to_dilate + 1
+                box = (max(box[0] - pad, 0), max(box[1] - pad, 0),
+                       min(box[2] + pad, mask.shape[1]), min(box[3] + pad, mask.shape[2]))
+                crop = np.array(mask[fid, box[0]:box[2], box[1]:box[3]])
+                obj = crop == lbl
                 if mode == 'dilate':
-                    dilated = morph.binary_dilation(frame, footprint=morph.disk(radius=to_dilate))
-                elif mode == 'erode':
-                    dilated = morph.binary_erosion(frame, footprint=morph.disk(radius=to_dilate))
+                    dilated = morph.binary_dilation(obj, footprint=morph.disk(radius=to_dilate))
                 else:
-                    return
-                if mode == 'erode':
-                    frame_copy[frame_copy==lbl] = 0
-                frame_copy[dilated] = lbl
-                mask[fid,:,:] = frame_copy
-                self.viewer.layers['segm'].data = mask
+                    dilated = morph.binary_erosion(obj, footprint=morph.disk(radius=to_dilate))
+                    crop[obj] = 0
+                crop[dilated] = lbl
+                with self.journal.action(mode):
+                    self.set_mask(fid, crop, box)
+                self.refresh_mask()
                 #self.refresh()
             return
     
@@ -448,6 +529,9 @@ class AmdTrkWidget(QWidget):
             _run_dilate_sel(mode='erode')
             return
 
+        if self.name_window is not None:
+            self.viewer.dims.events.current_step.connect(lambda event: self.show_names())
+
         # Update the layer dropdown menu when the layer list changes
         self.viewer.layers.events.changed.connect(container_ext.reset_choices)
         # Add plugin to the napari viewer
@@ -456,587 +540,227 @@ class AmdTrkWidget(QWidget):
         self.viewer.window.add_dock_widget(container_ext, area='left')
         return
 
-    def clear_selection(self):
-        if len(self.select.keys()) > 0:
-            self.select = {}
-            self.viewer.layers['[selection]'].data = []
-            self.reset_widget()
-        return
-    
-    def check_assign(self, IDs_to_check):
-        for i in IDs_to_check:
-            if i == 0:
-                raise ValueError('Must first assign track ID to the object!')
-        return
+    @property
+    def mask(self):
+        """Labeled object mask, the data of the `segm` layer."""
+        return self.viewer.layers['segm'].data
 
-    #================== Widget functions =======================
+    def run_job(self, name, job, done):
+        """Run a job in a worker thread, with progress and cancellation, and apply its result when it returns.
 
-    def create_or_replace(self, old_id, frame, new_id=None):
-        """Create a new track ID or replace with some track ID
-        after certain frame. If the old track has daughters, new track ID will be the parent.
+        Edits are locked while the job runs, navigation is not. Results are applied in the GUI thread,
+        all at once, so the widget state never reflects a partial job.
 
         Args:
-            old_id (int): old track ID.
-            frame (int): frame to begin with new ID.
-            new_id (int): new track ID, only required when replacing track identity.
+            name (str): job name, shown while it runs.
+            job (callable): job(progress) run in the worker thread, see `save_job` and `retrack_job`.
+            done (callable): done(result) applies the result and returns a message.
         """
-        if old_id not in self.track['trackId'].values:
-            raise ValueError('Selected track is not in the table.')
-        if frame not in list(self.track[self.track['trackId'] == old_id]['frame']):
-            raise ValueError('Selected frame is not in the original track.')
-        relabel = False
-        if new_id not in self.track['trackId'].values:
-            # raise ValueError('Selected new ID not in the table.')
-            relabel = True
-
-        dir_daugs = list(np.unique(self.track.loc[self.track['parentTrackId'] == old_id, 'trackId']))
-        for dd in dir_daugs:
-            self.del_parent(dd)
-
-        if new_id is None:
-            self.track_count += 1
-            new = self.track_count
-            new_lin = new
-            new_par = 0
-        else:
-            new = new_id
-            if relabel:
-                new_lin = self.track[self.track['trackId'] == old_id]['lineageId'].values[0]
-                if new_lin == old_id: # if this track is a root track, or is not involved in mitosis
-                    new_lin = new
-                new_par = self.track[self.track['trackId'] == old_id]['parentTrackId'].values[0]
-            else:
-                old_frame = list(self.track[self.track['trackId'] == new_id]['frame'])
-                new_frame = list(self.track.loc[(self.track['trackId'] == old_id) &
-                                                (self.track['frame'] >= frame), 'frame'])
-                if len(old_frame + new_frame) != len(set(old_frame + new_frame)):
-                    raise ValueError('Selected new ID track overlaps with old one.')
-                new_lin = self.track[self.track['trackId'] == new_id]['lineageId'].values[0]
-                new_par = self.track[self.track['trackId'] == new_id]['parentTrackId'].values[0]
-        
-        self.track.loc[(self.track['trackId'] == old_id) & (self.track['frame'] >= frame), 'trackId'] = new
-        self.track.loc[self.track['trackId'] == new, 'lineageId'] = new_lin
-        self.track.loc[self.track['trackId'] == new, 'parentTrackId'] = new_par
-        
-        # daughters of the new track, change lineage
-        if not relabel:
-            daugs = find_daugs(self.track, new)
-            if daugs:
-                self.track.loc[self.track['trackId'].isin(daugs), 'lineageId'] = new_lin
-        for dd in dir_daugs:
-            if dd != new:
-                self.create_parent(new, dd)
-        
-        msg = 'Track ' + str(old_id) + ' from frame ' + str(frame + self.frame_base) + \
-              ' <- Track ' + str(new) + '.'
-        print(msg)
-        return msg
+        if self.job is not None:
+            raise ValueError(self.job[0] + ' in progress, wait or cancel it first.')
+        cancel = threading.Event()
 
-    def swap(self, track_A, frame, track_B):
-        """Swap track A with track B after certain frame. If the old track has daughters, new track ID will be the parent.
+        def _progress(count, total):
+            if cancel.is_set():
+                raise JobCancelled()
+            self.job_signals.progress.emit(count, total)
 
-        Args:
-            track_A (int): track ID A.
-            frame (int): frame to begin with new ID.
-            track_B (int): track ID B.
-        """
-        if track_A not in self.track['trackId'].values:
-            raise ValueError('Selected track is not in the table.')
-        if track_B not in self.track['trackId'].values:
-            raise ValueError('Selected track is not in the table.')
-        if frame not in list(self.track[self.track['trackId'] == track_A]['frame']):
-            raise ValueError('Selected frame is not in the original track.')
-
-        dir_daugs_A = list(np.unique(self.track.loc[self.track['parentTrackId'] == track_A, 'trackId']))
-        for dd in dir_daugs_A:
-            self.del_parent(dd)
-        dir_daugs_B = list(np.unique(self.track.loc[self.track['parentTrackId'] == track_B, 'trackId']))
-        for dd in dir_daugs_B:
-            self.del_parent(dd)
-
-        self.track['trackId'] = self.track['trackId'].astype('str')
-        track_A, track_B = str(track_A), str(track_B)
-        new_A = track_B + '-' + track_A
-        new_B = track_A + '-' + track_B
-        new_A_lin = self.track[self.track['trackId'] == track_B]['lineageId'].values[0]
-        new_A_par = self.track[self.track['trackId'] == track_B]['parentTrackId'].values[0]
-        new_B_lin = self.track[self.track['trackId'] == track_A]['lineageId'].values[0]
-        new_B_par = self.track[self.track['trackId'] == track_A]['parentTrackId'].values[0]
-        
-        self.track.loc[(self.track['trackId'] == track_A) & (self.track['frame'] >= frame), 'trackId'] = new_A
-        self.track.loc[self.track['trackId'] == new_A, 'lineageId'] = new_A_lin
-        self.track.loc[self.track['trackId'] == new_A, 'parentTrackId'] = new_A_par
-        self.track.loc[(self.track['trackId'] == track_B) & (self.track['frame'] >= frame), 'trackId'] = new_B
-        self.track.loc[self.track['trackId'] == new_B, 'lineageId'] = new_B_lin
-        self.track.loc[self.track['trackId'] == new_B, 'parentTrackId'] = new_B_par
-
-        self.track.loc[(self.track['trackId'] == new_A) & (self.track['frame'] >= frame), 'trackId'] = track_B
-        self.track.loc[(self.track['trackId'] == new_B) & (self.track['frame'] >= frame), 'trackId'] = track_A
-        
-        self.track['trackId'] = self.track['trackId'].astype('int')
-        track_A, track_B = int(track_A), int(track_B)
-        # daughters of the new track, change lineage
-        daugs = find_daugs(self.track, track_B)
-        if daugs:
-            self.track.loc[self.track['trackId'].isin(daugs), 'lineageId'] = new_A_lin
-        for dd in dir_daugs_A:
-            if dd != track_B:
-                self.create_parent(track_B, dd)
-        daugs = find_daugs(self.track, track_A)
-        if daugs:
-            self.track.loc[self.track['trackId'].isin(daugs), 'lineageId'] = new_B_lin
-        for dd in dir_daugs_B:
-            if dd != track_A:
-                self.create_parent(track_A, dd)
-        
-        msg = 'Track ' + str(track_A) + ' from frame ' + str(frame + self.frame_base) + \
-              ' <- swapped with Track ' + str(track_B) + '.'
-        print(msg)
-        return msg
+        def _returned(result):
+            self._show_job(done(result))
+            self.refresh()
 
-    def create_parent(self, par, daug):
-        """Create parent-daughter relationship.
+        def _errored(err):
+            self._show_job('Cancelled.' if isinstance(err, JobCancelled) else name + ' failed: ' + str(err))
+
+        self.job = (name, cancel)
+        self._lock(True)
+        self._show_job(name + '...')
+        worker = create_worker(job, progress=_progress, _ignore_errors=True)
+        worker.returned.connect(_returned)
+        worker.errored.connect(_errored)
+        worker.finished.connect(lambda: self._lock(False))
+        worker.start()
+        return name + '...'
+
+    def cancel_job(self):
+        """Ask the running job to stop, at its next progress report."""
+        if self.job is not None:
+            self.job[1].set()
+            self._show_job('Cancelling ' + self.job[0].lower() + '...')
+        return
 
-        Args:
-            par (int): parent track ID.
-            daug (int): daughter track ID.
-        """
-        if par not in self.track['trackId'].values:
-            raise ValueError('Selected parent is not in the table.')
-        if daug not in self.track['trackId'].values:
-            raise ValueError('Selected daughter is not in the table.')
-
-        ori_par = self.track[self.track['trackId'] == daug]['parentTrackId'].iloc[0]
-        if ori_par != 0:
-            raise ValueError('One daughter cannot have more than one parent, disassociate ' + str(ori_par) + '-'
-                             + str(daug) + ' first.')
-
-        par_lin = self.track[self.track['trackId'] == par]['lineageId'].iloc[0]
-        # daughter itself
-        self.track.loc[self.track['trackId'] == daug, 'lineageId'] = par_lin
-        self.track.loc[self.track['trackId'] == daug, 'parentTrackId'] = par
-        # daughter of the daughter
-        daugs_of_daug = find_daugs(self.track, daug)
-        if daugs_of_daug:
-            self.track.loc[self.track['trackId'].isin(daugs_of_daug), 'lineageId'] = par_lin
-
-        msg =  'Track ' + str(par) + ' linked with ' + str(daug) + '.'
-        print(msg)
-        return msg
+    def _lock(self, locked):
+        """Lock edits (widgets and painting) while a job runs."""
+        for w in self.job_widgets['locked']:
+            w.enabled = not locked
+        self.viewer.layers['segm'].editable = not locked
+        self.job_widgets['bar'].visible = locked
+        self.job_widgets['cancel'].visible = locked
+        if not locked:
+            self.job = None
+        return
 
-    def del_parent(self, daug):
-        """Remove parent-daughter relationship, for a daughter.
+    def _job_progress(self, count, total):
+        bar = self.job_widgets['bar']
+        bar.max = max(total, 1)
+        bar.value = count
+        return
 
-        Args:
-            daug (int): daughter track ID.
-        """
-        if daug not in self.track['trackId'].values:
-            raise ValueError('Selected daughter is not in the table.')
-        if self.track[self.track['trackId'] == daug]['parentTrackId'].iloc[0] == 0:
-            raise ValueError('Selected daughter does not have a parent.')
-
-        # daughter itself
-        self.track.loc[self.track['trackId'] == daug, 'lineageId'] = daug
-        self.track.loc[self.track['trackId'] == daug, 'parentTrackId'] = 0
-        # daughters of the daughter, change lineage
-        daugs = find_daugs(self.track, daug)
-        if daugs:
-            self.track.loc[self.track['trackId'].isin(daugs), 'lineageId'] = daug
-
-        msg = 'Track ' + str(daug) + ' unlinked from its mother.'
+    def _show_job(self, msg):
+        self.job_widgets['msg'].value = msg
         print(msg)
-        return msg
+        return
+
+    def clear_selection(self):
+        if len(self.select.keys()) > 0:
+            self.select = {}
+            self.viewer.layers['[selection]'].data = []
+            self.reset_widget()
+        return
+    
+    def check_assign(self, IDs_to_check):
+        for i in IDs_to_check:
+            if i == 0:
+                raise ValueError('Must first assign track ID to the object!')
+        return
 
-    def correct_cls(self, trk_id, frame, cls, mode='to_next', end_frame=None):
-        """Correct state classification.
+    def refresh_mask(self):
+        """Redraw the mask layer after in-place edits, without replacing its data.
 
-        Args:
-            trk_id (int): track ID to correct.
-            frame (int): frame to correct or begin with correction.
-            cls (str): new state classification ID to assign.
-            mode (str): either 'to_next', 'single', or 'range'
-            end_frame (int): optional, in 'range' mode, stop correction at this frame.
+        Assigning `layer.data` resets the layer and redraws the whole stack, refreshing only re-slices
+        the frame on display.
         """
-        if trk_id not in self.track['trackId'].values:
-            raise ValueError('Selected track is not in the table.')
-        if cls not in self.states:
-            raise ValueError('Input state ID not registered.')
-
-        clss = list(self.track[self.track['trackId'] == trk_id][self.stateColName])
-        frames = list(self.track[self.track['trackId'] == trk_id]['frame'])
-        if frame not in frames:
-            raise ValueError('Selected frame is not in the original track.')
-        fm_id = frames.index(frame)
-        idx = self.track[self.track['trackId'] == trk_id].index
-        if mode == 'single':
-            rg = [fm_id]
-        elif mode == 'range':
-            if end_frame not in frames:
-                raise ValueError('Selected end frame is not in the original track.')
-            rg = [i for i in range(fm_id, frames.index(end_frame + 1))]
-        elif mode == 'to_next':
-            cur_cls = clss[fm_id]
-            j = fm_id + 1
-            while j < len(clss):
-                if clss[j] == cur_cls:
-                    j += 1
-                else:
-                    break
-            rg = [i for i in range(fm_id, j)]
-        else:
-            raise ValueError('Mode can only be single, to_next or range, not ' + mode)
+        self.viewer.layers['segm'].refresh()
+        return
 
-        for r in rg:
-            self.track.loc[idx[r], self.stateColName] = cls
-        msg = 'Track ' + str(trk_id) + ' state <- ' + str(cls) + ' from ' + \
-              str(frames[rg[0]] + self.frame_base) + ' to ' + str(frames[rg[-1]] + self.frame_base) + '.'
-        print(msg)
-        return msg
 
-    def delete_track(self, trk_id, frame=None):
-        """Delete entire track. If frame supplied, only delete object at specified frame.
+    def refresh(self):
+        """Annotate edited tracks and push the table to the `tracks` and `name` layers.
 
-        Args:
-            trk_id (int): track ID.
-            frame (int): time frame.
+        Layer data is cached per table row (see `_layer_rows`). After edits, only rows of touched tracks are
+        compared with the cache: rows of the tracks before and after the edits, found by track ID in
+        `self.layer_tracks` and by row label in `self.layer_pos`. Rows still in the tracks are updated in
+        place, dropped rows are replaced by the last ones of the cache, and added rows appended. The `tracks`
+        layer is only set again if tracks or positions changed, napari then takes the whole array.
         """
-        del_unreg_sel = False
-        if trk_id not in self.track['trackId'].values:
-            if trk_id == 0:
-                del_unreg_sel = True
-            else:
-                raise ValueError('Selected track is not in the table.')
-
-        mask = self.viewer.layers['segm'].data
-        if not del_unreg_sel:
-            del_trk = self.track[self.track['trackId'] == trk_id]
-        if frame is None and not del_unreg_sel:
-
-            if trk_id != 0:
-                # For all direct daughter of the track to delete, first remove association
-                dir_daugs = list(np.unique(self.track.loc[self.track['parentTrackId'] == trk_id, 'trackId']))
-                for dd in dir_daugs:
-                    self.del_parent(dd)
-            else:
-                warnings.warn('Deleting all unassigned objects in all frames')
-
-            # Delete entire track
-            for i in range(del_trk.shape[0]):
-                fme = del_trk['frame'].iloc[i]
-                lb = del_trk['continuous_label'].iloc[i]
-                msk_slice = mask[fme, :, :]
-                msk_slice[msk_slice == lb] = 0
-                mask[fme, :, :] = msk_slice
-            self.track = self.track.drop(index=del_trk.index)
-            msg = 'Deleted track ' + str(trk_id) + '.'
+        touched = self.touched
+        self.getAnn(touched)
+        self.touched = set()
+        tracks = True
+        if touched is None or self.layer_cache is None:
+            self._cache_layers()
         else:
-            if trk_id != 0:
-                del_trk = del_trk[del_trk['frame'] == frame]
-                lb = del_trk['continuous_label'].iloc[0]
-            else:
-                lb = self.label_unassigned
-            msk_slice = mask[frame, :, :]
-            msk_slice[msk_slice == lb] = 0
-            mask[frame, :, :] = msk_slice
-            if trk_id != 0:
-                self.track = self.track.drop(index=self.track[(self.track['trackId'] == trk_id) &
-                                                              (self.track['frame'] == frame)].index)
-                msg = 'Deleted track ' + str(trk_id) + ' at frame ' + str(frame) + '.'
-            elif not del_unreg_sel:
-                self.track = self.track.drop(index=self.track[(self.track['trackId'] == trk_id) &
-                                                              (self.track['frame'] == frame) &
-                                                              (self.track['continuous_label'] == lb)].index)
-                msg = 'Deleted unassigned object ' + str(lb) + ' at frame ' + str(frame) + '.'
-            else:
-                msg = 'Deleted an unregistered object.'
-        self.viewer.layers['segm'].data = mask
-        print(msg)
-        return msg
+            cache, pos = self.layer_cache, self.layer_pos
+            none = cache['rows'][:0]
+            old = np.concatenate([self.layer_tracks.get(i, none) for i in touched] + [none])
+            upd = np.concatenate([self.store.rows(i) for i in touched] + [none])
+            gone = old[~np.isin(old, upd)]
+            if upd.size and upd.max() >= pos.size:
+                pos = np.concatenate([pos, np.full(max(upd.max() + 1 - pos.size, pos.size // 2), -1)])
+            at = pos[upd]
+            stale, added = at[at >= 0], upd[at < 0]
+            fresh = self._layer_rows(cache['rows'][stale])
+            # objects only renamed (e.g. state edits) leave the tracks layer as it is
+            tracks = gone.size > 0 or added.size > 0 or not (
+                np.array_equal(cache['trackId'][stale], fresh['trackId'])
+                and np.array_equal(cache['points'][stale], fresh['points'], equal_nan=True))
+            if not tracks and np.array_equal(cache['name'][stale], fresh['name']):
+                self.clear_selection()
+                return
+            for k in ('trackId', 'points', 'name'):
+                cache[k][stale] = fresh[k]
+            if gone.size:
+                # holes are filled with the last rows, the tracks layer sorts its data itself
+                holes = np.sort(pos[gone])
+                n = cache['rows'].size - holes.size
+                tail = np.setdiff1d(np.arange(n, cache['rows'].size), holes)
+                holes = holes[holes < n]
+                for k in cache:
+                    cache[k][holes] = cache[k][tail]
+                cache = {k: v[:n] for k, v in cache.items()}
+                pos[gone] = -1
+                pos[cache['rows'][holes]] = holes
+            if added.size:
+                pos[added] = np.arange(cache['rows'].size, cache['rows'].size + added.size)
+                added = self._layer_rows(added)
+                cache = {k: np.concatenate([cache[k], added[k]]) for k in cache}
+            for i in touched:
+                rows = self.store.rows(i)
+                if rows.size:
+                    self.layer_tracks[i] = rows
+                else:
+                    self.layer_tracks.pop(i, None)
+            self.layer_cache, self.layer_pos = cache, pos
+        self._push_layers(tracks)
+        self.clear_selection()
+        return
 
-    def run_keep_tracks(self, trk_ids):
-        """Only keep tracks specified in the input list.
+    def _cache_layers(self):
+        """Build `self.layer_cache` from the whole table, with its lookups by row label and track ID.
         """
-        mask = self.viewer.layers['segm'].data
-
-        for trk_id in trk_ids:
-            if trk_id in self.track['trackId']:  # no warning if input track is not in the dataset.
-                # For all direct daughters of the track to keep, if not in input list, dissociate.
-                dir_daugs = list(np.unique(self.track.loc[self.track['parentTrackId'] == trk_id, 'trackId']))
-                for dd in dir_daugs:
-                    if dd not in trk_ids:
-                        self.del_parent(dd)
-                # For parent, if not in input list, dissociate
-                par = list(self.track.loc[self.track['trackId'] == trk_id, 'parentTrackId'])[0]
-                if par != 0 and par not in trk_ids:
-                    self.del_parent(trk_id)
-        
-        self.track = self.track[self.track['trackId'].isin(trk_ids)]
-        for frame in range(mask.shape[0]):
-            lb = list(self.track[self.track['frame'] == frame]['continuous_label'])
-            msk_slice = mask[frame, :, :]
-            new_mask = np.zeros(shape=msk_slice.shape, dtype=mask.dtype)
-            for l in lb:
-                new_mask[msk_slice == l] = l
-            mask[frame, :, :] = new_mask
-    
-        self.viewer.layers['segm'].data = mask
-
-        msg = 'Tracks kept: ' + ','.join(list(map(lambda x:str(x), trk_ids))) + '.'
-        print(msg)
-        return msg
+        cache = self._layer_rows(self.track.index.to_numpy())
+        rows = cache['rows']
+        pos = np.full(int(rows.max()) + 1 if rows.size else 0, -1)
+        pos[rows] = np.arange(rows.size)
+        self.layer_cache, self.layer_pos = cache, pos
+        # row arrays of the store are replaced, not changed in place, on edits
+        self.layer_tracks = {i: self.store.rows(i) for i in self.store.track_ids()}
+        return
 
-    def save(self, mask_flag=True):
-        """Save current table.
+    def _layer_rows(self, rows):
+        """Layer data of some table rows: row labels, track ID, (frame, y, x) and name.
         """
-        mask = self.viewer.layers['segm'].data
-        track = self.track.copy()
-        if mask_flag:
-            mask, track = align_table_and_mask(track, mask, align_morph=False, 
-                                               phase_col=self.stateColName, phase_default=self.states[0])      # warning: align_morph=False
-            if int(np.max(mask)) <= 255:
-                io.imsave(self.mask_path, mask.astype('uint8'))
-            else:
-                io.imsave(self.mask_path, mask)
-        self.mask = mask.copy()
-        self.getAnn()
-        track = track.sort_values(by=['trackId', 'frame'])
-        track.to_csv(self.track_path, index=None)
-        self.saved = track.copy()
-        self.track = track.copy()
-        msg = 'Saved: ' + get_current_time() + '.'
-        return msg
-
-    def revert(self):
-        """Revert to last saved version.
-        """
-        self.viewer.layers['segm'].data = self.mask.copy()
-        self.track = self.saved.copy()
-        msg = 'Reverted: ' + get_current_time() + '.'
-        return msg
-    
-    def retrack(self, distance, frame_gap):
-        trk = self.track.copy()
-        mask = self.viewer.layers['segm'].data
-        mask, trk = align_table_and_mask(trk, mask, align_morph=False)   
-        trk['index'] = trk.index
-        t = trackpy.link(trk[['frame', 'Center_of_the_object_0', 'Center_of_the_object_1', 'index']], 
-                         search_range=distance, memory=frame_gap, adaptive_stop=0.4*distance, 
-                         pos_columns=['Center_of_the_object_0', 'Center_of_the_object_1'])
-        cols = list(t.columns)
-        cols[len(cols)-1] = 'trackId'
-        t.columns = cols
-        trk.loc[t['index'], 'trackId'] = t['trackId'] + 1   # trackpy output start from ID=0
-        
-        trk['lineageId'] = trk['trackId']
-        trk['parentTrackId'] = 0            # TODO resolve previously associated mitosis
-        del trk['index']
-        trk = trk.sort_values(by=['trackId', 'frame'])
-        trk.index = [_ for _ in range(trk.shape[0])]
-
-        self.mask = mask.copy()
-        self.track = trk.copy()
-        msg = 'Re-tracked.'
-        return msg
-
-    def getAnn(self):
-        """Add an annotation column to tracked object table
-        The annotation format is track ID - (parentTrackId, optional) - stateColName
+        sub = self.store.loc[rows]
+        return {'rows': np.asarray(rows),
+                'trackId': sub['trackId'].to_numpy(dtype='float'),
+                'points': sub[['frame', 'Center_of_the_object_1', 'Center_of_the_object_0']].to_numpy(dtype='float'),
+                'name': sub['name'].to_numpy()}
+
+    def _push_layers(self, tracks=True):
+        """Set the `tracks` layer (if `tracks`) and the `name` layer from `self.layer_cache`.
         """
-        track = self.track.copy()
-        if self.hasState:
-            track.loc[pd.isnull(track[self.stateColName]), self.stateColName] = self.states[0]
-        track = get_annotation(track, self.hasState, self.stateColName)
-        self.track = track
+        cache = self.layer_cache
+        if tracks:
+            assigned = cache['trackId'] > 0  # unassigned tracks have ID=0, not allowed for napari to plot.
+            self.viewer.layers['tracks'].data = np.column_stack([cache['trackId'][assigned], cache['points'][assigned]])
+        if self.name_window is None:
+            self._set_names(np.arange(cache['rows'].size))
+        else:
+            # rows keep their position and frame when only renamed
+            if tracks or self.name_index is None:
+                order = np.argsort(cache['points'][:, 0], kind='stable')
+                self.name_index = (order, cache['points'][order, 0])
+            self.name_shown = None
+            self.show_names()
         return
 
-    def edit_div(self, par, daugs, new_frame):
-        """Change division time of parent and daughter to a new time location
-        TODO: check and implement as a widget function
-
-        Args:
-            par (int): parent track ID
-            daugs (list): daughter tracks IDs
-            new_frame (int):
+    def show_names(self):
+        """Fill the `name` layer with objects within `self.name_window` frames of the frame on display.
         """
-        if par not in self.track['trackId'].values:
-            raise ValueError('Selected parent track is not in the table.')
-        for d in daugs:
-            if d not in self.track['trackId'].values:
-                raise ValueError('Selected daughter track is not in the table.')
-            if self.track[self.track['trackId'] == d]['parentTrackId'].iloc[0] != par:
-                raise ValueError('Selected daughter track does not corresponding to the input parent.')
-
-        new_frame -= 1
-        sub_par = self.track[self.track['trackId'] == par]
-        time_daugs = []
-        sub_daugs = pd.DataFrame()
-        for i in daugs:
-            sub_daugs = pd.concat([sub_daugs, self.track[self.track['trackId'] == i]], ignore_index=True)
-        time_daugs.extend(list(sub_daugs['frame']))
-        if new_frame not in list(sub_par['frame']) and new_frame not in time_daugs:
-            raise ValueError('Selected new time frame not in either parent or daughter track.')
-
-        if new_frame not in list(sub_par['frame']):
-            # push division later
-            edit = sub_daugs[sub_daugs['frame'] <= new_frame]
-            if len(np.unique(edit['trackId'])) > 1:
-                raise ValueError('Multiple daughters at selected new division, should only have one')
-
-            # get and assign edit index
-            par_id = sub_par['trackId'].iloc[0]
-            par_lin = sub_par['lineageId'].iloc[0]
-            par_par = sub_par['parentTrackId'].iloc[0]
-            self.track.loc[edit.index, 'trackId'] = par_id
-            self.track.loc[edit.index, 'lineageId'] = par_lin
-            self.track.loc[edit.index, 'parentTrackId'] = par_par
-        else:
-            new_frame += 1
-            # draw division earlier
-            edit = sub_par[sub_par['frame'] >= new_frame]
-            # pick a daughter that appears earlier and assign tracks to that daughter
-            f_min = np.argmin(sub_daugs['frame'])
-            if len(np.unique(sub_daugs[sub_daugs['frame'] == f_min]['trackId'])) > 1:
-                raise ValueError('Multiple daughters exist at frame of mitosis, should only be one. '
-                                 'Or break mitotic track first.')
-            trk = list(sub_daugs['trackId'])[int(f_min)]
-            sel_daugs = sub_daugs[sub_daugs['trackId'] == trk]
-
-            # get and assign edit index
-            daug_id = sel_daugs['trackId'].iloc[0]
-            daug_par = sel_daugs['parentTrackId'].iloc[0]
-            daug_lin = sel_daugs['lineageId'].iloc[0]
-            self.track.loc[edit.index, 'trackId'] = daug_id
-            self.track.loc[edit.index, 'parentTrackId'] = daug_par
-            self.track.loc[edit.index, 'lineageId'] = daug_lin
-
+        if self.layer_cache is None:
+            self._cache_layers()
+            self._push_layers()
+            return
+        t = self.viewer.dims.current_step[0]
+        shown = (t - self.name_window, t + self.name_window)
+        if shown == self.name_shown:
+            return
+        order, frames = self.name_index
+        lo, hi = np.searchsorted(frames, shown[0], 'left'), np.searchsorted(frames, shown[1], 'right')
+        self._set_names(order[lo:hi])
+        self.name_shown = shown
         return
 
-    def register_obj(self, obj_id, frame, trk_id, cls):
-        """Register a new object that has been drawn on the mask
-
-        Args:
-            obj_id (int): Object ID of the drawn mask.
-            frame (int): Frame location.
-            trk_id (int): Track ID.
-            cls (str): State id.
+    def _set_names(self, sel):
+        """Set the `name` layer to some rows of `self.layer_cache`, by position (copied, as the cache is
+        updated in place). Nothing is set if the layer already shows them, e.g. after edits in other frames.
         """
-        mask = self.viewer.layers['segm'].data
-        msk_slice = mask[frame, :, :]
-        trk_slice = self.track[self.track['frame'] == frame]
-        untracked = False if int(trk_id) > 0 else True          # register as an untracked object
-        if obj_id in list(trk_slice['continuous_label']):
-            if list(trk_slice[trk_slice['continuous_label'] == obj_id]['trackId'])[0] == 0:
-                # assign information to untracked object
-                idx = list(trk_slice[trk_slice['continuous_label'] == obj_id]['trackId'].index)[0]
-                self.track.loc[idx, 'trackId'] = trk_id
-                self.track.loc[idx, 'lineageId'] = trk_id
-                if self.hasState:
-                    self.track.loc[idx, self.stateColName] = cls
-                self.track = self.track.sort_values(by=['trackId', 'frame'])
-                msg = 'Assign obj: track ' + str(trk_id) + '; frame ' + str(frame) + '; state ' + cls + '.'
-                self.last_reg_id = trk_id
-                return msg
-            else:
-                raise ValueError('Object label has been used, draw with a bigger label. Current max label: ' +
-                                  str(np.max(trk_slice['continuous_label'])))
-        if trk_id in list(trk_slice['trackId']) and trk_id != 0:
-            raise ValueError('Track ID already exists in the selected frame.')
-        if cls not in self.states:
-            raise ValueError('Given state ID not registered.')
-        if obj_id not in msk_slice:
-            raise ValueError('Object ID is not in the given frame of mask. Draw again. Current max label: ' +
-                             str(np.max(trk_slice['continuous_label'])))
-
-        new_row = {'frame': frame, 'trackId': trk_id, 'continuous_label': obj_id,
-                   # below fields are not essential for the input and should have been init by default value already
-                   self.stateColName: cls}
-        if trk_id in list(self.track['trackId']):
-            # pld track
-            old_trk = self.track[self.track['trackId'] == trk_id]
-            old_lin = old_trk['lineageId'].iloc[0]
-            old_par = old_trk['parentTrackId'].iloc[0]
-            new_row['lineageId'] = old_lin
-            new_row['parentTrackId'] = old_par
-            if old_par != 0:
-                nm = '-'.join([str(trk_id), str(old_par), cls])
-            else:
-                nm = '-'.join([str(trk_id), cls])
-        elif untracked:
-            new_row['lineageId'] = 0
-            new_row['trackId'] = 0
-            new_row['parentTrackId'] = 0
-            nm = 'unassigned'
-        else:
-            # New track
-            self.track_count = int(np.max((self.track_count, trk_id)))
-            new_row['lineageId'] = trk_id
-            new_row['parentTrackId'] = 0
-            nm = '-'.join([str(trk_id), cls])
-        new_row['name'] = nm
-
-        # Register measurements of the object morphology.
-        misc = np.zeros(msk_slice.shape, dtype='uint8')
-        misc[msk_slice == obj_id] = 1
-        p = measure.regionprops(label_image=misc)[0]
-        y, x = p.centroid
-        new_row['Center_of_the_object_0'] = x
-        new_row['Center_of_the_object_1'] = y
-        # For extra fields
-        for i in set(list(self.track.columns)) - set(list(new_row.keys())):
-            new_row[i] = np.nan
-        
-        self.track = pd.concat([self.track, pd.DataFrame.from_dict([new_row])[self.track.columns]], ignore_index=True)
-        self.track = self.track.sort_values(by=['trackId', 'frame'])
-        if trk_id != 0:
-            msg = 'New obj: track ' + str(trk_id) + '; frame ' + str(frame) + '; state ' + cls + '.'
-        else:
-            msg = 'New unassigned obj: ' + 'frame ' + str(frame) + '; state ' + cls + '.'
-        self.last_reg_id = trk_id
-        return msg
-
-    def run_copy_obj(self, ID, fromFrame, toFrame):
-        # copy object (labeled as ID) from frame A to frame B, will overlap on existing objects on B.
-        if fromFrame == toFrame:
-            raise ValueError('Cannot copy object on the same frame.')
-        row = self.track[(self.track['frame'] == fromFrame) & (self.track['continuous_label'] == ID)]
-        mask = self.viewer.layers['segm'].data
-        if row.shape[0] != 1:
-            # If unassigned object found in fromFrame, register it first.
-            if ID in np.unique(mask[fromFrame,:,:]):
-                self.register_obj(obj_id=ID, frame=fromFrame, trk_id=0, cls=self.states[0])
-            else:
-                raise ValueError('ID not found in fromFrame.')
-        
-        tar_mx = self.get_mx(toFrame)
-        row.loc[row.index, 'continuous_label'] = tar_mx + 1
-        row.loc[row.index, 'frame'] = toFrame
-        new_track = pd.concat([self.track, row], ignore_index=True)
-        new_track = new_track.sort_values(by=['trackId','frame'])
-        new_track.index = [_ for _ in range(new_track.shape[0])]
-        self.track = new_track
-        toMask = mask[toFrame,:,:].copy()
-        fromMask = mask[fromFrame,:,:]
-        toMask[fromMask==ID] = tar_mx + 1
-        mask[toFrame,:,:] = toMask
-        self.viewer.layers['segm'].data = mask
-        msg = ''
-        return msg
-
-    def get_mx(self, frame):
-        mask = self.viewer.layers['segm'].data
-        return int(np.max(mask[frame,:,:]))
-
-    def refresh(self):
-        self.getAnn()
-        track_data = self.track.loc[:][['trackId', 'frame', 'Center_of_the_object_1', 'Center_of_the_object_0']].copy()
-        track_data = track_data[track_data['trackId']>0] # unassigned tracks have ID=0, not allowed for napari to plot.
-        track_data = track_data.to_numpy().astype('float')
-        self.viewer.layers['tracks'].data = track_data
-        label_data = self.track.loc[:][['frame', 'Center_of_the_object_1', 'Center_of_the_object_0']]
-        label_data = label_data.to_numpy()
-        # self.layers[nm_idx].features.clear()
-        self.viewer.layers['name'].data = label_data
-        self.viewer.layers['name'].features['name'] = self.track.loc[:]['name'].to_numpy()
-        self.viewer.layers['name'].refresh_text()
-        self.clear_selection()
+        layer = self.viewer.layers['name']
+        points, names = self.layer_cache['points'][sel], self.layer_cache['name'][sel]
+        shown = layer.features.get('name')
+        if shown is not None and np.array_equal(layer.data, points) and np.array_equal(shown.to_numpy(), names):
+            return
+        layer.data = points
+        layer.features['name'] = names
+        layer.refresh_text()
         return